@@ -0,0 +1,305 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.agent.utils.solver_policy import SolverPolicy
+from src.agent.utils.vec_env import VEC_ENV_TYPES, VecRecorder, make_env
+from src.env.game_config import GameConfig, get_default_config
+from src.env.recorder import TrajectoryReader
+from src.env.reroll_solver import OBJECTIVES
+
+seed = 0
+n_steps = 1000000
+n_shards = 8
+n_envs = 64
+batch_size = 256
+
+MANIFEST_FILE = "manifest.json"
+POLICIES = ["solver", "random", "model"]
+
+
+class RandomPolicy:
+    """Rerolls each dice with probability 1/2, the predict of a model."""
+
+    def __init__(self, n_dices: int, seed: int = None):
+        self.n_dices = n_dices
+        self.rng = np.random.default_rng(seed)
+
+    def predict(
+        self, obs, state=None, episode_start=None, deterministic=True
+    ) -> (np.ndarray, None):
+        n_envs = len(obs if isinstance(obs, np.ndarray) else obs["player"])
+
+        return self.rng.integers(0, 2, size=(n_envs, self.n_dices)), None
+
+
+# generation ===============================================
+def get_policy(settings: dict, config: GameConfig, shard_seed: int):
+    if settings["policy"] == "solver":
+        return SolverPolicy(
+            settings["solver_objective"],
+            settings["flat_observation"],
+            2 * settings["n_envs"] + 8,
+            config,
+        )
+
+    # the envs are seeded with shard_seed + j, the policy with a child of
+    # it so that it draws from a stream of its own
+    if settings["policy"] == "random":
+        policy_seed = np.random.SeedSequence(shard_seed).spawn(1)[0]
+        return RandomPolicy(config.n_dices, policy_seed)
+
+    from stable_baselines3 import PPO
+
+    return PPO.load(settings["model_path"], device="cpu")
+
+
+def generate_shard(shard: dict, settings: dict) -> int:
+    """Record the steps of a shard and return its number of rows.
+
+    Plays shard["n_steps"] steps of settings["n_envs"] envs seeded from
+    shard["seed"] and records them to shard["path"].
+    """
+    config = GameConfig.from_dict(settings["config"])
+    env_id = "RollerFlat-v1" if settings["flat_observation"] else "Roller-v1"
+    path = os.path.join(settings["output"], shard["path"])
+
+    env = VecRecorder(
+        make_env(
+            env_id,
+            settings["n_envs"],
+            settings["vec_env"],
+            seed=shard["seed"],
+            env_kwargs={"config": config},
+            sb3=False,
+        ),
+        path,
+    )
+    policy = get_policy(settings, config, shard["seed"])
+
+    obs = env.reset()
+    for _ in range(0, shard["n_steps"], settings["n_envs"]):
+        actions, _ = policy.predict(obs, deterministic=True)
+        obs, _, _, _ = env.step(actions)
+    env.close()
+
+    return len(TrajectoryReader(path))
+
+
+# shard i seeds its envs with seed + i * n_envs + j, no env is seeded twice
+def get_shards(n_steps: int, n_shards: int, n_envs: int, seed: int) -> [dict]:
+    steps_per_shard = -(-n_steps // n_shards)
+    steps_per_shard = -(-steps_per_shard // n_envs) * n_envs
+
+    return [
+        {
+            "path": f"shard_{i:04d}",
+            "seed": seed + i * n_envs,
+            "n_steps": steps_per_shard,
+        }
+        for i in range(n_shards)
+    ]
+
+
+# loading ===============================================
+class OfflineDataset:
+    """The shards of a dataset directory, memory-mapped.
+
+    ``iterate_minibatches`` shuffles the rows of every shard together and
+    reads only the rows of each minibatch from disk. A shuffled epoch keeps
+    one int64 index per row in memory, the transitions stay on disk.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+
+        self.readers = [
+            TrajectoryReader(os.path.join(path, shard["path"]))
+            for shard in self.manifest["shards"]
+        ]
+        self.offsets = np.cumsum([0] + [len(r) for r in self.readers])
+
+    def __len__(self) -> int:
+        """Return the number of rows of every shard together."""
+        return int(self.offsets[-1])
+
+    def get_config(self) -> GameConfig:
+        return GameConfig.from_dict(self.manifest["config"])
+
+    def get_columns(self) -> [str]:
+        return self.readers[0].keys()
+
+    # rows (indices over all the shards) of columns, returned in row order
+    def get_rows(self, rows: np.ndarray, columns: [str] = None) -> dict:
+        columns = columns or self.get_columns()
+        rows = np.sort(rows)
+        shards = np.searchsorted(self.offsets, rows, side="right") - 1
+
+        parts = {name: [] for name in columns}
+        for shard_i in np.unique(shards):
+            reader = self.readers[shard_i]
+            shard_rows = rows[shards == shard_i] - self.offsets[shard_i]
+
+            for name in columns:
+                parts[name].append(reader[name][shard_rows])
+
+        return {name: np.concatenate(parts[name]) for name in columns}
+
+    def iterate_minibatches(
+        self,
+        batch_size: int = batch_size,
+        columns: [str] = None,
+        seed: int = None,
+        drop_last: bool = False,
+    ):
+        """Yield one shuffled epoch of {column: array} minibatches."""
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(self))
+
+        end = len(order)
+        if drop_last:
+            end -= end % batch_size
+
+        for start in range(0, end, batch_size):
+            yield self.get_rows(order[start : start + batch_size], columns)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.agent.dataset",
+        description=(
+            "Record transitions of seeded envs played by a policy into a "
+            "sharded offline dataset, for behavior cloning or offline RL."
+        ),
+        allow_abbrev=False,
+    )
+    parser.add_argument(
+        "--output",
+        required=True,
+        type=str,
+        help="Dataset directory, one subdirectory per shard.",
+    )
+    parser.add_argument(
+        "--policy",
+        default="solver",
+        choices=POLICIES,
+        help=(
+            "'solver' plays the optimal reroll baseline, 'random' rerolls "
+            "each dice with probability 1/2, 'model' the PPO model of "
+            "--model_path."
+        ),
+    )
+    parser.add_argument(
+        "--solver_objective", default="damage", choices=OBJECTIVES
+    )
+    parser.add_argument("--model_path", default="model.zip", type=str)
+    parser.add_argument(
+        "--flat_observation",
+        default=False,
+        action="store_true",
+        help="Record RollerFlat-v1 observations.",
+    )
+    parser.add_argument(
+        "--steps",
+        default=n_steps,
+        type=int,
+        help="Environment steps over all shards, rounded up to whole batches.",
+    )
+    parser.add_argument("--shards", default=n_shards, type=int)
+    parser.add_argument(
+        "--n_envs",
+        default=n_envs,
+        type=int,
+        help="Envs stepped together in every shard.",
+    )
+    parser.add_argument(
+        "--vec_env",
+        default="dummy",
+        choices=VEC_ENV_TYPES,
+        help=(
+            "How the envs of a shard are run, see src.agent.trainer. "
+            "'subproc' and 'batched' import stable_baselines3 and torch in "
+            "every worker, which takes seconds and hundreds of MB."
+        ),
+    )
+    parser.add_argument("--seed", default=seed, type=int)
+    parser.add_argument(
+        "--workers",
+        default=None,
+        type=int,
+        help="Processes generating the shards, defaults to the CPU count.",
+    )
+    parser.add_argument(
+        "--config",
+        default=None,
+        type=str,
+        help="GameConfig JSON / TOML file, defaults to src/env/data.",
+    )
+    args = parser.parse_args(argv)
+
+    config = (
+        GameConfig.from_file(args.config)
+        if args.config
+        else get_default_config()
+    )
+
+    if os.path.exists(os.path.join(args.output, MANIFEST_FILE)):
+        parser.error(f"{args.output} already holds a dataset")
+    os.makedirs(args.output, exist_ok=True)
+
+    settings = {
+        "output": args.output,
+        "policy": args.policy,
+        "solver_objective": args.solver_objective,
+        "model_path": args.model_path,
+        "flat_observation": args.flat_observation,
+        "n_envs": args.n_envs,
+        "vec_env": args.vec_env,
+        "config": config.to_dict(),
+    }
+    shards = get_shards(args.steps, args.shards, args.n_envs, args.seed)
+
+    print(
+        "Shards",
+        len(shards),
+        "| Steps / shard",
+        shards[0]["n_steps"],
+        "| Policy",
+        args.policy,
+    )
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        n_rows = list(
+            executor.map(generate_shard, shards, [settings] * len(shards))
+        )
+    elapsed_time = time.perf_counter() - start_time
+
+    for shard, rows in zip(shards, n_rows):
+        shard["n_rows"] = rows
+
+    # written last, a dataset without a manifest is incomplete
+    manifest = {
+        **settings,
+        "seed": args.seed,
+        "model_path": args.model_path if args.policy == "model" else None,
+        "shards": shards,
+    }
+    del manifest["output"]
+    with open(os.path.join(args.output, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    print("Transitions: ", sum(n_rows))
+    print("Transitions / sec: ", round(sum(n_rows) / elapsed_time))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
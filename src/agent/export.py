@@ -0,0 +1,115 @@
+import argparse
+import pathlib
+import sys
+import time
+
+import numpy as np
+
+from src.agent.server import load_model
+from src.agent.utils.numpy_policy import NumpyPolicy
+from src.env.game_config import GameConfig, get_default_config
+from src.env.roller import RollerEnv
+
+model_path = "model.zip"
+n_check_steps = 10000
+seed = 0
+
+
+# observations of an env played by the policy, to compare predictions on
+def collect_observations(
+    policy: NumpyPolicy, n_steps: int, seed: int, config: GameConfig
+):
+    flat_observation = policy.observation_shapes is None
+    env = RollerEnv(config=config, flatten_observation=flat_observation)
+    obs, _ = env.reset(seed=seed)
+
+    observations = []
+    for _ in range(n_steps):
+        observations.append(obs)
+        action, _ = policy.predict(obs, deterministic=True)
+        obs, _, terminated, truncated, _ = env.step(action)
+        if terminated or truncated:
+            obs, _ = env.reset()
+
+    if flat_observation:
+        return np.stack(observations)
+
+    return {key: np.stack([o[key] for o in observations]) for key in obs}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.agent.export",
+        description=(
+            "Export the actor of a PPO model to a .npz file for "
+            "src.agent.utils.numpy_policy.NumpyPolicy, which predicts "
+            "without torch, and check both predict the same actions."
+        ),
+        allow_abbrev=False,
+    )
+    parser.add_argument("--model_path", default=model_path, type=str)
+    parser.add_argument(
+        "--output",
+        default=None,
+        type=str,
+        help="Defaults to the model path with a .npz suffix.",
+    )
+    parser.add_argument(
+        "--check_steps",
+        default=n_check_steps,
+        type=int,
+        help=(
+            "Compare the deterministic actions of the model and the export "
+            "on the observations of this many env steps, 0 skips it."
+        ),
+    )
+    parser.add_argument("--seed", default=seed, type=int)
+    parser.add_argument(
+        "--config",
+        default=None,
+        type=str,
+        help="GameConfig JSON / TOML file, defaults to src/env/data.",
+    )
+    args = parser.parse_args(argv)
+
+    config = (
+        GameConfig.from_file(args.config)
+        if args.config
+        else get_default_config()
+    )
+    output = args.output or str(pathlib.Path(args.model_path).with_suffix(""))
+    output = output if output.endswith(".npz") else output + ".npz"
+
+    start_time = time.perf_counter()
+    model = load_model(args.model_path)
+    model_load_time = time.perf_counter() - start_time
+
+    try:
+        NumpyPolicy.from_model(model, config).save(output)
+    except ValueError as e:
+        parser.error(f"Cannot export {args.model_path}: {e}")
+
+    start_time = time.perf_counter()
+    policy = NumpyPolicy.load(output, config)
+    policy_load_time = time.perf_counter() - start_time
+
+    print("Exported", args.model_path, "to", output)
+    print("Model load (ms): ", round(model_load_time * 1e3, 2))
+    print("Export load (ms): ", round(policy_load_time * 1e3, 2))
+
+    if args.check_steps <= 0:
+        return 0
+
+    obs = collect_observations(policy, args.check_steps, args.seed, config)
+    expected, _ = model.predict(obs, deterministic=True)
+    actions, _ = policy.predict(obs, deterministic=True)
+
+    n_different = int((expected != actions).any(axis=1).sum())
+    print("Checked observations: ", args.check_steps)
+    print("Different actions: ", n_different)
+
+    return 1 if n_different else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
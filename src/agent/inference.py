@@ -1,22 +1,43 @@
 import argparse
 import pathlib
+import time
 
 import gymnasium as gym
 
-from src.agent.utils.summary import log_summary
-from src.env.utils.env import get_damage_diff_percent, has_damage_been_done
+import numpy as np
 
-from stable_baselines3 import PPO
-from stable_baselines3.common.env_checker import check_env
+from src.agent.utils.numpy_policy import NumpyPolicy
+from src.agent.utils.solver_policy import SolverPolicy
+from src.agent.utils.summary import (
+    PLOT_LAYOUTS,
+    PLOT_MODES,
+    StreamingStats,
+    log_stats,
+    log_summary,
+)
+from src.agent.utils.vec_env import (
+    START_METHODS,
+    VEC_ENV_TYPES,
+    VecRecorder,
+    make_env,
+)
+from src.env.game_config import GameConfig, get_default_config
+from src.env.reroll_solver import OBJECTIVES
+from src.env.utils.env import get_damage_diff_percent
+from src.env.utils.spaces import unflatten_observation
 
+from tabulate import tabulate
 
 n_rerolls = 3
 timesteps = 100000
 n_log_interval = 10000
+n_envs = 1
 
 experiment_dir = "experiments"
 model_path = "model.zip"
 
+PER_ENV_HEADERS = ["Env", "Episodes", "Wins", "Losses", "Winrate (%)", "Rolls"]
+
 parser = argparse.ArgumentParser(allow_abbrev=False)
 
 parser.add_argument(
@@ -38,70 +59,309 @@ parser.add_argument(
     help="render the results",
 )
 
-args, extras = parser.parse_known_args()
+parser.add_argument(
+    "--flat_observation",
+    default=False,
+    action="store_true",
+    help="Use RollerFlat-v1, for models trained with --flat_observation",
+)
+parser.add_argument(
+    "--plots",
+    default="png",
+    choices=PLOT_MODES,
+    help=(
+        "Histograms of the summary: 'png' saves them to histograms.png "
+        "without a display, 'show' also opens a window, 'none' skips them."
+    ),
+)
+parser.add_argument(
+    "--plot_layout",
+    default="figure",
+    choices=PLOT_LAYOUTS,
+    help=(
+        "'figure' draws the histograms into one figure, 'titles' each into "
+        "its own <title>.png."
+    ),
+)
+parser.add_argument(
+    "--n_envs",
+    default=n_envs,
+    type=int,
+    help=(
+        "Number of envs evaluated in parallel, their observations are "
+        "batched into one predict call per step."
+    ),
+)
+parser.add_argument(
+    "--vec_env",
+    default="dummy",
+    choices=VEC_ENV_TYPES,
+    help="How the envs are run, see src.agent.trainer",
+)
+parser.add_argument(
+    "--start_method",
+    default=None,
+    choices=START_METHODS,
+    help="Start method of the 'subproc' worker processes.",
+)
+parser.add_argument(
+    "--seed",
+    default=None,
+    type=int,
+    help="Seed of the envs, env i is seeded with seed + i.",
+)
 
-env = gym.make("Roller-v1", render_mode="human")
-check_env(env)
+parser.add_argument(
+    "--policy",
+    default="model",
+    choices=["model", "numpy", "solver"],
+    help=(
+        "'model' plays the PPO model of --model_path, 'numpy' its .npz "
+        "export (see src.agent.export) without torch, 'solver' the exact "
+        "optimal reroll baseline of src.env.reroll_solver."
+    ),
+)
+parser.add_argument(
+    "--solver_objective",
+    default="damage",
+    choices=OBJECTIVES,
+    help=(
+        "What the solver maximizes: 'total' attack + defense of the hand or "
+        "'damage' dealt minus taken against the enemy."
+    ),
+)
+parser.add_argument(
+    "--oracle",
+    default=False,
+    action="store_true",
+    help=(
+        "Compare every model action to the solver's optimal action and log "
+        "the agreement and the expected value lost."
+    ),
+)
 
-path_zip = pathlib.Path(args.model_path)
+parser.add_argument(
+    "--per_env",
+    default=False,
+    action="store_true",
+    help="Also print the episodes, wins, losses and rolls of every env.",
+)
 
-model = PPO.load(path_zip, env=env, tensorboard_log=experiment_dir)
+parser.add_argument(
+    "--config",
+    default=None,
+    type=str,
+    help=(
+        "GameConfig JSON / TOML file passed to every env, defaults to the "
+        "constants of src/env/data."
+    ),
+)
+parser.add_argument(
+    "--record",
+    default=None,
+    type=str,
+    help=(
+        "Record every transition into this directory, read it back with "
+        "src.env.recorder.TrajectoryReader."
+    ),
+)
+
+args, extras = parser.parse_known_args()
+
+env_id = "RollerFlat-v1" if args.flat_observation else "Roller-v1"
+game_config = (
+    GameConfig.from_file(args.config) if args.config else get_default_config()
+)
 
-obs, info = env.reset()
-if args.render:
-    env.render()
 
-print("\n======== Starting inference ========")
-print("Steps", args.timesteps, "| Rerolls / turn", n_rerolls)
+class EvaluationStats:
+    """Per-env counters and per-step samples of a batched evaluation."""
 
-diffs = []
-damage_dealt = []
-damage_taken = []
-wins = 0
-losses = 0
-rolls = 0
-hands = []
-battles_won = []
+    def __init__(self, n_envs: int):
+        self.wins = np.zeros(n_envs, dtype=np.int64)
+        self.losses = np.zeros(n_envs, dtype=np.int64)
+        self.rolls = np.zeros(n_envs, dtype=np.int64)
+        self.episodes = np.zeros(n_envs, dtype=np.int64)
 
-for i in range(args.timesteps):
-    if i % n_log_interval == 0:
-        print("Step", i)
+        # constant memory however long the evaluation runs
+        self.diffs = StreamingStats()
+        self.damage_dealt = StreamingStats()
+        self.damage_taken = StreamingStats()
+        self.hands = StreamingStats()
+        self.battles_won = StreamingStats()
 
-    action, _state = model.predict(obs, deterministic=True)
-    obs, reward, terminated, truncated, info = env.step(action)
+    def add_step(self, obs, dones, infos) -> None:
+        # done envs are already reset, their last observation is in infos
+        damage_done = obs["damage_done"].copy()
+        player_max_hp = obs["player"][:, 0].copy()
+        enemy_max_hp = obs["enemy"][:, 0].copy()
 
-    if info["player_won"]:
-        wins += 1
-    if terminated:
-        battles_won.append(info["battles_won"])
-        if not info["player_won"]:
-            losses += 1
+        for i in np.flatnonzero(dones):
+            terminal_obs = infos[i]["terminal_observation"]
+            if args.flat_observation:
+                terminal_obs = unflatten_observation(terminal_obs, game_config)
 
-    diff = 0
-    if has_damage_been_done(obs["damage_done"]):
+            damage_done[i] = terminal_obs["damage_done"]
+            player_max_hp[i] = terminal_obs["player"][0]
+            enemy_max_hp[i] = terminal_obs["enemy"][0]
+
+        has_damage = (damage_done > 0).any(axis=1)
         diff = get_damage_diff_percent(
-            obs["damage_done"], obs["player"][0], obs["enemy"][0]
+            damage_done.T, player_max_hp, enemy_max_hp
+        )
+        self.diffs.update(np.round(diff[has_damage], 2))
+        self.damage_taken.update(damage_done[has_damage, 0])
+        self.damage_dealt.update(damage_done[has_damage, 1])
+
+        for i, info in enumerate(infos):
+            if info["player_won"]:
+                self.wins[i] += 1
+
+            if not dones[i]:
+                continue
+
+            if not info.get("TimeLimit.truncated", False):
+                self.battles_won.update(info["battles_won"])
+                if not info["player_won"]:
+                    self.losses[i] += 1
+
+            self.hands.update(info["hands"])
+            self.rolls[i] += info["rolls"]
+            self.episodes[i] += 1
+
+    def log_per_env(self) -> None:
+        rows = []
+        for i in range(len(self.wins)):
+            wins, losses = int(self.wins[i]), int(self.losses[i])
+            winrate = (
+                round(wins / (wins + losses) * 100, 2)
+                if wins + losses
+                else "-"
+            )
+            rows.append(
+                [i, self.episodes[i], wins, losses, winrate, self.rolls[i]]
+            )
+
+        print("\n======== Summary per env ========")
+        print(
+            tabulate(rows, headers=PER_ENV_HEADERS, tablefmt="simple_outline")
         )
-        diffs.append(round(diff, 2))
 
-        damage_taken.append(obs["damage_done"][0])
-        damage_dealt.append(obs["damage_done"][1])
+
+def evaluate():
+    env_kwargs = {"config": game_config}
 
+    if args.render:
+        env_kwargs["render_mode"] = "human"
+    env = make_env(
+        env_id,
+        args.n_envs,
+        args.vec_env,
+        args.start_method,
+        args.seed,
+        env_kwargs,
+        sb3=False,
+    )
+    if args.record is not None:
+        env = VecRecorder(env, args.record)
+
+    # a dice set is solved once, keep one per env plus the ones just reset
+    solver = SolverPolicy(
+        args.solver_objective,
+        args.flat_observation,
+        2 * args.n_envs + 8,
+        game_config,
+    )
+    oracle = solver if args.oracle else None
+
+    if args.policy == "solver":
+        model = solver
+        oracle = None
+    elif args.policy == "numpy":
+        model = NumpyPolicy.load(args.model_path, game_config)
+    else:
+        # stable_baselines3 and torch take seconds to import, the other
+        # policies run without them
+        from stable_baselines3 import PPO
+        from stable_baselines3.common.env_checker import check_env
+
+        check_env(gym.make(env_id, config=game_config))
+        path_zip = pathlib.Path(args.model_path)
+        model = PPO.load(path_zip, tensorboard_log=experiment_dir)
+
+    obs = env.reset()
     if args.render:
         env.render()
 
-    if terminated or truncated:
-        hands.append(info["hands"])
-        rolls += info["rolls"]
+    print("\n======== Starting inference ========")
+    print(
+        "Steps",
+        args.timesteps,
+        "| Rerolls / turn",
+        n_rerolls,
+        "| Envs",
+        args.n_envs,
+    )
+
+    stats = EvaluationStats(args.n_envs)
+    n_optimal_actions = 0
+    value_gaps = StreamingStats()
+    start_time = time.perf_counter()
+
+    # every step advances all the envs, i.e. n_envs environment steps
+    for i in range(0, args.timesteps, args.n_envs):
+        if i % n_log_interval < args.n_envs:
+            print("Step", i)
+
+        actions, _state = model.predict(obs, deterministic=True)
+        if oracle is not None:
+            is_optimal, gaps = oracle.evaluate(obs, actions)
+            n_optimal_actions += int(is_optimal.sum())
+            value_gaps.update(np.round(gaps, 2))
 
-        obs, info = env.reset()
+        obs, rewards, dones, infos = env.step(actions)
+        obs_dict = obs
+        if args.flat_observation:
+            obs_dict = unflatten_observation(obs, game_config)
+
+        stats.add_step(obs_dict, dones, infos)
 
         if args.render:
             env.render()
 
-env.close()
+    elapsed_time = time.perf_counter() - start_time
+    env.close()
 
-print("\n======== Inference finished ========")
-log_summary(
-    wins, losses, diffs, damage_dealt, damage_taken, rolls, hands, battles_won
-)
+    print("\n======== Inference finished ========")
+    log_summary(
+        int(stats.wins.sum()),
+        int(stats.losses.sum()),
+        stats.diffs,
+        stats.damage_dealt,
+        stats.damage_taken,
+        int(stats.rolls.sum()),
+        stats.hands,
+        stats.battles_won,
+        args.plots,
+        args.plot_layout,
+    )
+
+    if args.per_env:
+        stats.log_per_env()
+
+    episodes = int(stats.episodes.sum())
+    print("\nEpisodes: ", episodes)
+    print("Episodes / sec: ", round(episodes / elapsed_time, 2))
+
+    if oracle is not None:
+        log_stats("expected value lost vs the solver", value_gaps)
+        print(
+            "Optimal actions: ",
+            round(n_optimal_actions / max(len(value_gaps), 1) * 100, 2),
+            "%",
+        )
+
+
+# subproc workers started with spawn / forkserver import this module again
+if __name__ == "__main__":
+    evaluate()
@@ -0,0 +1,590 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.agent.utils.numpy_policy import NumpyPolicy
+from src.agent.utils.solver_policy import SolverPolicy
+from src.agent.utils.summary import StreamingStats
+from src.env.game_config import GameConfig, get_default_config
+from src.env.utils.spaces import flatten_observation, unflatten_observation
+
+from tabulate import tabulate
+
+host = "127.0.0.1"
+port = 8765
+model_path = "model.zip"
+max_batch_size = 64
+max_wait_ms = 2.0
+log_interval = 10.0
+seed = 0
+n_steps = 10000
+
+POLICIES = ["model", "numpy", "solver"]
+METRICS_HEADERS = ["Metric", "Value"]
+
+
+# protocol ===============================================
+# one JSON object per line, both ways. {"obs": ..., "id": ...} is answered
+# with {"action": [...], "id": ...} (id is optional and echoed back),
+# {"metrics": true} with {"metrics": {...}} and a bad request with
+# {"error": "..."}. The observation is a RollerEnv dict of lists or a
+# RollerFlat-v1 list, whichever the policy was trained on. A connection is
+# served one request at a time, concurrent clients use one connection each
+def encode_observation(obs) -> dict:
+    if isinstance(obs, dict):
+        return {key: np.asarray(value).tolist() for key, value in obs.items()}
+
+    return np.asarray(obs).tolist()
+
+
+# the observation of a request in the layout the policy expects
+def parse_observation(obs, flat_observation: bool, config: GameConfig):
+    if isinstance(obs, dict):
+        spaces = config.get_observation_space().spaces
+        obs = {
+            key: np.asarray(obs[key], dtype=box.dtype).reshape(box.shape)
+            for key, box in spaces.items()
+        }
+
+        return flatten_observation(obs, config) if flat_observation else obs
+
+    box = config.get_flat_observation_space()
+    obs = np.asarray(obs, dtype=box.dtype).reshape(box.shape)
+
+    return obs if flat_observation else unflatten_observation(obs, config)
+
+
+# the schedules are pickled functions only used in training, models saved
+# by another Python version fail to unpickle them
+def load_model(model_path: str):
+    # torch is only needed to serve a model
+    from stable_baselines3 import PPO
+
+    return PPO.load(
+        model_path,
+        device="cpu",
+        custom_objects={
+            "learning_rate": 0.0,
+            "lr_schedule": lambda _: 0.0,
+            "clip_range": lambda _: 0.0,
+        },
+    )
+
+
+def load_policy(
+    policy: str,
+    model_path: str,
+    flat_observation: bool,
+    config: GameConfig,
+    cache_size: int,
+):
+    if policy == "solver":
+        return SolverPolicy("damage", flat_observation, cache_size, config)
+
+    if policy == "numpy":
+        return NumpyPolicy.load(model_path, config)
+
+    return load_model(model_path)
+
+
+# serving ===============================================
+class ServingStats:
+    """Size of the served batches and latency of the requests.
+
+    Latency runs from queued to answered, both are kept in constant memory.
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.batch_sizes = StreamingStats(scale=1)
+        self.latency_ms = StreamingStats()
+        self.predict_ms = StreamingStats()
+        self.n_errors = 0
+
+    def add_batch(self, latency_ms: np.ndarray, predict_ms: float) -> None:
+        self.batch_sizes.update(len(latency_ms))
+        self.latency_ms.update(latency_ms)
+        self.predict_ms.update(predict_ms)
+
+    def add_error(self) -> None:
+        self.n_errors += 1
+
+    def get_metrics(self) -> dict:
+        elapsed_time = time.perf_counter() - self.start_time
+        metrics = {
+            "requests": len(self.latency_ms),
+            "batches": len(self.batch_sizes),
+            "errors": self.n_errors,
+            "requests_per_s": round(len(self.latency_ms) / elapsed_time, 2),
+        }
+
+        if len(self.batch_sizes) == 0:
+            return metrics
+
+        return {
+            **metrics,
+            "batch_size_mean": round(self.batch_sizes.get_mean(), 2),
+            "batch_size_p50": self.batch_sizes.get_median(),
+            "batch_size_max": int(self.batch_sizes.max),
+            "latency_ms_p50": round(self.latency_ms.get_median(), 2),
+            "latency_ms_p99": round(self.latency_ms.get_quantile(0.99), 2),
+            "latency_ms_max": round(float(self.latency_ms.max), 2),
+            "predict_ms_mean": round(self.predict_ms.get_mean(), 2),
+        }
+
+
+class MicroBatcher:
+    """Coalesces concurrent predict requests into batched policy calls.
+
+    Requests wait in a queue. The batching task takes the first one and
+    collects more until max_batch_size requests or max_wait_ms after the
+    first, then runs one ``policy.predict`` on a worker thread while the
+    event loop keeps reading requests. A lone request waits at most
+    max_wait_ms, a busy server answers full batches.
+    """
+
+    def __init__(
+        self,
+        policy,
+        flat_observation: bool,
+        max_batch_size: int = max_batch_size,
+        max_wait_ms: float = max_wait_ms,
+        stats: ServingStats = None,
+    ):
+        self.policy = policy
+        self.flat_observation = flat_observation
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1e3
+        self.stats = stats or ServingStats()
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def predict(self, obs) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((obs, future, time.perf_counter()))
+
+        return await future
+
+    async def run(self) -> None:
+        while True:
+            await self.__serve(await self.__collect())
+
+    async def __collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def __serve(self, batch: list) -> None:
+        loop = asyncio.get_running_loop()
+        observations = [obs for obs, _, _ in batch]
+
+        start = time.perf_counter()
+        try:
+            actions = await loop.run_in_executor(
+                self.executor, self.__predict, observations
+            )
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        end = time.perf_counter()
+
+        queued = np.array([queued for _, _, queued in batch])
+        self.stats.add_batch((end - queued) * 1e3, (end - start) * 1e3)
+
+        # a client gone while its request was queued cancelled its future
+        for (_, future, _), action in zip(batch, actions):
+            if not future.done():
+                future.set_result(action)
+
+    def __predict(self, observations: list) -> np.ndarray:
+        if self.flat_observation:
+            obs = np.stack(observations)
+        else:
+            obs = {
+                key: np.stack([o[key] for o in observations])
+                for key in observations[0]
+            }
+
+        # a MultiBinary PPO model predicts float masks
+        actions, _ = self.policy.predict(obs, deterministic=True)
+
+        return np.asarray(actions).astype(np.int64)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class PolicyServer:
+    """Answers the requests of every connection through one MicroBatcher.
+
+    See the protocol above.
+    """
+
+    def __init__(
+        self,
+        batcher: MicroBatcher,
+        flat_observation: bool,
+        config: GameConfig = None,
+    ):
+        self.batcher = batcher
+        self.stats = batcher.stats
+        self.flat_observation = flat_observation
+        self.config = config or get_default_config()
+
+    async def handle_connection(self, reader, writer) -> None:
+        try:
+            while line := await reader.readline():
+                response = await self.__respond(line)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def __respond(self, line: bytes) -> dict:
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            self.stats.add_error()
+            return {"error": f"Invalid JSON: {e}"}
+
+        if not isinstance(request, dict):
+            self.stats.add_error()
+            return {"error": "A request is a JSON object"}
+
+        if request.get("metrics"):
+            return {"metrics": self.stats.get_metrics()}
+
+        response = {"id": request["id"]} if "id" in request else {}
+        try:
+            obs = parse_observation(
+                request["obs"], self.flat_observation, self.config
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            self.stats.add_error()
+            response["error"] = f"Invalid observation: {e!r}"
+            return response
+
+        try:
+            action = await self.batcher.predict(obs)
+        except Exception as e:
+            self.stats.add_error()
+            response["error"] = f"Predict failed: {e!r}"
+            return response
+
+        response["action"] = action.tolist()
+
+        return response
+
+
+class PolicyClient:
+    """Blocking client of a policy server.
+
+    For game clients without an event loop.
+    """
+
+    def __init__(
+        self, socket_path: str = None, host: str = host, port: int = port
+    ):
+        if socket_path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(socket_path)
+        else:
+            self.socket = socket.create_connection((host, port))
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.file = self.socket.makefile("rwb")
+
+    def __request(self, request: dict) -> dict:
+        self.file.write(json.dumps(request).encode() + b"\n")
+        self.file.flush()
+        response = json.loads(self.file.readline())
+
+        if "error" in response:
+            raise RuntimeError(response["error"])
+
+        return response
+
+    def predict(self, obs) -> np.ndarray:
+        response = self.__request({"obs": encode_observation(obs)})
+
+        return np.array(response["action"])
+
+    def get_metrics(self) -> dict:
+        return self.__request({"metrics": True})["metrics"]
+
+    def close(self) -> None:
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self) -> "PolicyClient":
+        """Return the client, closed on exit."""
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Close the connection."""
+        self.close()
+
+
+def log_metrics(metrics: dict) -> None:
+    print(
+        tabulate(
+            list(metrics.items()),
+            headers=METRICS_HEADERS,
+            tablefmt="simple_outline",
+        )
+    )
+
+
+# load test ===============================================
+# n_clients games stepped by their own connection, as concurrent game
+# clients would, returns the steps played
+async def run_clients(args, config: GameConfig, open_connection) -> int:
+    from src.env.roller import RollerEnv
+
+    n_client_steps = -(-args.steps // args.clients)
+
+    async def run_client(i: int) -> None:
+        env = RollerEnv(
+            config=config, flatten_observation=args.flat_observation
+        )
+        obs, _ = env.reset(seed=args.seed + i)
+        reader, writer = await open_connection()
+
+        for step in range(n_client_steps):
+            request = {"id": step, "obs": encode_observation(obs)}
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+
+            response = json.loads(await reader.readline())
+            if "error" in response:
+                raise RuntimeError(response["error"])
+
+            obs, _, terminated, truncated, _ = env.step(
+                np.array(response["action"])
+            )
+            if terminated or truncated:
+                obs, _ = env.reset()
+
+        writer.close()
+
+    await asyncio.gather(*(run_client(i) for i in range(args.clients)))
+
+    return n_client_steps * args.clients
+
+
+async def log_periodically(stats: ServingStats, interval: float) -> None:
+    n_requests = 0
+    while True:
+        await asyncio.sleep(interval)
+
+        metrics = stats.get_metrics()
+        if metrics["requests"] != n_requests:
+            n_requests = metrics["requests"]
+            log_metrics(metrics)
+
+
+# removes the socket file of a server that did not shut down, never a file
+# of another kind
+def remove_stale_socket(path: str) -> None:
+    if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+        os.unlink(path)
+
+
+async def serve(args, config: GameConfig) -> int:
+    policy = load_policy(
+        args.policy,
+        args.model_path,
+        args.flat_observation,
+        config,
+        2 * args.max_batch_size + 8,
+    )
+    batcher = MicroBatcher(
+        policy, args.flat_observation, args.max_batch_size, args.max_wait_ms
+    )
+    server = PolicyServer(batcher, args.flat_observation, config)
+
+    if args.socket is not None:
+        remove_stale_socket(args.socket)
+        listener = await asyncio.start_unix_server(
+            server.handle_connection, path=args.socket
+        )
+        address = args.socket
+
+        def open_connection():
+            return asyncio.open_unix_connection(args.socket)
+
+    else:
+        listener = await asyncio.start_server(
+            server.handle_connection, args.host, args.port
+        )
+        address = f"{args.host}:{args.port}"
+
+        def open_connection():
+            return asyncio.open_connection(args.host, args.port)
+
+    tasks = [asyncio.create_task(batcher.run())]
+    if args.log_interval > 0:
+        tasks.append(
+            asyncio.create_task(
+                log_periodically(batcher.stats, args.log_interval)
+            )
+        )
+
+    print(
+        "Serving",
+        args.policy,
+        "on",
+        address,
+        "| Max batch size",
+        args.max_batch_size,
+        "| Max wait (ms)",
+        args.max_wait_ms,
+    )
+
+    async with listener:
+        if args.clients:
+            start_time = time.perf_counter()
+            steps = await run_clients(args, config, open_connection)
+            elapsed_time = time.perf_counter() - start_time
+        else:
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(signum, stop.set)
+            await stop.wait()
+
+    for task in tasks:
+        task.cancel()
+    batcher.close()
+
+    print("\n======== Serving finished ========")
+    log_metrics(batcher.stats.get_metrics())
+    if args.clients:
+        print("Steps / sec: ", round(steps / elapsed_time))
+
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.agent.server",
+        description=(
+            "Serve a policy to game clients over a Unix socket or localhost "
+            "TCP, batching the observations of concurrent clients into one "
+            "predict call."
+        ),
+        allow_abbrev=False,
+    )
+    parser.add_argument(
+        "--policy",
+        default="model",
+        choices=POLICIES,
+        help=(
+            "'model' serves the PPO model of --model_path, 'numpy' the "
+            "--model_path .npz export of one (see src.agent.export), "
+            "'solver' the optimal reroll baseline."
+        ),
+    )
+    parser.add_argument("--model_path", default=model_path, type=str)
+    parser.add_argument(
+        "--flat_observation",
+        default=False,
+        action="store_true",
+        help="The model was trained with --flat_observation.",
+    )
+    parser.add_argument(
+        "--socket",
+        default=None,
+        type=str,
+        help="Listen on this Unix socket instead of --host / --port.",
+    )
+    parser.add_argument("--host", default=host, type=str)
+    parser.add_argument("--port", default=port, type=int)
+    parser.add_argument(
+        "--max_batch_size",
+        default=max_batch_size,
+        type=int,
+        help="Most requests answered by one predict call.",
+    )
+    parser.add_argument(
+        "--max_wait_ms",
+        default=max_wait_ms,
+        type=float,
+        help=(
+            "Longest a request waits for others to join its batch, 0 "
+            "batches only the requests already queued."
+        ),
+    )
+    parser.add_argument(
+        "--log_interval",
+        default=log_interval,
+        type=float,
+        help="Seconds between metrics logs, 0 logs them only at shutdown.",
+    )
+    parser.add_argument(
+        "--clients",
+        default=0,
+        type=int,
+        help=(
+            "Load test: play --steps steps with this many concurrent "
+            "clients, each over its own connection, then exit."
+        ),
+    )
+    parser.add_argument("--steps", default=n_steps, type=int)
+    parser.add_argument(
+        "--seed",
+        default=seed,
+        type=int,
+        help="Seed of the load test envs, client i uses seed + i.",
+    )
+    parser.add_argument(
+        "--config",
+        default=None,
+        type=str,
+        help="GameConfig JSON / TOML file, defaults to src/env/data.",
+    )
+    args = parser.parse_args(argv)
+
+    if args.max_batch_size < 1:
+        parser.error("--max_batch_size must be at least 1")
+
+    config = (
+        GameConfig.from_file(args.config)
+        if args.config
+        else get_default_config()
+    )
+
+    return asyncio.run(serve(args, config))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,9 +6,16 @@ from typing import Callable
 import gymnasium as gym
 
 import src.env  # noqa: F401
+from src.agent.utils.checkpoint import (
+    ResumableCheckpointCallback,
+    load_checkpoint,
+)
+from src.agent.utils.telemetry import TelemetryCallback
+from src.agent.utils.vec_env import START_METHODS, VEC_ENV_TYPES, make_env
+from src.env.game_config import GameConfig, get_default_config
 
 from stable_baselines3 import PPO
-from stable_baselines3.common.callbacks import CheckpointCallback
+from stable_baselines3.common.callbacks import CallbackList
 from stable_baselines3.common.env_checker import check_env
 
 experiment_dir = "experiments"
@@ -19,6 +26,7 @@ save_model_path = "model.zip"
 experiment_name = "experiment"
 base_learning_rate = 0.0003
 batch_size = 64
+n_envs = 1
 
 parser = argparse.ArgumentParser(allow_abbrev=False)
 
@@ -58,11 +66,98 @@ parser.add_argument(
     "--batch_size",
     default=batch_size,
     type=int,
-    help="Size of batch and n_steps for PPO training",
+    help=(
+        "Number of environment steps per PPO update (split across the envs) "
+        "and minibatch size for PPO training"
+    ),
+)
+parser.add_argument(
+    "--n_envs",
+    default=n_envs,
+    type=int,
+    help="Number of environments stepped in parallel.",
+)
+parser.add_argument(
+    "--vec_env",
+    default="dummy",
+    choices=VEC_ENV_TYPES,
+    help=(
+        "How the envs are run: 'dummy' steps them one after another in this "
+        "process, 'subproc' runs one process per env and 'batched' steps "
+        "all of them at once with the in-process VecRollerEnv."
+    ),
+)
+parser.add_argument(
+    "--start_method",
+    default=None,
+    choices=START_METHODS,
+    help=(
+        "Start method of the 'subproc' worker processes, defaults to "
+        "forkserver where available and spawn otherwise."
+    ),
+)
+parser.add_argument(
+    "--seed",
+    default=None,
+    type=int,
+    help="Seed of the model, env i is seeded with seed + i.",
+)
+
+parser.add_argument(
+    "--flat_observation",
+    default=False,
+    action="store_true",
+    help=(
+        "Train on RollerFlat-v1, a single Box observation with an MlpPolicy "
+        "instead of the Dict observation with a MultiInputPolicy."
+    ),
+)
+
+parser.add_argument(
+    "--config",
+    default=None,
+    type=str,
+    help=(
+        "GameConfig JSON / TOML file passed to every env, defaults to the "
+        "constants of src/env/data."
+    ),
+)
+
+parser.add_argument(
+    "--telemetry",
+    default=False,
+    action="store_true",
+    help=(
+        "Log rollout vs update time, env steps / sec, the step latency of "
+        "every env and the memory of the run to tensorboard (telemetry/)."
+    ),
+)
+parser.add_argument(
+    "--telemetry_csv",
+    default=None,
+    type=str,
+    help="Also write the telemetry of every rollout to this CSV file.",
+)
+
+parser.add_argument(
+    "--resume",
+    default=None,
+    type=str,
+    help=(
+        "Checkpoint zip to continue training from, with the same env "
+        "arguments as the run that saved it. --timesteps stays the total of "
+        "the run, the steps already done are not repeated."
+    ),
 )
 
 args, extras = parser.parse_known_args()
 
+env_id = "RollerFlat-v1" if args.flat_observation else "Roller-v1"
+policy = "MlpPolicy" if args.flat_observation else "MultiInputPolicy"
+game_config = (
+    GameConfig.from_file(args.config) if args.config else get_default_config()
+)
+
 # paths
 path_checkpoint = os.path.join(
     experiment_dir, args.experiment_name + "_checkpoints"
@@ -100,34 +195,75 @@ learning_rate = (
     else linear_schedule(base_learning_rate)
 )
 
-env = gym.make("Roller-v1", render_mode="human")
-check_env(env)
 
-model = PPO(
-    "MultiInputPolicy",
-    env,
-    ent_coef=0.0001,
-    verbose=2,
-    n_steps=args.batch_size,
-    batch_size=args.batch_size,
-    tensorboard_log=experiment_dir,
-    learning_rate=learning_rate,
-)
+def train():
+    env_kwargs = {"config": game_config}
+    telemetry = args.telemetry or args.telemetry_csv is not None
 
-checkpoint_callback = CheckpointCallback(
-    save_freq=args.save_checkpoint_frequency,
-    save_path=path_checkpoint,
-    name_prefix=args.experiment_name,
-)
+    check_env(gym.make(env_id, **env_kwargs))
+    env = make_env(
+        env_id,
+        args.n_envs,
+        args.vec_env,
+        args.start_method,
+        args.seed,
+        env_kwargs,
+        time_steps=telemetry,
+    )
+
+    # every env collects its share of the --batch_size steps of a rollout
+    n_steps = max(args.batch_size // args.n_envs, 1)
+
+    if args.resume:
+        model = load_checkpoint(
+            args.resume, env, tensorboard_log=experiment_dir
+        )
+    else:
+        model = PPO(
+            policy,
+            env,
+            ent_coef=0.0001,
+            verbose=2,
+            n_steps=n_steps,
+            batch_size=n_steps * args.n_envs,
+            tensorboard_log=experiment_dir,
+            learning_rate=learning_rate,
+            seed=args.seed,
+        )
+
+    checkpoint_callback = ResumableCheckpointCallback(
+        save_freq=args.save_checkpoint_frequency,
+        save_path=path_checkpoint,
+        name_prefix=args.experiment_name,
+    )
+
+    callbacks = [checkpoint_callback]
+    if telemetry:
+        callbacks.append(TelemetryCallback(args.telemetry_csv))
+
+    learn_arguments = {
+        "total_timesteps": args.timesteps - model.num_timesteps,
+        "callback": CallbackList(callbacks),
+        "tb_log_name": args.experiment_name,
+        # a resumed run continues the counters and tensorboard run
+        "reset_num_timesteps": not args.resume,
+    }
+
+    if learn_arguments["total_timesteps"] > 0:
+        # the checkpoints still queued are written if training is stopped
+        try:
+            model.learn(**learn_arguments)
+        finally:
+            checkpoint_callback.close()
+    else:
+        print("Already trained for", model.num_timesteps, "timesteps")
 
-learn_arguments = {
-    "total_timesteps": args.timesteps,
-    "callback": checkpoint_callback,
-}
+    zip_save_path = pathlib.Path(args.save_model_path).with_suffix(".zip")
+    model.save(zip_save_path)
 
-model.learn(**learn_arguments)
+    env.close()
 
-zip_save_path = pathlib.Path(args.save_model_path).with_suffix(".zip")
-model.save(zip_save_path)
 
-env.close()
+# subproc workers started with spawn / forkserver import this module again
+if __name__ == "__main__":
+    train()
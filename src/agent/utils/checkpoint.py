@@ -0,0 +1,248 @@
+import io
+import os
+import pathlib
+import pickle
+import queue
+import random
+import threading
+
+import numpy as np
+
+from src.agent.utils.vec_env import get_env_states, set_env_states
+
+from stable_baselines3 import PPO
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import VecEnv
+
+import torch
+
+STATE_SUFFIX = ".state.pkl"
+MAX_PENDING_CHECKPOINTS = 1
+
+
+# the state file saved next to the model zip of a checkpoint
+def get_state_path(model_path: str) -> str:
+    return str(pathlib.Path(model_path).with_suffix("")) + STATE_SUFFIX
+
+
+# readers see the old file or the new one, never a partial write
+def write_atomically(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+
+
+class CheckpointWriter:
+    """Writes checkpoint files atomically on a background thread.
+
+    ``submit`` hands over the serialized files, it only blocks while
+    max_pending_checkpoints checkpoints already wait for the disk. A failed
+    write is raised by the next call.
+    """
+
+    def __init__(self, max_pending_checkpoints: int = MAX_PENDING_CHECKPOINTS):
+        self.pending = queue.Queue(maxsize=max_pending_checkpoints)
+        self.error = None
+
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def __run(self) -> None:
+        while True:
+            files = self.pending.get()
+            if files is None:
+                self.pending.task_done()
+                return
+
+            try:
+                for path, data in files:
+                    write_atomically(path, data)
+            except Exception as e:
+                self.error = e
+
+            self.pending.task_done()
+
+    def __check(self) -> None:
+        if self.error is not None:
+            raise RuntimeError("Checkpoint writer failed") from self.error
+
+    # (path, data) pairs, written in order
+    def submit(self, files: [(str, bytes)]) -> None:
+        self.__check()
+        self.pending.put(files)
+
+    def flush(self) -> None:
+        self.pending.join()
+        self.__check()
+
+    def close(self) -> None:
+        self.flush()
+        self.pending.put(None)
+        self.thread.join()
+
+
+# state ===============================================
+def get_vec_normalize_state(model: PPO) -> dict:
+    vec_normalize = model.get_vec_normalize_env()
+    if vec_normalize is None:
+        return None
+
+    return {
+        "obs_rms": vec_normalize.obs_rms,
+        "ret_rms": vec_normalize.ret_rms,
+        "returns": vec_normalize.returns,
+    }
+
+
+def set_vec_normalize_state(model: PPO, state: dict) -> None:
+    vec_normalize = model.get_vec_normalize_env()
+    if state is None or vec_normalize is None:
+        return
+
+    vec_normalize.obs_rms = state["obs_rms"]
+    vec_normalize.ret_rms = state["ret_rms"]
+    vec_normalize.returns = state["returns"]
+
+
+def serialize_checkpoint(model: PPO) -> (bytes, bytes):
+    """Serialize the model zip and the state file of a checkpoint.
+
+    The checkpoint is taken between two rollouts. The zip holds what
+    ``model.save`` keeps: weights, optimizer, schedules and their progress,
+    num_timesteps and the last observations. The state file adds what
+    training continues from but the zip leaves out: the state of every env,
+    VecNormalize statistics and the Python, NumPy and torch generators,
+    which draw the actions and shuffle the minibatches.
+    """
+    buffer = io.BytesIO()
+    model.save(buffer)
+
+    state = {
+        "num_timesteps": model.num_timesteps,
+        "envs": get_env_states(model.get_env()),
+        "vec_normalize": get_vec_normalize_state(model),
+        "random": {
+            "python": random.getstate(),
+            "numpy": np.random.get_state(),
+            "torch": torch.get_rng_state(),
+            "torch_cuda": (
+                torch.cuda.get_rng_state_all()
+                if torch.cuda.is_available()
+                else None
+            ),
+        },
+    }
+
+    return buffer.getvalue(), pickle.dumps(state)
+
+
+def load_checkpoint(path: str, env: VecEnv, **kwargs) -> PPO:
+    """Load a checkpoint zip onto env, built as for the run it comes from.
+
+    With its state file, training continues exactly where the checkpoint
+    was taken. A zip without one, e.g. a saved model, only brings its
+    weights, optimizer and counters, and the envs start new episodes.
+    """
+    state_path = get_state_path(path)
+    if not os.path.exists(state_path):
+        print("No", state_path, "the envs start new episodes")
+        return PPO.load(path, env=env, **kwargs)
+
+    with open(state_path, "rb") as f:
+        state = pickle.load(f)
+
+    model = PPO.load(path, env=env, force_reset=False, **kwargs)
+    if model.num_timesteps != state["num_timesteps"]:
+        raise ValueError(
+            f"{path} is at {model.num_timesteps} steps and {state_path} "
+            f"at {state['num_timesteps']}"
+        )
+
+    # loading seeds the envs, they are reset before taking their states
+    env.reset()
+    set_env_states(env, state["envs"])
+    set_vec_normalize_state(model, state["vec_normalize"])
+
+    random.setstate(state["random"]["python"])
+    np.random.set_state(state["random"]["numpy"])
+    torch.set_rng_state(state["random"]["torch"])
+    if state["random"]["torch_cuda"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["random"]["torch_cuda"])
+
+    return model
+
+
+class ResumableCheckpointCallback(BaseCallback):
+    """Saves a checkpoint every save_freq environment steps.
+
+    ``load_checkpoint`` resumes from them, see ``serialize_checkpoint``.
+
+    Checkpoints are taken at the start of a rollout, after the update of
+    the previous one, so nothing collected is lost. The training thread
+    only serializes them, a CheckpointWriter writes them: the state file
+    first, then ``<name_prefix>_<steps>_steps.zip``, which also loads as a
+    plain model. A zip on disk is a complete checkpoint.
+
+    ``close`` waits for the checkpoints still queued. Call it in a
+    ``finally`` around ``learn``: training that raises does not reach
+    ``_on_training_end``.
+    """
+
+    def __init__(
+        self,
+        save_freq: int,
+        save_path: str,
+        name_prefix: str = "rl_model",
+        max_pending_checkpoints: int = MAX_PENDING_CHECKPOINTS,
+        verbose: int = 0,
+    ):
+        super().__init__(verbose)
+        self.save_freq = save_freq
+        self.save_path = save_path
+        self.name_prefix = name_prefix
+        self.max_pending_checkpoints = max_pending_checkpoints
+        self.writer = None
+        self.last_save = 0
+
+    def _init_callback(self) -> None:
+        os.makedirs(self.save_path, exist_ok=True)
+
+    def _on_training_start(self) -> None:
+        self.writer = CheckpointWriter(self.max_pending_checkpoints)
+        self.last_save = self.num_timesteps
+
+    def _on_rollout_start(self) -> None:
+        if self.num_timesteps - self.last_save < self.save_freq:
+            return
+
+        model_path = os.path.join(
+            self.save_path,
+            f"{self.name_prefix}_{self.num_timesteps}_steps.zip",
+        )
+        model_data, state_data = serialize_checkpoint(self.model)
+        self.writer.submit(
+            [
+                (get_state_path(model_path), state_data),
+                (model_path, model_data),
+            ]
+        )
+        self.last_save = self.num_timesteps
+
+        if self.verbose >= 1:
+            print(f"Saving checkpoint to {model_path}")
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _on_training_end(self) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
@@ -0,0 +1,213 @@
+import json
+
+import numpy as np
+
+from src.env.game_config import GameConfig, get_default_config
+from src.env.utils.spaces import flatten_observation, unflatten_observation
+
+EXPORT_FORMAT = 1
+META_KEY = "meta"
+
+ACTIVATIONS = {
+    "Tanh": np.tanh,
+    "ReLU": lambda x: np.maximum(x, 0),
+    "Identity": lambda x: x,
+}
+EXTRACTORS = ["FlattenExtractor", "CombinedExtractor"]
+
+
+class NumpyPolicy:
+    """The actor of a PPO model for MultiBinary actions, in NumPy.
+
+    A forward pass without torch and without importing stable_baselines3.
+
+    The observation is flattened as the model's features extractor does,
+    dict keys in the model's order, and goes through the policy MLP and the
+    action net in float32. Deterministic actions are the Bernoulli modes,
+    ``round(sigmoid(logits))`` as in stable_baselines3, stochastic ones are
+    sampled from self.rng. Either observation layout is accepted, Dict
+    (Roller-v1) or flat (RollerFlat-v1), single or batched.
+
+    ``from_model`` extracts the weights of a loaded PPO model, ``save`` /
+    ``load`` keep them in one ``.npz`` file.
+    """
+
+    def __init__(
+        self,
+        weights: [np.ndarray],
+        biases: [np.ndarray],
+        activation: str,
+        observation_shapes: dict = None,
+        config: GameConfig = None,
+        seed: int = None,
+    ):
+        if activation not in ACTIVATIONS:
+            raise ValueError(
+                f"Unsupported activation {activation}, "
+                f"expected one of {list(ACTIVATIONS)}"
+            )
+
+        self.weights = [np.asarray(w, dtype=np.float32).T for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activation = activation
+        self.activation_fn = ACTIVATIONS[activation]
+        # key -> shape of a Dict observation model, None for a Box one
+        self.observation_shapes = observation_shapes
+        self.config = config or get_default_config()
+        self.rng = np.random.default_rng(seed)
+
+        self.n_features = self.weights[0].shape[0]
+        self.n_actions = self.weights[-1].shape[1]
+
+    # construction ===============================================
+    @classmethod
+    def from_model(cls, model, config: GameConfig = None) -> "NumpyPolicy":
+        policy = model.policy
+        if type(model.action_space).__name__ != "MultiBinary":
+            raise ValueError(
+                f"Only MultiBinary actions are supported, the model has "
+                f"{model.action_space}"
+            )
+
+        extractor = policy.pi_features_extractor
+        if type(extractor).__name__ not in EXTRACTORS:
+            raise ValueError(
+                f"Unsupported features extractor {type(extractor).__name__}"
+            )
+
+        observation_shapes = None
+        if type(extractor).__name__ == "CombinedExtractor":
+            observation_shapes = {}
+            for key, sub_extractor in extractor.extractors.items():
+                if type(sub_extractor).__name__ != "Flatten":
+                    raise ValueError(f"Observation {key} is not flattened")
+                observation_shapes[key] = model.observation_space[key].shape
+
+        weights, biases, activations = [], [], set()
+        modules = [*policy.mlp_extractor.policy_net, policy.action_net]
+        for module in modules:
+            if type(module).__name__ == "Linear":
+                weights.append(module.weight.detach().cpu().numpy())
+                biases.append(module.bias.detach().cpu().numpy())
+            else:
+                activations.add(type(module).__name__)
+
+        if len(activations) > 1:
+            raise ValueError(f"Mixed activations {sorted(activations)}")
+
+        return cls(
+            weights,
+            biases,
+            activations.pop() if activations else "Identity",
+            observation_shapes,
+            config,
+        )
+
+    @classmethod
+    def load(
+        cls, path: str, config: GameConfig = None, seed: int = None
+    ) -> "NumpyPolicy":
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data[META_KEY]))
+            if meta["format"] != EXPORT_FORMAT:
+                raise ValueError(
+                    f"{path} is in export format {meta['format']}, "
+                    f"expected {EXPORT_FORMAT}"
+                )
+
+            n_layers = meta["n_layers"]
+            weights = [data[f"weight_{i}"] for i in range(n_layers)]
+            biases = [data[f"bias_{i}"] for i in range(n_layers)]
+
+        observation_shapes = meta["observation_shapes"]
+        if observation_shapes is not None:
+            observation_shapes = {
+                key: tuple(shape) for key, shape in observation_shapes.items()
+            }
+
+        return cls(
+            weights,
+            biases,
+            meta["activation"],
+            observation_shapes,
+            config,
+            seed,
+        )
+
+    def save(self, path: str) -> None:
+        meta = {
+            "format": EXPORT_FORMAT,
+            "n_layers": len(self.weights),
+            "activation": self.activation,
+            "observation_shapes": self.observation_shapes,
+        }
+
+        arrays = {META_KEY: np.array(json.dumps(meta))}
+        for i, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"weight_{i}"] = weight.T
+            arrays[f"bias_{i}"] = bias
+
+        np.savez(path, **arrays)
+
+    # inference ===============================================
+    def __is_single(self, obs) -> bool:
+        if not isinstance(obs, dict):
+            return np.ndim(obs) == 1
+
+        key, box = next(iter(self.config.get_observation_space().items()))
+
+        return np.shape(obs[key]) == box.shape
+
+    # (n, n_features) float32 inputs of the MLP, for a batch of either
+    # observation layout
+    def __get_features(self, obs) -> np.ndarray:
+        if self.observation_shapes is None:
+            if isinstance(obs, dict):
+                obs = flatten_observation(obs, self.config)
+
+            return np.asarray(obs, dtype=np.float32)
+
+        if not isinstance(obs, dict):
+            obs = unflatten_observation(np.asarray(obs), self.config)
+
+        n = len(obs[next(iter(self.observation_shapes))])
+
+        return np.concatenate(
+            [
+                np.asarray(obs[key], dtype=np.float32).reshape(n, -1)
+                for key in self.observation_shapes
+            ],
+            axis=1,
+        )
+
+    def get_logits(self, obs) -> np.ndarray:
+        x = self.__get_features(obs)
+
+        for weight, bias in zip(self.weights[:-1], self.biases[:-1]):
+            x = self.activation_fn(x @ weight + bias)
+
+        return x @ self.weights[-1] + self.biases[-1]
+
+    # same signature as BaseAlgorithm.predict
+    def predict(
+        self, obs, state=None, episode_start=None, deterministic=True
+    ) -> (np.ndarray, None):
+        single = self.__is_single(obs)
+        if single:
+            obs = (
+                {key: np.asarray(value)[None] for key, value in obs.items()}
+                if isinstance(obs, dict)
+                else np.asarray(obs)[None]
+            )
+
+        logits = self.get_logits(obs)
+        if deterministic:
+            # round(sigmoid(x)) is 1 exactly when x > 0, 0.5 rounds to 0
+            actions = logits > 0
+        else:
+            probs = 0.5 * (1 + np.tanh(0.5 * logits))
+            actions = self.rng.random(probs.shape) < probs
+
+        actions = actions.astype(np.int64)
+
+        return (actions[0] if single else actions), None
@@ -0,0 +1,98 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from src.env.game_config import GameConfig
+from src.env.reroll_solver import RerollSolver
+from src.env.utils.spaces import unflatten_observation
+
+
+class SolverPolicy:
+    """Optimal reroll baseline with the batched ``predict`` of a PPO model.
+
+    Each env is solved exactly by a RerollSolver for its dice set (and
+    enemy, with the "damage" objective). Solvers are kept in an LRU cache,
+    so a dice set is solved once per episode however many steps it plays.
+    """
+
+    def __init__(
+        self,
+        objective: str = "damage",
+        flat_observation: bool = False,
+        cache_size: int = 64,
+        config: GameConfig = None,
+    ):
+        self.config = config
+        self.objective = objective
+        self.flat_observation = flat_observation
+        self.cache_size = cache_size
+        self.solvers = OrderedDict()
+
+    def __get_solver(self, obs: dict, i: int) -> RerollSolver:
+        values = obs["all_dice_face_values"][i]
+        traits = obs["all_dice_face_traits"][i]
+        enemy_attack, enemy_defense = 0, 0
+        if self.objective == "damage":
+            enemy_attack, enemy_defense = obs["enemy"][i, 2:4].tolist()
+
+        key = (values.tobytes(), traits.tobytes(), enemy_attack, enemy_defense)
+        solver = self.solvers.get(key)
+
+        if solver is None:
+            solver = RerollSolver(
+                values,
+                traits,
+                self.objective,
+                enemy_attack,
+                enemy_defense,
+                self.config,
+            )
+            self.solvers[key] = solver
+            if len(self.solvers) > self.cache_size:
+                self.solvers.popitem(last=False)
+        else:
+            self.solvers.move_to_end(key)
+
+        return solver
+
+    def __iterate_states(self, obs):
+        if self.flat_observation:
+            obs = unflatten_observation(obs, self.config)
+
+        n_remaining_rolls = obs["n_remaining_rolls"][:, 0].tolist()
+
+        for i, n_rolls in enumerate(n_remaining_rolls):
+            solver = self.__get_solver(obs, i)
+            faces_i = solver.get_faces_i(
+                obs["roll_result_values"][i], obs["roll_result_traits"][i]
+            )
+
+            yield i, solver, faces_i, n_rolls
+
+    # same signature as BaseAlgorithm.predict, the solver is deterministic
+    def predict(
+        self, obs, state=None, episode_start=None, deterministic=True
+    ) -> (np.ndarray, None):
+        actions = []
+        for _, solver, faces_i, n_rolls in self.__iterate_states(obs):
+            actions.append(solver.get_action(faces_i, n_rolls))
+
+        return np.array(actions), None
+
+    # compares actions (e.g. the PPO model's) to the optimal ones, returns
+    # whether each matches the optimal action and its expected value loss
+    def evaluate(self, obs, actions) -> (np.ndarray, np.ndarray):
+        n_envs = len(actions)
+        is_optimal = np.zeros(n_envs, dtype=bool)
+        value_gaps = np.zeros(n_envs)
+
+        for i, solver, faces_i, n_rolls in self.__iterate_states(obs):
+            optimal_action = solver.get_action(faces_i, n_rolls)
+            is_optimal[i] = np.array_equal(
+                optimal_action, np.asarray(actions[i]) != 0
+            )
+            value_gaps[i] = solver.get_value(
+                faces_i, n_rolls
+            ) - solver.get_action_value(faces_i, n_rolls, actions[i])
+
+        return is_optimal, value_gaps
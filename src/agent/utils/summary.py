@@ -1,8 +1,176 @@
-import matplotlib.pyplot as plt
-
 import numpy as np
 
-import seaborn as sns
+N_HISTOGRAM_BINS = 20
+PLOT_MODES = ["none", "png", "show"]
+PLOT_LAYOUTS = ["figure", "titles"]
+HISTOGRAMS_PATH = "histograms.png"
+
+
+class StreamingStats:
+    """Constant-memory summary of a stream of values.
+
+    Mean and std are updated with Welford's algorithm and min / max exactly.
+    Quantiles and histograms come from a sketch counting the values rounded
+    to a grid of 1 / scale. The grid starts at 0.01, as fine as the rounded
+    damage diffs, and is made twice coarser whenever more than ``max_bins``
+    cells are in use. Quantiles are therefore exact until then, and off by
+    at most one cell after. Accumulators filled by parallel workers are
+    combined with ``merge``.
+    """
+
+    def __init__(self, values=None, max_bins: int = 4096, scale=100):
+        self.max_bins = max_bins
+        self.scale = scale
+
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        # grid cell -> number of values
+        self.cells = {}
+
+        if values is not None:
+            self.update(values)
+
+    def __len__(self) -> int:
+        """Return the number of values seen."""
+        return self.count
+
+    # sums and grid keys in float64, int16 observations would overflow;
+    # min / max keep the type of the values
+    def update(self, values) -> None:
+        if np.ndim(values) == 0:
+            self.__update_value(values)
+            return
+
+        values = np.asarray(values)
+        if len(values) == 0:
+            return
+
+        n = len(values)
+        floats = values.astype(np.float64)
+        mean = floats.mean()
+        m2 = float(((floats - mean) ** 2).sum())
+        self.__combine(n, float(mean), m2, values.min(), values.max())
+
+        keys, counts = np.unique(
+            np.round(floats * self.scale).astype(np.int64),
+            return_counts=True,
+        )
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.cells[key] = self.cells.get(key, 0) + count
+
+        self.__compress()
+
+    def __update_value(self, value) -> None:
+        self.count += 1
+        delta = float(value) - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (float(value) - self.mean)
+
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+        key = int(round(float(value) * self.scale))
+        self.cells[key] = self.cells.get(key, 0) + 1
+
+        self.__compress()
+
+    # Chan et al. parallel update of (count, mean, m2)
+    def __combine(self, n, mean, m2, min_value, max_value) -> None:
+        count = self.count + n
+        delta = mean - self.mean
+
+        self.mean += delta * n / count
+        self.m2 += m2 + delta**2 * self.count * n / count
+        self.count = count
+
+        if self.min is None or min_value < self.min:
+            self.min = min_value
+        if self.max is None or max_value > self.max:
+            self.max = max_value
+
+    def merge(self, other: "StreamingStats") -> None:
+        if other.count == 0:
+            return
+
+        while self.scale > other.scale:
+            self.__coarsen()
+
+        cells = other.cells
+        factor = other.scale / self.scale
+        while factor > 1:
+            cells = self.__halve(cells)
+            factor /= 2
+
+        self.__combine(other.count, other.mean, other.m2, other.min, other.max)
+        for key, count in cells.items():
+            self.cells[key] = self.cells.get(key, 0) + count
+
+        self.__compress()
+
+    def __compress(self) -> None:
+        while len(self.cells) > self.max_bins:
+            self.__coarsen()
+
+    def __coarsen(self) -> None:
+        self.cells = self.__halve(self.cells)
+        self.scale /= 2
+
+    @staticmethod
+    def __halve(cells: dict) -> dict:
+        keys = np.fromiter(cells.keys(), dtype=np.int64, count=len(cells))
+        counts = np.fromiter(cells.values(), dtype=np.int64, count=len(cells))
+
+        keys, inverse = np.unique(np.round(keys / 2), return_inverse=True)
+        counts = np.bincount(inverse, weights=counts).astype(np.int64)
+
+        return dict(zip(keys.astype(np.int64).tolist(), counts.tolist()))
+
+    # getters
+    def get_mean(self) -> float:
+        return self.mean
+
+    def get_std(self) -> float:
+        if self.count == 0:
+            return 0.0
+
+        return (self.m2 / self.count) ** 0.5
+
+    def get_sketch(self) -> (np.ndarray, np.ndarray):
+        keys = np.array(sorted(self.cells), dtype=np.int64)
+        counts = np.array([self.cells[key] for key in keys], dtype=np.int64)
+
+        return keys / self.scale, counts
+
+    # interpolates between the two closest ranks, like np.quantile
+    def get_quantile(self, q: float) -> float:
+        values, counts = self.get_sketch()
+        ranks = np.cumsum(counts)
+
+        position = q * (self.count - 1)
+        low, high = int(np.floor(position)), int(np.ceil(position))
+        low_value, high_value = values[
+            np.searchsorted(ranks, [low, high], side="right")
+        ]
+
+        return float(low_value + (high_value - low_value) * (position - low))
+
+    def get_median(self) -> float:
+        return self.get_quantile(0.5)
+
+    def get_histogram(self, bins: int = N_HISTOGRAM_BINS):
+        values, counts = self.get_sketch()
+
+        return np.histogram(
+            values,
+            bins=bins,
+            range=(float(self.min), float(self.max)),
+            weights=counts,
+        )
 
 
 def log_rolls(rolls: int) -> None:
@@ -26,15 +194,16 @@ def log_stats(label, data):
         print(f"No {label}")
         return 0, 0, 0, 0
 
-    data = np.array(data)
+    if not isinstance(data, StreamingStats):
+        data = StreamingStats(data)
 
-    best = data.max()
-    worst = data.min()
-    median = np.median(data)
-    mean = data.mean()
+    best = data.max
+    worst = data.min
+    median = data.get_median()
+    mean = data.get_mean()
     mean = round(mean, 2)
 
-    std = np.std(data)
+    std = data.get_std()
     std = round(std, 2)
 
     print("Best: ", best)
@@ -46,27 +215,106 @@ def log_stats(label, data):
     return mean, median, best, worst
 
 
-def plot_histogram(title, xlabel, ylabel, mean, median, best, worst, data):
+# matplotlib and seaborn take a few hundred ms to import, so they are only
+# loaded once a plot is requested
+def import_pyplot(plots: str):
+    import matplotlib
+
+    if plots == "png":
+        matplotlib.use("Agg")
+
+    import matplotlib.pyplot as plt
+
+    import seaborn as sns
+
+    sns.set_style("darkgrid")
+
+    return plt
+
+
+def plot_histogram(
+    ax, title, xlabel, ylabel, mean, median, best, worst, data
+) -> None:
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+
     if len(data) == 0:
         return
 
-    sns.set_style("darkgrid")
-    plt.figure(figsize=(10, 6))
-    plt.title(title)
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-    plt.hist(data, bins=20, color="blue", alpha=0.7)
-    plt.axvline(mean, color="red", linestyle="dashed", linewidth=1)
-    plt.axvline(median, color="orange", linestyle="dashed", linewidth=1)
-    plt.axvline(best, color="green", linestyle="dashed", linewidth=1)
-    plt.axvline(worst, color="purple", linestyle="dashed", linewidth=1)
-    plt.legend({"Mean": mean, "Median": median, "Best": best, "Worst": worst})
-    plt.savefig(f"{title}.png")
-    plt.show()
+    if not isinstance(data, StreamingStats):
+        data = StreamingStats(data)
+    counts, edges = data.get_histogram()
+
+    ax.stairs(counts, edges, fill=True, color="blue", alpha=0.7)
+    lines = {
+        "Mean": (mean, "red"),
+        "Median": (median, "orange"),
+        "Best": (best, "green"),
+        "Worst": (worst, "purple"),
+    }
+    for label, (value, color) in lines.items():
+        ax.axvline(
+            value, color=color, linestyle="dashed", linewidth=1, label=label
+        )
+    ax.legend()
+
+
+# layout "figure" draws every histogram into one figure saved to path,
+# "titles" each into its own figure saved to <title>.png. Figures are shown
+# when plots is "show"
+def plot_histograms(
+    histograms,
+    plots: str,
+    layout: str = "figure",
+    path: str = HISTOGRAMS_PATH,
+):
+    plt = import_pyplot(plots)
+
+    if layout == "titles":
+        figures = []
+        for histogram in histograms:
+            fig, ax = plt.subplots(figsize=(10, 6))
+            plot_histogram(ax, *histogram)
+            fig.savefig(f"{histogram[0]}.png")
+            figures.append(fig)
+
+        if plots == "show":
+            plt.show()
+
+        for fig in figures:
+            plt.close(fig)
+        return
+
+    n_rows = (len(histograms) + 1) // 2
+    fig, axes = plt.subplots(n_rows, 2, figsize=(20, 6 * n_rows))
+    axes = axes.flatten()
+
+    for ax, histogram in zip(axes, histograms):
+        plot_histogram(ax, *histogram)
+    for ax in axes[len(histograms) :]:
+        ax.set_visible(False)
+
+    fig.tight_layout()
+    fig.savefig(path)
+
+    if plots == "show":
+        plt.show()
+
+    plt.close(fig)
 
 
 def log_summary(
-    wins, losses, diffs, damage_dealt, damage_taken, rolls, hands, battles_won
+    wins,
+    losses,
+    diffs,
+    damage_dealt,
+    damage_taken,
+    rolls,
+    hands,
+    battles_won,
+    plots="png",
+    layout="figure",
 ):
     log_win_losses(wins, losses)
     log_rolls(rolls)
@@ -96,53 +344,59 @@ def log_summary(
         battles_won_worst,
     ) = log_stats("Battles won", battles_won)
 
-    plot_histogram(
-        "Difference of damage dealt vs taken",
-        "Difference (%)",
-        "Frequency",
-        diff_mean,
-        diff_median,
-        diff_best,
-        diff_worst,
-        diffs,
-    )
-    plot_histogram(
-        "Damage dealt",
-        "Damage dealt",
-        "Frequency",
-        damage_dealt_mean,
-        damage_dealt_median,
-        damage_dealt_best,
-        damage_dealt_worst,
-        damage_dealt,
-    )
-    plot_histogram(
-        "Damage taken",
-        "Damage taken",
-        "Frequency",
-        damage_taken_mean,
-        damage_taken_median,
-        damage_taken_best,
-        damage_taken_worst,
-        damage_taken,
-    )
-    plot_histogram(
-        "Hands per game",
-        "Hands",
-        "Frequency",
-        hands_mean,
-        hands_median,
-        hands_best,
-        hands_worst,
-        hands,
-    )
-    plot_histogram(
-        "Battles won",
-        "Battles won",
-        "Frequency",
-        battles_won_mean,
-        battles_won_median,
-        battles_won_best,
-        battles_won_worst,
-        battles_won,
-    )
+    if plots == "none":
+        return
+
+    histograms = [
+        (
+            "Difference of damage dealt vs taken",
+            "Difference (%)",
+            "Frequency",
+            diff_mean,
+            diff_median,
+            diff_best,
+            diff_worst,
+            diffs,
+        ),
+        (
+            "Damage dealt",
+            "Damage dealt",
+            "Frequency",
+            damage_dealt_mean,
+            damage_dealt_median,
+            damage_dealt_best,
+            damage_dealt_worst,
+            damage_dealt,
+        ),
+        (
+            "Damage taken",
+            "Damage taken",
+            "Frequency",
+            damage_taken_mean,
+            damage_taken_median,
+            damage_taken_best,
+            damage_taken_worst,
+            damage_taken,
+        ),
+        (
+            "Hands per game",
+            "Hands",
+            "Frequency",
+            hands_mean,
+            hands_median,
+            hands_best,
+            hands_worst,
+            hands,
+        ),
+        (
+            "Battles won",
+            "Battles won",
+            "Frequency",
+            battles_won_mean,
+            battles_won_median,
+            battles_won_best,
+            battles_won_worst,
+            battles_won,
+        ),
+    ]
+    plot_histograms(histograms, plots, layout)
@@ -0,0 +1,146 @@
+import csv
+import resource
+import sys
+import time
+
+import numpy as np
+
+from stable_baselines3.common.callbacks import BaseCallback
+
+
+# ru_maxrss is in bytes on macOS and in KB elsewhere
+MAXRSS_BYTES = 1 if sys.platform == "darwin" else 2**10
+
+
+# memory in MB: rss_mb / workers_rss_mb, the resident memory of this process
+# and of its children (the subproc workers). Without psutil only
+# peak_rss_mb, the peak resident memory of this process
+def get_memory_mb() -> dict:
+    try:
+        import psutil
+    except ImportError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        return {"peak_rss_mb": peak * MAXRSS_BYTES / 2**20}
+
+    process = psutil.Process()
+    children_rss = 0
+    for child in process.children(recursive=True):
+        try:
+            children_rss += child.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+
+    return {
+        "rss_mb": process.memory_info().rss / 2**20,
+        "workers_rss_mb": children_rss / 2**20,
+    }
+
+
+class TelemetryCallback(BaseCallback):
+    """Throughput of a PPO run, split into rollout collection and update.
+
+    Every rollout logs under ``telemetry/``:
+    - rollout_s / update_s: time collecting the rollout / in the PPO update
+      that followed the previous one
+    - env_steps_per_s: environment steps per second of rollout collection,
+      fps the same over rollout and update
+    - worker_step_ms_mean / _max: mean step latency of the envs, averaged
+      over the envs / of the slowest one. Only with envs reporting
+      ``info["step_time"]``, see make_env(time_steps=True)
+    - rss_mb / workers_rss_mb: resident memory of the trainer process and
+      of the subproc workers, or without psutil peak_rss_mb, the peak
+      resident memory of the trainer
+
+    With csv_path, every rollout is also a row of that CSV file, with the
+    mean step latency of each env.
+    """
+
+    def __init__(self, csv_path: str = None, verbose: int = 0):
+        super().__init__(verbose)
+        self.csv_path = csv_path
+        self.csv_file = None
+        self.csv_writer = None
+
+        self.rollout_start = None
+        self.rollout_end = None
+        self.update_time = 0.0
+        self.n_rollouts = 0
+        self.step_times = None
+        self.step_counts = None
+
+    def _on_training_start(self) -> None:
+        n_envs = self.training_env.num_envs
+        self.step_times = np.zeros(n_envs)
+        self.step_counts = np.zeros(n_envs, dtype=np.int64)
+
+        if self.csv_path is not None:
+            self.csv_file = open(self.csv_path, "w", newline="")
+
+    def _on_rollout_start(self) -> None:
+        self.rollout_start = time.perf_counter()
+
+        # the update ran between the end of the last rollout and this one
+        if self.rollout_end is not None:
+            self.update_time = self.rollout_start - self.rollout_end
+
+        self.step_times[:] = 0
+        self.step_counts[:] = 0
+
+    def _on_step(self) -> bool:
+        for i, info in enumerate(self.locals["infos"]):
+            step_time = info.get("step_time")
+            if step_time is not None:
+                self.step_times[i] += step_time
+                self.step_counts[i] += 1
+
+        return True
+
+    def _on_rollout_end(self) -> None:
+        self.rollout_end = time.perf_counter()
+        rollout_time = self.rollout_end - self.rollout_start
+        self.n_rollouts += 1
+
+        n_steps = self.model.n_steps * self.training_env.num_envs
+
+        row = {
+            "rollout": self.n_rollouts,
+            "timesteps": self.num_timesteps,
+            "rollout_s": rollout_time,
+            "update_s": self.update_time,
+            "env_steps_per_s": n_steps / rollout_time,
+            "fps": n_steps / (rollout_time + self.update_time),
+            **get_memory_mb(),
+        }
+
+        timed = self.step_counts > 0
+        if timed.any():
+            worker_ms = self.step_times[timed] / self.step_counts[timed] * 1e3
+            row["worker_step_ms_mean"] = float(worker_ms.mean())
+            row["worker_step_ms_max"] = float(worker_ms.max())
+
+        for name, value in row.items():
+            if name not in ("rollout", "timesteps"):
+                self.logger.record(f"telemetry/{name}", value)
+
+        if self.csv_file is not None:
+            self.__write_row(row, timed)
+
+    def __write_row(self, row: dict, timed: np.ndarray) -> None:
+        for i in np.flatnonzero(timed):
+            row[f"worker_{i}_step_ms"] = (
+                self.step_times[i] / self.step_counts[i] * 1e3
+            )
+
+        if self.csv_writer is None:
+            self.csv_writer = csv.DictWriter(self.csv_file, list(row))
+            self.csv_writer.writeheader()
+
+        self.csv_writer.writerow(row)
+        self.csv_file.flush()
+
+    def _on_training_end(self) -> None:
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+            self.csv_writer = None
@@ -0,0 +1,332 @@
+import time
+
+import gymnasium as gym
+
+import numpy as np
+
+from src.env import BATCHED_ENV_IDS
+from src.env.recorder import (
+    CHUNK_SIZE,
+    INFO_COLUMNS,
+    MAX_PENDING_CHUNKS,
+    TrajectoryWriter,
+    get_columns,
+)
+
+VEC_ENV_TYPES = ["dummy", "subproc", "batched"]
+START_METHODS = ["fork", "forkserver", "spawn"]
+
+
+def make_env(
+    env_id: str,
+    n_envs: int = 1,
+    vec_env: str = "dummy",
+    start_method: str = None,
+    seed: int = None,
+    env_kwargs: dict = None,
+    time_steps: bool = False,
+    sb3: bool = True,
+):
+    """
+    Build n_envs seeded copies of env_id, env i is seeded with seed + i.
+
+    :param vec_env: 'dummy' steps the envs one after another in this
+      process, 'subproc' runs one process per env (started with
+      start_method) and 'batched' steps all of them at once with the
+      in-process VecRollerEnv.
+    :param time_steps: wrap every env in a StepTimeWrapper, ignored by
+      'batched' which has no env of its own.
+    :param sb3: False builds 'dummy' envs as a SyncVecEnv, without
+      importing stable_baselines3. Envs trained on must be sb3 VecEnvs.
+    """
+    env_kwargs = env_kwargs or {}
+
+    # stable_baselines3 imports torch, which takes seconds, so it is only
+    # loaded by the envs built with it
+    if vec_env == "dummy" and not sb3:
+        return SyncVecEnv(
+            env_id,
+            n_envs,
+            seed,
+            env_kwargs,
+            wrapper_class=StepTimeWrapper if time_steps else None,
+        )
+
+    from stable_baselines3.common.env_util import make_vec_env
+    from stable_baselines3.common.vec_env import (
+        DummyVecEnv,
+        SubprocVecEnv,
+        VecMonitor,
+    )
+
+    if vec_env == "batched":
+        env = VecMonitor(
+            gym.make_vec(
+                BATCHED_ENV_IDS[env_id], num_envs=n_envs, **env_kwargs
+            )
+        )
+        env.seed(seed)
+
+        return env
+
+    vec_env_cls = DummyVecEnv
+    vec_env_kwargs = {}
+    if vec_env == "subproc":
+        vec_env_cls = SubprocVecEnv
+        vec_env_kwargs = {"start_method": start_method}
+
+    return make_vec_env(
+        env_id,
+        n_envs=n_envs,
+        seed=seed,
+        env_kwargs=env_kwargs,
+        vec_env_cls=vec_env_cls,
+        vec_env_kwargs=vec_env_kwargs,
+        wrapper_class=StepTimeWrapper if time_steps else None,
+    )
+
+
+# the state of every env of a VecEnv of Roller envs, see RollerEnv.get_state,
+# with the steps of its episode for its TimeLimit. A 'batched' env has one
+# VecRollerEnv state for all of them
+def get_env_states(env):
+    from src.env.vec_roller import VecRollerEnv
+
+    venv = env.unwrapped
+    if isinstance(venv, VecRollerEnv):
+        return venv.get_state()
+
+    return list(
+        zip(
+            env.env_method("get_state"),
+            env.env_method("get_wrapper_attr", "_elapsed_steps"),
+        )
+    )
+
+
+# on envs built by make_env like the ones the states come from, and reset
+def set_env_states(env, states) -> None:
+    from src.env.vec_roller import VecRollerEnv
+
+    venv = env.unwrapped
+    if isinstance(venv, VecRollerEnv) != isinstance(states, dict):
+        raise ValueError(
+            "The env states and the env are not both of the 'batched' type"
+        )
+
+    if isinstance(venv, VecRollerEnv):
+        if len(states["hand"]) != env.num_envs:
+            raise ValueError(
+                f"{len(states['hand'])} env states for {env.num_envs} envs"
+            )
+        venv.set_state(states)
+        return
+
+    if len(states) != env.num_envs:
+        raise ValueError(f"{len(states)} env states for {env.num_envs} envs")
+
+    for i, (state, elapsed_steps) in enumerate(states):
+        env.env_method("set_state", state, indices=i)
+        env.env_method(
+            "set_wrapper_attr", "_elapsed_steps", elapsed_steps, indices=i
+        )
+
+
+class StepTimeWrapper(gym.Wrapper):
+    """Report the time of every step in ``info["step_time"]`` (seconds).
+
+    It is measured where the env runs, e.g. in its subproc worker.
+    """
+
+    def step(self, action):
+        start = time.perf_counter()
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        info["step_time"] = time.perf_counter() - start
+
+        return obs, reward, terminated, truncated, info
+
+
+class SyncVecEnv:
+    """Steps n_envs envs made with ``gym.make(env_id)`` in this process.
+
+    They run one after another, with the API of a stable_baselines3
+    DummyVecEnv (and the same observations, seeded the same way) but
+    without importing it.
+
+    ``step`` returns (obs, rewards, dones, infos): a finished env is reset
+    in place, its last observation stored in
+    ``infos[i]["terminal_observation"]`` and
+    ``infos[i]["TimeLimit.truncated"]`` set when it was truncated.
+    """
+
+    def __init__(
+        self,
+        env_id: str,
+        n_envs: int = 1,
+        seed: int = None,
+        env_kwargs: dict = None,
+        wrapper_class=None,
+    ):
+        self.envs = []
+        for _ in range(n_envs):
+            env = gym.make(env_id, **(env_kwargs or {}))
+            self.envs.append(wrapper_class(env) if wrapper_class else env)
+
+        self.num_envs = n_envs
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+        self.render_mode = self.envs[0].render_mode
+        self.seeds = [None] * n_envs
+        self.actions = None
+
+        self.seed(seed)
+        if seed is not None:
+            for i, env in enumerate(self.envs):
+                env.action_space.seed(seed + i)
+
+    def seed(self, seed: int = None) -> list:
+        if seed is not None:
+            self.seeds = [seed + i for i in range(self.num_envs)]
+
+        return self.seeds
+
+    def __stack(self, observations):
+        if isinstance(self.observation_space, gym.spaces.Dict):
+            return {
+                key: np.stack([obs[key] for obs in observations])
+                for key in self.observation_space.spaces
+            }
+
+        return np.stack(observations)
+
+    # seeds are only used by the first reset
+    def reset(self):
+        observations = [
+            env.reset(seed=seed)[0] for env, seed in zip(self.envs, self.seeds)
+        ]
+        self.seeds = [None] * self.num_envs
+
+        return self.__stack(observations)
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self.actions = actions
+
+    def step_wait(self):
+        observations = []
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        infos = []
+
+        for i, env in enumerate(self.envs):
+            obs, rewards[i], terminated, truncated, info = env.step(
+                self.actions[i]
+            )
+            dones[i] = terminated or truncated
+            info["TimeLimit.truncated"] = truncated and not terminated
+
+            if dones[i]:
+                info["terminal_observation"] = obs
+                obs, _ = env.reset()
+
+            observations.append(obs)
+            infos.append(info)
+
+        return self.__stack(observations), rewards, dones, infos
+
+    def step(self, actions: np.ndarray):
+        self.step_async(actions)
+
+        return self.step_wait()
+
+    def render(self) -> None:
+        if self.render_mode == "human":
+            for env in self.envs:
+                env.render()
+
+    def close(self) -> None:
+        for env in self.envs:
+            env.close()
+
+
+class VecRecorder:
+    """Records the transitions of every env of venv into one trajectory log.
+
+    Same columns as src.env.recorder.RecorderWrapper, the ``env`` column is
+    the index of the env in venv. venv is a stable_baselines3 VecEnv or a
+    SyncVecEnv, whose other attributes the recorder forwards.
+    """
+
+    def __init__(
+        self,
+        venv,
+        path: str,
+        chunk_size: int = CHUNK_SIZE,
+        max_pending_chunks: int = MAX_PENDING_CHUNKS,
+    ):
+        self.venv = venv
+        self.num_envs = venv.num_envs
+        self.observation_space = venv.observation_space
+        self.action_space = venv.action_space
+
+        self.writer = TrajectoryWriter(
+            path,
+            get_columns(venv.observation_space, venv.action_space),
+            chunk_size,
+            max_pending_chunks,
+        )
+        self.episodes = np.zeros(self.num_envs, dtype=np.int32)
+        self.rows = {"env": np.arange(self.num_envs, dtype=np.int16)}
+
+    # the next step overwrites the observation buffers, keep a copy
+    def __set_observations(self, obs) -> None:
+        if isinstance(obs, dict):
+            for key, value in obs.items():
+                self.rows[f"obs.{key}"] = np.array(value)
+        else:
+            self.rows["obs"] = np.array(obs)
+
+    def reset(self):
+        obs = self.venv.reset()
+        self.__set_observations(obs)
+
+        return obs
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self.rows["action"] = np.asarray(actions)
+        self.venv.step_async(actions)
+
+    def step_wait(self):
+        obs, rewards, dones, infos = self.venv.step_wait()
+
+        truncated = np.array(
+            [info.get("TimeLimit.truncated", False) for info in infos]
+        )
+        rows = self.rows
+        rows["reward"] = rewards
+        rows["terminated"] = dones & ~truncated
+        rows["truncated"] = truncated
+        rows["episode"] = self.episodes
+        for name in INFO_COLUMNS:
+            rows[name] = [info.get(name, 0) for info in infos]
+
+        self.writer.extend(rows)
+        self.episodes = self.episodes + dones
+        self.__set_observations(obs)
+
+        return obs, rewards, dones, infos
+
+    def step(self, actions: np.ndarray):
+        self.step_async(actions)
+
+        return self.step_wait()
+
+    def render(self) -> None:
+        self.venv.render()
+
+    def close(self) -> None:
+        self.writer.close()
+        self.venv.close()
+
+    def __getattr__(self, name: str):
+        """Return the attribute name of the wrapped VecEnv."""
+        return getattr(self.venv, name)
@@ -0,0 +1,346 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+import numpy as np
+
+from src.env.data.game import N_ACTIONS, N_DICES, N_TRAITS
+from src.env.game import Game
+from src.env.random_source import RandomSource
+from src.env.roller import RollerEnv
+
+from tabulate import tabulate
+
+seed = 0
+n_calls = 20000
+n_alloc_calls = 2000
+n_vec_envs = 1024
+max_episode_steps = 2000
+tolerance = 0.1
+
+RESULT_HEADERS = [
+    "Benchmark",
+    "Steps / sec",
+    "p50 (us)",
+    "p90 (us)",
+    "p99 (us)",
+    "Alloc bytes / call",
+    "Net blocks / call",
+]
+
+
+# benchmarks ===============================================
+# each one takes (seed, n_calls) and returns call(i), which runs the timed
+# code once and returns the number of environment steps it made (None for
+# benchmarks that are not steps)
+def bench_game_player_turn(seed: int, n_calls: int) -> Callable:
+    game = Game(random_source=RandomSource(np.random.default_rng(seed)))
+    actions = get_actions(seed, n_calls)
+
+    def call(i):
+        _, game_over, _, _, _ = game.player_turn(actions[i])
+        if game_over:
+            game.reset()
+
+        return 1
+
+    return call
+
+
+def bench_game_get_observation(seed: int, n_calls: int) -> Callable:
+    game = Game(random_source=RandomSource(np.random.default_rng(seed)))
+
+    def call(i):
+        game.get_observation()
+
+    return call
+
+
+def bench_trait_manager_apply_traits(seed: int, n_calls: int) -> Callable:
+    game = Game(random_source=RandomSource(np.random.default_rng(seed)))
+    rng = np.random.default_rng(seed)
+    face_traits = rng.integers(0, N_TRAITS, size=(n_calls, N_DICES)).tolist()
+    totals = rng.integers(6, 31, size=(n_calls, 2)).tolist()
+
+    def call(i):
+        attack_total, defense_total = totals[i]
+        game.trait_manager.apply_traits(
+            attack_total, defense_total, face_traits[i]
+        )
+
+    return call
+
+
+def bench_env_step(seed: int, n_calls: int) -> Callable:
+    env = RollerEnv()
+    env.reset(seed=seed)
+    actions = get_actions(seed, n_calls)
+
+    def call(i):
+        _, _, terminated, _, _ = env.step(actions[i])
+        if terminated:
+            env.reset()
+
+        return 1
+
+    return call
+
+
+def bench_env_reset(seed: int, n_calls: int) -> Callable:
+    env = RollerEnv()
+    env.reset(seed=seed)
+
+    def call(i):
+        env.reset()
+
+    return call
+
+
+# full random-policy episodes, truncated like Roller-v1
+def bench_env_episode(seed: int, n_calls: int) -> Callable:
+    env = RollerEnv()
+    env.reset(seed=seed)
+    rng = np.random.default_rng(seed)
+
+    def call(i):
+        env.reset()
+        actions = rng.integers(0, 2, size=(max_episode_steps, N_ACTIONS))
+
+        for step in range(max_episode_steps):
+            _, _, terminated, _, _ = env.step(actions[step])
+            if terminated:
+                break
+
+        return step + 1
+
+    return call
+
+
+def bench_vec_env_step(seed: int, n_calls: int) -> Callable:
+    # stable_baselines3 is only needed by this benchmark
+    from src.env.vec_roller import VecRollerEnv
+
+    env = VecRollerEnv(
+        num_envs=n_vec_envs, max_episode_steps=max_episode_steps
+    )
+    env.seed(seed)
+    env.reset()
+    rng = np.random.default_rng(seed)
+    actions = rng.integers(0, 2, size=(16, n_vec_envs, N_ACTIONS))
+
+    def call(i):
+        env.step(actions[i % len(actions)])
+
+        return n_vec_envs
+
+    return call
+
+
+# name -> (benchmark, fraction of --calls it runs)
+BENCHMARKS = {
+    "game.player_turn": (bench_game_player_turn, 1),
+    "game.get_observation": (bench_game_get_observation, 1),
+    "trait_manager.apply_traits": (bench_trait_manager_apply_traits, 1),
+    "env.step": (bench_env_step, 1),
+    "env.reset": (bench_env_reset, 0.1),
+    "env.episode": (bench_env_episode, 0.005),
+    "vec_env.step": (bench_vec_env_step, 0.01),
+}
+
+
+def get_actions(seed: int, n_calls: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+
+    return rng.integers(0, 2, size=(n_calls, N_ACTIONS))
+
+
+# runner ===============================================
+def time_calls(call: Callable, n_calls: int) -> (np.ndarray, int):
+    latencies = np.empty(n_calls, dtype=np.int64)
+    steps = 0
+
+    for i in range(n_calls):
+        start = time.perf_counter_ns()
+        n_steps = call(i)
+        latencies[i] = time.perf_counter_ns() - start
+
+        steps += 1 if n_steps is None else n_steps
+
+    return latencies, steps
+
+
+# tracing slows every allocation down, so it runs as a separate pass. The
+# bytes of a call are its peak traced memory above what was live before it,
+# blocks are the allocated blocks it leaves behind
+def trace_allocations(call: Callable, n_calls: int) -> (float, float):
+    alloc_bytes = 0
+
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+
+    for i in range(n_calls):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        call(i)
+        _, peak = tracemalloc.get_traced_memory()
+
+        alloc_bytes += peak - current
+
+    net_blocks = sys.getallocatedblocks() - blocks
+    tracemalloc.stop()
+
+    return alloc_bytes / n_calls, net_blocks / n_calls
+
+
+def run_benchmark(name: str, seed: int, n_calls: int) -> Dict[str, float]:
+    benchmark, fraction = BENCHMARKS[name]
+    n_calls = max(int(n_calls * fraction), 10)
+    n_traced_calls = min(n_calls, n_alloc_calls)
+
+    # warm up caches (trait table, observation space) outside the timings
+    benchmark(seed, 1)(0)
+
+    latencies, steps = time_calls(benchmark(seed, n_calls), n_calls)
+    alloc_bytes, net_blocks = trace_allocations(
+        benchmark(seed, n_traced_calls), n_traced_calls
+    )
+
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) / 1000
+
+    return {
+        "calls": n_calls,
+        "steps_per_sec": steps / (latencies.sum() / 1e9),
+        "p50_us": p50,
+        "p90_us": p90,
+        "p99_us": p99,
+        "alloc_bytes_per_call": alloc_bytes,
+        "net_blocks_per_call": net_blocks,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> [str]:
+    regressions = []
+
+    for name, result in results["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+
+        expected = baseline["benchmarks"][name]["steps_per_sec"]
+        ratio = result["steps_per_sec"] / expected
+        result["baseline_ratio"] = ratio
+
+        if ratio < 1 - tolerance:
+            regressions.append(
+                f"{name}: {result['steps_per_sec']:.0f} steps / sec, "
+                f"{(1 - ratio) * 100:.1f}% below the baseline ({expected:.0f})"
+            )
+
+    return regressions
+
+
+def log_results(results: dict) -> None:
+    rows = []
+    for name, result in results["benchmarks"].items():
+        steps_per_sec = f"{result['steps_per_sec']:.0f}"
+        if "baseline_ratio" in result:
+            steps_per_sec += f" ({result['baseline_ratio']:.2f}x)"
+
+        rows.append(
+            [
+                name,
+                steps_per_sec,
+                round(result["p50_us"], 2),
+                round(result["p90_us"], 2),
+                round(result["p99_us"], 2),
+                round(result["alloc_bytes_per_call"]),
+                round(result["net_blocks_per_call"], 2),
+            ]
+        )
+
+    print(tabulate(rows, headers=RESULT_HEADERS, tablefmt="simple_outline"))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.bench",
+        description="Time the Roller game and env on CPU with a fixed seed.",
+        allow_abbrev=False,
+    )
+    parser.add_argument("--seed", default=seed, type=int)
+    parser.add_argument(
+        "--calls",
+        default=n_calls,
+        type=int,
+        help="Timed calls per benchmark, episodes and resets run fewer.",
+    )
+    parser.add_argument(
+        "--benchmarks",
+        nargs="+",
+        default=list(BENCHMARKS),
+        choices=list(BENCHMARKS),
+    )
+    parser.add_argument(
+        "--save_baseline",
+        default=None,
+        type=str,
+        help="Write the results to this JSON file.",
+    )
+    parser.add_argument(
+        "--baseline",
+        default=None,
+        type=str,
+        help=(
+            "Compare against a JSON file written by --save_baseline and exit "
+            "with status 1 if a benchmark got slower than the tolerance."
+        ),
+    )
+    parser.add_argument(
+        "--tolerance",
+        default=tolerance,
+        type=float,
+        help="Allowed steps / sec drop vs the baseline, as a fraction.",
+    )
+    args = parser.parse_args(argv)
+
+    results = {
+        "seed": args.seed,
+        "calls": args.calls,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "benchmarks": {},
+    }
+
+    for name in args.benchmarks:
+        print("Running", name)
+        results["benchmarks"][name] = run_benchmark(
+            name, args.seed, args.calls
+        )
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+    log_results(results)
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if regressions:
+        print("\n======== Regressions ========")
+        for regression in regressions:
+            print(regression)
+
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
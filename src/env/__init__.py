@@ -5,3 +5,30 @@ register(
     entry_point="src.env.roller:RollerEnv",
     max_episode_steps=2000,
 )
+
+register(
+    id="RollerFlat-v1",
+    entry_point="src.env.roller:RollerEnv",
+    max_episode_steps=2000,
+    kwargs={"flatten_observation": True},
+)
+
+# batched counterparts, a stable-baselines3 VecEnv stepping every game with
+# numpy array operations: gym.make_vec("RollerVec-v1", num_envs=1024)
+register(
+    id="RollerVec-v1",
+    vector_entry_point="src.env.vec_roller:VecRollerEnv",
+    max_episode_steps=2000,
+)
+
+register(
+    id="RollerFlatVec-v1",
+    vector_entry_point="src.env.vec_roller:VecRollerEnv",
+    max_episode_steps=2000,
+    kwargs={"flatten_observation": True},
+)
+
+BATCHED_ENV_IDS = {
+    "Roller-v1": "RollerVec-v1",
+    "RollerFlat-v1": "RollerFlatVec-v1",
+}
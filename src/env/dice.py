@@ -1,36 +1,21 @@
-from src.env.data.game import N_DICES, N_DICE_FACES
 from src.env.dice_face import DiceFace
 from src.env.game_enums import DiceType
-from src.env.trait_manager import TraitManager
 
 
 class Dice:
+    """View of one dice of a DiceManager, see DiceFace."""
 
-    def __init__(self, index: int, trait_manager: TraitManager):
-        self.trait_manager = trait_manager
-        self.index = index
-
-        self.n_dices = N_DICES
-        self.n_faces = N_DICE_FACES
-        self.type = DiceType.ATTACK
-
-        self.faces = self.__generate_faces()
-        self.type = self.__generate_type()
+    __slots__ = ("dice_manager", "index", "type", "faces")
 
-    def __generate_faces(self) -> [DiceFace]:
-        faces = []
-
-        for face_i in range(self.n_faces):
-            face = DiceFace(self.trait_manager.get_trait(self.index, face_i))
-            faces.append(face)
-
-        return faces
+    def __init__(self, dice_manager, index: int, dice_type: DiceType):
+        self.dice_manager = dice_manager
+        self.index = index
+        self.type = dice_type
 
-    def __generate_type(self) -> DiceType:
-        if self.index < self.n_dices // 2:
-            return DiceType.ATTACK
-        else:
-            return DiceType.DEFENSE
+        self.faces = [
+            DiceFace(dice_manager, index, face_i)
+            for face_i in range(dice_manager.n_faces)
+        ]
 
     # getters
     def get_faces(self) -> [DiceFace]:
@@ -1,29 +1,27 @@
-import numpy as np
-
-from src.env.data.game import N_MAX_FACE_VALUE, N_MIN_FACE_VALUE, N_TRAITS
-from src.env.data.traits import TRAITS
-from src.env.trait import Trait
+class DiceFace:
+    """View of one face of a DiceManager's dices.
 
+    The value and trait live in the manager's (dices, faces) arrays, so the
+    views are built once and follow every reset.
+    """
 
-class DiceFace:
+    __slots__ = ("dice_manager", "dice_i", "face_i")
 
-    def __init__(self, trait: Trait):
-        self.n_max_face_value = N_MAX_FACE_VALUE
-        self.n_min_face_value = N_MIN_FACE_VALUE
-        self.n_traits = N_TRAITS
-        self.trait_keys = list(TRAITS.keys())
+    def __init__(self, dice_manager, dice_i: int, face_i: int):
+        self.dice_manager = dice_manager
+        self.dice_i = dice_i
+        self.face_i = face_i
 
-        self.trait = trait
-        self.value = self.generate_value()
+    # setters
+    def set_trait(self, trait: int) -> None:
+        self.dice_manager.set_face(self.dice_i, self.face_i, trait=trait)
 
-    def generate_value(self) -> int:
-        return np.random.randint(
-            self.n_min_face_value, self.n_max_face_value + 1
-        )
+    def set_value(self, value: int) -> None:
+        self.dice_manager.set_face(self.dice_i, self.face_i, value=value)
 
     # getters
-    def get_trait(self) -> Trait:
-        return self.trait
+    def get_trait(self) -> int:
+        return self.dice_manager.traits_list[self.dice_i][self.face_i]
 
     def get_value(self) -> int:
-        return self.value
+        return self.dice_manager.values_list[self.dice_i][self.face_i]
@@ -1,26 +1,90 @@
 import numpy as np
 
-from src.env.data.game import N_DICES
 from src.env.dice import Dice
+from src.env.game_config import GameConfig
+from src.env.game_enums import DiceType
+from src.env.random_source import RandomSource
 from src.env.trait_manager import TraitManager
 
 
 class DiceManager:
+    """The value and trait of every dice face, as (dices, faces) arrays.
 
-    def __init__(self, trait_manager: TraitManager):
+    A reset draws every face value at once, dice after dice, and copies the
+    traits of the trait manager. ``values_list`` / ``traits_list`` mirror
+    the arrays as nested lists for the per-face reads of a turn. The Dice
+    and DiceFace views are built once and read the current arrays.
+    """
+
+    def __init__(
+        self,
+        trait_manager: TraitManager,
+        random_source: RandomSource,
+        config: GameConfig,
+    ):
         self.trait_manager = trait_manager
-        self.dices = self.__generate_dices()
+        self.random_source = random_source
+        self.config = config
+        self.n_dices = config.n_dices
+        self.n_faces = config.n_dice_faces
+        self.shape = (self.n_dices, self.n_faces)
+        self.value_range = (config.n_min_face_value, config.n_max_face_value)
+
+        self.values = None
+        self.traits = None
+        self.values_list = None
+        self.traits_list = None
+        self.observation = None
+        # bumped on every change of the faces, for the caches built on them
+        self.version = 0
+
+        self.dices = [
+            Dice(self, i, self.__get_dice_type(i)) for i in range(self.n_dices)
+        ]
+
+        self.reset()
 
-    def __generate_dices(self) -> [Dice]:
-        dices = []
+    def __get_dice_type(self, index: int) -> DiceType:
+        if index < self.n_dices // 2:
+            return DiceType.ATTACK
+        else:
+            return DiceType.DEFENSE
 
-        for i in range(N_DICES):
-            dices.append(Dice(i, self.trait_manager))
+    def __generate_observation(self) -> (np.ndarray[int], np.ndarray[int]):
+        all_dice_face_values = self.values.flatten().astype(np.int16)
+        all_dice_face_traits = self.traits.flatten().astype(np.int16)
 
-        return dices
+        return all_dice_face_values, all_dice_face_traits
+
+    def __update(self) -> None:
+        self.values_list = self.values.tolist()
+        self.traits_list = self.traits.tolist()
+        self.observation = None
+        self.version += 1
 
     def reset(self) -> None:
-        self.dices = self.__generate_dices()
+        min_value, max_value = self.value_range
+
+        self.traits = np.array(self.trait_manager.traits, dtype=np.int64)
+        self.values = self.random_source.integers(
+            min_value, max_value + 1, size=self.shape
+        )
+        self.__update()
+
+    # sets every face in place, as laid out in the observation
+    def set_faces(self, values: [int], traits: [int]) -> None:
+        self.values = np.array(values, dtype=np.int64).reshape(self.shape)
+        self.traits = np.array(traits, dtype=np.int64).reshape(self.shape)
+        self.__update()
+
+    def set_face(
+        self, dice_i: int, face_i: int, value: int = None, trait: int = None
+    ) -> None:
+        if value is not None:
+            self.values[dice_i, face_i] = value
+        if trait is not None:
+            self.traits[dice_i, face_i] = trait
+        self.__update()
 
     # getters
     def get_dices(self) -> [Dice]:
@@ -29,24 +93,12 @@ class DiceManager:
     def get_dice(self, i: int) -> Dice:
         return self.dices[i]
 
-    def get_observation(self) -> ([int], [int]):
-        all_dice_face_values = []
-        all_dice_face_traits = []
-
-        for dice in self.dices:
-            dice_face_values = []
-            dice_face_traits = []
+    # the dices only change on reset, so the observation is built once per
+    # episode and shared by every step. Like the blocks of VecGame it is not
+    # flagged read-only since torch warns on non-writable arrays, callers
+    # must not write to it
+    def get_observation(self) -> (np.ndarray[int], np.ndarray[int]):
+        if self.observation is None:
+            self.observation = self.__generate_observation()
 
-            for face in dice.get_faces():
-                face_value = face.get_value()
-                face_trait = face.get_trait()
-                dice_face_values.append(face_value)
-                dice_face_traits.append(face_trait)
-
-            all_dice_face_values.append(dice_face_values)
-            all_dice_face_traits.append(dice_face_traits)
-
-        return (
-            np.array(all_dice_face_values, dtype=np.int16).flatten(),
-            np.array(all_dice_face_traits, dtype=np.int16).flatten(),
-        )
+        return self.observation
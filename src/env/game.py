@@ -1,25 +1,10 @@
 import numpy as np
 
-from src.env.data.game import (
-    MAX_ENEMY_ATTACK,
-    MAX_ENEMY_DEFENSE,
-    MAX_ENEMY_HP,
-    MAX_PLAYER_ATTACK,
-    MAX_PLAYER_DEFENSE,
-    MAX_PLAYER_HP,
-    MIN_ENEMY_ATTACK,
-    MIN_ENEMY_DEFENSE,
-    MIN_ENEMY_HP,
-    MIN_PLAYER_ATTACK,
-    MIN_PLAYER_DEFENSE,
-    MIN_PLAYER_HP,
-    N_DICES,
-    N_DICE_FACES,
-    N_MAX_ROLLS,
-)
-from src.env.data.traits import TRAITS
 from src.env.dice_manager import DiceManager
+from src.env.game_config import GameConfig, get_default_config
 from src.env.game_enums import WinnerType
+from src.env.observation_buffer import ObservationBuffer
+from src.env.random_source import STATE_SIZE, RandomSource
 from src.env.roll_manager import RollManager
 from src.env.trait_manager import TraitManager
 from src.env.unit import Unit
@@ -27,40 +12,81 @@ from src.env.unit import Unit
 
 class Game:
 
-    def __init__(self):
-        self.n_max_rolls = N_MAX_ROLLS
-        self.n_remaining_rolls = N_MAX_ROLLS
-        self.n_dices = N_DICES
-        self.n_faces = N_DICE_FACES
-        self.traits = TRAITS
+    def __init__(
+        self,
+        observation_buffer: ObservationBuffer = None,
+        random_source: RandomSource = None,
+        config: GameConfig = None,
+    ):
+        if random_source is None:
+            random_source = RandomSource(np.random.default_rng())
+
+        self.observation_buffer = observation_buffer
+        self.random_source = random_source
+        self.config = config or get_default_config()
+        self.n_max_rolls = self.config.n_max_rolls
+        self.n_remaining_rolls = self.n_max_rolls
+        self.n_dices = self.config.n_dices
+        self.n_faces = self.config.n_dice_faces
+        self.traits = self.config.traits
         self.enemies_defeated = 0
 
-        self.enemy = Unit(
-            MIN_ENEMY_HP,
-            MAX_ENEMY_HP,
-            MIN_ENEMY_ATTACK,
-            MAX_ENEMY_ATTACK,
-            MIN_ENEMY_DEFENSE,
-            MAX_ENEMY_DEFENSE,
-            level=self.enemies_defeated + 1,
-        )
-        self.player = Unit(
-            MIN_PLAYER_HP,
-            MAX_PLAYER_HP,
-            MIN_PLAYER_ATTACK,
-            MAX_PLAYER_ATTACK,
-            MIN_PLAYER_DEFENSE,
-            MAX_PLAYER_DEFENSE,
+        # snapshot layout: n_remaining_rolls, enemies_defeated, damage_done,
+        # player and enemy (level, max hp, hp, attack, defense), face index
+        # rolled on each dice, the state of the random source, then the
+        # value and the trait of every dice face
+        self.snapshot_random = 4 + 2 * 5 + self.n_dices
+        self.snapshot_faces = self.snapshot_random + STATE_SIZE
+        self.snapshot_size = (
+            self.snapshot_faces + 2 * self.n_dices * self.n_faces
         )
 
-        self.trait_manager = TraitManager()
-        self.dice_manager = DiceManager(self.trait_manager)
-        self.roll_manager = RollManager(self.dice_manager)
+        self.enemy = self.__generate_enemy()
+        self.player = self.__generate_player()
+
+        self.trait_manager = TraitManager(self.random_source, self.config)
+        self.dice_manager = DiceManager(
+            self.trait_manager, self.random_source, self.config
+        )
+        self.roll_manager = RollManager(
+            self.dice_manager, self.random_source, self.config
+        )
 
         self.damage_done = [0, 0]
 
+        self.snapshot_faces_cache = None
+        self.snapshot_faces_source = None
+
         self.reset()
 
+    # generators ===============================================
+    def __generate_player(self) -> Unit:
+        config = self.config
+
+        return Unit(
+            config.min_player_hp,
+            config.max_player_hp,
+            config.min_player_attack,
+            config.max_player_attack,
+            config.min_player_defense,
+            config.max_player_defense,
+            self.random_source,
+        )
+
+    def __generate_enemy(self, level: int = 1) -> Unit:
+        config = self.config
+
+        return Unit(
+            config.min_enemy_hp,
+            config.max_enemy_hp,
+            config.min_enemy_attack,
+            config.max_enemy_attack,
+            config.min_enemy_defense,
+            config.max_enemy_defense,
+            self.random_source,
+            level=level,
+        )
+
     # game flow ===============================================
     def reset(self):
         self.damage_done = [0, 0]
@@ -69,36 +95,15 @@ class Game:
         self.trait_manager.reset()
         self.dice_manager.reset()
 
-        self.player = Unit(
-            MIN_PLAYER_HP,
-            MAX_PLAYER_HP,
-            MIN_PLAYER_ATTACK,
-            MAX_PLAYER_ATTACK,
-            MIN_PLAYER_DEFENSE,
-            MAX_PLAYER_DEFENSE,
-        )
-        self.enemy = Unit(
-            MIN_ENEMY_HP,
-            MAX_ENEMY_HP,
-            MIN_ENEMY_ATTACK,
-            MAX_ENEMY_ATTACK,
-            MIN_ENEMY_DEFENSE,
-            MAX_ENEMY_DEFENSE,
-        )
+        self.player.generate()
+        self.enemy.generate()
 
         return self.new_turn()
 
     def next_battle(self, rolled):
         self.enemies_defeated += 1
 
-        self.enemy = Unit(
-            MIN_ENEMY_HP,
-            MAX_ENEMY_HP,
-            MIN_ENEMY_ATTACK,
-            MAX_ENEMY_ATTACK,
-            MIN_ENEMY_DEFENSE,
-            MAX_ENEMY_DEFENSE,
-        )
+        self.enemy.generate()
 
         return self.new_turn(
             rolled, winner=WinnerType.NONE, hand_played=True, new_battle=True
@@ -140,12 +145,7 @@ class Game:
         rolled = should_roll
 
         if should_roll:
-            for i in range(N_DICES):
-                if roll_dices_i[i] == 0:
-                    continue
-
-                self.roll_manager.roll_dice(i)
-
+            self.roll_manager.roll_dices(roll_dices_i)
             self.consume_roll()
 
         if self.n_remaining_rolls == 0 or not should_roll:
@@ -193,6 +193,70 @@ class Game:
 
         self.set_damage_done(damage_to_player, damage_to_enemy)
 
+    # snapshots ===============================================
+    # packs every piece of mutable state, random source included, into one
+    # float64 array of snapshot_size values. Restoring it replays the game
+    # exactly, so planners can branch from the same state many times
+    def snapshot(self, out: np.ndarray = None) -> np.ndarray:
+        if out is None:
+            out = np.empty(self.snapshot_size, dtype=np.float64)
+
+        out[: self.snapshot_faces] = [
+            self.n_remaining_rolls,
+            self.enemies_defeated,
+            *self.damage_done,
+            *self.player.get_state(),
+            *self.enemy.get_state(),
+            *self.roll_manager.get_roll_results_faces_i(),
+            *self.random_source.get_state(),
+        ]
+        out[self.snapshot_faces :] = self.get_snapshot_faces()[0]
+
+        return out
+
+    def restore(self, state: np.ndarray) -> None:
+        state = state.tolist()
+        head = [
+            int(value) if value.is_integer() else value
+            for value in state[: self.snapshot_random]
+        ]
+
+        self.n_remaining_rolls = head[0]
+        self.enemies_defeated = head[1]
+        self.damage_done = head[2:4]
+        self.player.set_state(head[4:9])
+        self.enemy.set_state(head[9:14])
+
+        # the dices only change on reset, so a branch of the same episode
+        # keeps its faces
+        faces = state[self.snapshot_faces :]
+        if faces != self.get_snapshot_faces()[1]:
+            n_faces = self.n_dices * self.n_faces
+            values = [int(value) for value in faces[:n_faces]]
+            traits = np.array(faces[n_faces:], dtype=np.int64)
+
+            self.trait_manager.set_traits(
+                traits.reshape(self.n_dices, self.n_faces)
+            )
+            self.dice_manager.set_faces(values, traits.tolist())
+
+        self.roll_manager.set_roll_results(head[14:])
+        self.random_source.set_state(
+            state[self.snapshot_random : self.snapshot_faces]
+        )
+
+    # the dice faces of a snapshot as an array and a list, rebuilt when the
+    # dice observation changes
+    def get_snapshot_faces(self) -> (np.ndarray, list):
+        values, traits = self.dice_manager.get_observation()
+
+        if self.snapshot_faces_source is not values:
+            faces = np.concatenate([values, traits]).astype(np.float64)
+            self.snapshot_faces_cache = (faces, faces.tolist())
+            self.snapshot_faces_source = values
+
+        return self.snapshot_faces_cache
+
     # setters ===============================================
     def set_damage_done(self, damage_to_player, damage_to_enemy):
         self.damage_done = [damage_to_player, damage_to_enemy]
@@ -208,8 +272,7 @@ class Game:
         return WinnerType.NONE
 
     def calculate_roll_results(self):
-        roll_results = self.roll_manager.get_roll_results()
-        face_traits = self.trait_manager.get_face_traits(roll_results)
+        face_traits = self.roll_manager.get_roll_results_traits()
 
         attack_total, defense_total = (
             self.roll_manager.get_roll_results_totals_by_dice_type()
@@ -221,21 +284,18 @@ class Game:
 
         return attack_total, defense_total
 
-    def get_roll_results_observation(self):
+    def get_observation(self, prev_damage_done=[0, 0]):
         attack_total, defense_total = self.calculate_roll_results()
 
-        return np.array(
-            [float(attack_total), float(defense_total)], dtype=np.float16
-        )
-
-    def get_damage_done_observation(self):
-        return np.array(self.damage_done, dtype=np.int16)
+        self.player.set_attack(attack_total)
+        self.player.set_defense(defense_total)
 
-    def get_observation(self, prev_damage_done=[0, 0]):
-        roll_results = self.get_roll_results_observation()
+        damage_done = self.damage_done
+        if prev_damage_done[0] != 0 or prev_damage_done[1] != 0:
+            damage_done = prev_damage_done
 
-        self.player.set_attack(roll_results[0])
-        self.player.set_defense(roll_results[1])
+        if self.observation_buffer is not None:
+            return self.write_observation(self.observation_buffer, damage_done)
 
         enemy = self.enemy.get_observation()
         player = self.player.get_observation()
@@ -248,14 +308,10 @@ class Game:
         )
         traits = self.trait_manager.get_observation()
 
-        damage_done = self.get_damage_done_observation()
-        if prev_damage_done[0] != 0 or prev_damage_done[1] != 0:
-            damage_done = np.array(prev_damage_done, dtype=np.int16)
-
         return {
             "all_dice_face_traits": all_dice_face_traits,
             "all_dice_face_values": all_dice_face_values,
-            "damage_done": damage_done,
+            "damage_done": np.array(damage_done, dtype=np.int16),
             "enemy": enemy,
             "n_remaining_rolls": np.array(
                 [self.n_remaining_rolls], dtype=np.int16
@@ -265,3 +321,27 @@ class Game:
             "roll_result_values": roll_result_values,
             "traits": traits,
         }
+
+    # fills the preallocated buffer in place, the returned views are
+    # overwritten by the next observation
+    def write_observation(self, out: ObservationBuffer, damage_done):
+        views = out.views
+
+        self.enemy.write_observation(views["enemy"])
+        self.player.write_observation(views["player"])
+        self.roll_manager.write_observation(
+            views["roll_result_values"], views["roll_result_traits"]
+        )
+
+        all_dice_face_values, all_dice_face_traits = (
+            self.dice_manager.get_observation()
+        )
+        out.write_cached("all_dice_face_values", all_dice_face_values)
+        out.write_cached("all_dice_face_traits", all_dice_face_traits)
+        out.write_cached("traits", self.trait_manager.get_observation())
+
+        views["damage_done"][0] = damage_done[0]
+        views["damage_done"][1] = damage_done[1]
+        views["n_remaining_rolls"][0] = self.n_remaining_rolls
+
+        return views
@@ -0,0 +1,257 @@
+import json
+import pathlib
+from functools import lru_cache
+from typing import Callable, Dict
+
+import numpy as np
+
+from src.env.data import game as game_data
+from src.env.data.traits import TRAITS
+from src.env.game_enums import EffectType, OperationType
+from src.env.trait import Trait
+from src.env.trait_effect import TraitEffect
+from src.env.trait_effects import TraitEffects
+
+# constants of src/env/data/game.py a config sets, read from the module by
+# default. MIN_ROLL / MAX_ROLL are derived from them
+GAME_CONSTANTS = [
+    "N_ACTIONS",
+    "N_DICES",
+    "N_DICE_FACES",
+    "N_DICE_TYPES",
+    "N_MAX_FACE_VALUE",
+    "N_MIN_FACE_VALUE",
+    "N_MAX_ROLLS",
+    "MIN_PLAYER_HP",
+    "MAX_PLAYER_HP",
+    "MIN_ENEMY_HP",
+    "MAX_ENEMY_HP",
+    "INCREMENT_ENEMY_HP",
+    "MIN_ENEMY_ATTACK",
+    "MAX_ENEMY_ATTACK",
+    "MIN_ENEMY_DEFENSE",
+    "MAX_ENEMY_DEFENSE",
+    "MIN_PLAYER_ATTACK",
+    "MAX_PLAYER_ATTACK",
+    "MIN_PLAYER_DEFENSE",
+    "MAX_PLAYER_DEFENSE",
+    "N_TRAITS",
+    "WIN_REWARD",
+    "LOSE_REWARD",
+    "BETTER_ROLL_REWARD",
+    "WORST_ROLL_REWARD",
+    "BETTER_DAMAGE_REWARD",
+    "WORST_DAMAGE_REWARD",
+    "TRAIT_DISTRIBUTION",
+]
+
+
+class GameConfig:
+    """Every parameter of a game, and the tables derived from them.
+
+    Constants are attributes named like the ones of src/env/data/game.py in
+    lower case (``config.max_enemy_hp``), ``traits`` maps trait keys to
+    Trait objects like src/env/data/traits.py. Both default to those
+    modules, so ``GameConfig()`` is the game as shipped.
+
+    The trait table, the observation spaces and the other derived tables
+    are built on first use and kept by the config, envs built with the same
+    config object share them. A config must not be changed once in use.
+    """
+
+    def __init__(
+        self, constants: dict = None, traits: Dict[int, Trait] = None
+    ):
+        constants = constants or {}
+
+        unknown = set(constants) - set(GAME_CONSTANTS)
+        if unknown:
+            raise ValueError(f"Unknown game constants {sorted(unknown)}")
+
+        for name in GAME_CONSTANTS:
+            setattr(
+                self,
+                name.lower(),
+                constants.get(name, getattr(game_data, name)),
+            )
+
+        self.traits = TRAITS if traits is None else traits
+        self.trait_keys = list(self.traits.keys())
+        self.max_roll = self.n_dices * self.n_max_face_value / 2
+        self.min_roll = self.n_dices * self.n_min_face_value / 2
+
+        self.__validate()
+
+        self.tables = {}
+
+    def __validate(self) -> None:
+        if self.n_actions != self.n_dices:
+            raise ValueError("N_ACTIONS must be equal to N_DICES")
+
+        if self.trait_keys != list(range(self.n_traits)):
+            raise ValueError(f"Traits must be keyed 0..{self.n_traits - 1}")
+
+        if len(self.trait_distribution) != self.n_traits:
+            raise ValueError("TRAIT_DISTRIBUTION needs one value per trait")
+
+    # loading ===============================================
+    # JSON / TOML keys are the names of GAME_CONSTANTS, and TRAITS for the
+    # traits: {key: {"name": str, "effects": {level: [effect, ...]}}} with
+    # effects as {"type": "ATTACK", "value": 5, "operation": "MULTIPLY"}.
+    # Missing constants keep their default, levels without effects can be
+    # left out
+    @classmethod
+    def from_dict(cls, data: dict) -> "GameConfig":
+        data = dict(data)
+        traits = data.pop("TRAITS", None)
+
+        if traits is not None:
+            n_levels = data.get("N_DICES", game_data.N_DICES)
+            traits = {
+                int(key): cls.__parse_trait(trait, n_levels)
+                for key, trait in traits.items()
+            }
+
+        return cls(data, traits)
+
+    @classmethod
+    def from_file(cls, path: str) -> "GameConfig":
+        path = pathlib.Path(path)
+
+        if path.suffix == ".toml":
+            # Python 3.11+, only needed for TOML files
+            import tomllib
+
+            with open(path, "rb") as f:
+                return cls.from_dict(tomllib.load(f))
+
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @staticmethod
+    def __parse_trait(trait: dict, n_levels: int) -> Trait:
+        effects = {level: None for level in range(1, n_levels + 1)}
+
+        for level, level_effects in trait.get("effects", {}).items():
+            effects[int(level)] = [
+                TraitEffect(
+                    effect_type=EffectType[effect["type"]],
+                    value=GameConfig.__parse_effect_value(effect["value"]),
+                    operation=OperationType[effect["operation"]],
+                )
+                for effect in level_effects
+            ] or None
+
+        return Trait(trait["name"], TraitEffects(effects))
+
+    # the trait table and the int16 observation hold integer values only
+    @staticmethod
+    def __parse_effect_value(value) -> int:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Trait effect value {value!r} is not a number")
+
+        if value != int(value):
+            raise ValueError(f"Trait effect value {value} is not an integer")
+
+        return int(value)
+
+    def to_dict(self) -> dict:
+        data = {name: getattr(self, name.lower()) for name in GAME_CONSTANTS}
+        data["TRAIT_DISTRIBUTION"] = list(self.trait_distribution)
+
+        data["TRAITS"] = {
+            str(key): {
+                "name": trait.name,
+                "effects": {
+                    str(level): [
+                        {
+                            "type": effect.get_type().name,
+                            "value": effect.get_value(),
+                            "operation": effect.get_operation().name,
+                        }
+                        for effect in effects
+                    ]
+                    for level, effects in trait.effects.get_effects().items()
+                    if effects
+                },
+            }
+            for key, trait in self.traits.items()
+        }
+
+        return data
+
+    # derived tables ===============================================
+    def __get_table(self, name: str, build: Callable):
+        if name not in self.tables:
+            self.tables[name] = build()
+
+        return self.tables[name]
+
+    def get_trait_table(self):
+        # the trait table module imports this one
+        from src.env.trait_table import TraitTable
+
+        return self.__get_table("trait_table", lambda: TraitTable(self))
+
+    # the serialized trait effects, the "traits" block of the observation,
+    # shared by every env of the config: callers must not write to it
+    def get_traits_observation(self) -> np.ndarray[np.int16]:
+        return self.__get_table(
+            "traits_observation", self.__build_traits_observation
+        )
+
+    def __build_traits_observation(self) -> np.ndarray[np.int16]:
+        traits = []
+        for i in range(self.n_traits):
+            # append each element of the serialized trait
+            traits.extend(self.traits[i].get_observation())
+
+        return np.array(traits, dtype=np.int16).flatten()
+
+    def get_number_of_trait_effects(self) -> int:
+        return self.__get_table(
+            "number_of_trait_effects",
+            lambda: sum(
+                effects is not None
+                for trait in self.traits.values()
+                for effects in trait.effects.get_effects().values()
+            ),
+        )
+
+    def get_action_space(self):
+        from src.env.utils import spaces
+
+        return self.__get_table(
+            "action_space", lambda: spaces.build_action_space(self)
+        )
+
+    def get_observation_space(self):
+        from src.env.utils import spaces
+
+        return self.__get_table(
+            "observation_space", lambda: spaces.build_observation_space(self)
+        )
+
+    def get_flat_observation_space(self):
+        from src.env.utils import spaces
+
+        return self.__get_table(
+            "flat_observation_space",
+            lambda: spaces.build_flat_observation_space(self),
+        )
+
+    def get_observation_offsets(self) -> dict:
+        from src.env.utils import spaces
+
+        return self.__get_table(
+            "observation_offsets",
+            lambda: spaces.get_observation_offsets(
+                self.get_observation_space()
+            ),
+        )
+
+
+# the shipped game, shared by every env built without a config
+@lru_cache(maxsize=None)
+def get_default_config() -> GameConfig:
+    return GameConfig()
@@ -0,0 +1,61 @@
+import numpy as np
+
+from gymnasium import spaces
+
+from src.env.utils.spaces import get_observation_offsets
+
+
+class ObservationBuffer:
+    """Preallocated storage for Roller observations.
+
+    Every key of the Dict observation space is a slice of one contiguous
+    int16 array, laid out in observation space order. ``views`` maps each
+    key to its slice shaped like the key's Box, so writers fill it in place
+    and readers get the same dict object back every step. ``buffer`` itself
+    is the flat observation (see src.env.utils.spaces).
+
+    With ``batch_shape`` every key gets leading batch dimensions, and
+    ``get_row(i)`` returns a buffer sharing the memory of row ``i`` so a
+    vectorized wrapper can hand each env its own row.
+    """
+
+    def __init__(
+        self,
+        observation_space: spaces.Dict,
+        batch_shape: tuple = (),
+        buffer: np.ndarray = None,
+    ):
+        self.observation_space = observation_space
+        self.batch_shape = tuple(batch_shape)
+        self.offsets = get_observation_offsets(observation_space)
+
+        size = max(end for _, end in self.offsets.values())
+        self.size = size
+
+        if buffer is None:
+            buffer = np.zeros((*self.batch_shape, size), dtype=np.int16)
+        self.buffer = buffer
+
+        self.views = {}
+        for key, (start, end) in self.offsets.items():
+            shape = observation_space.spaces[key].shape
+            self.views[key] = buffer[..., start:end].reshape(
+                *self.batch_shape, *shape
+            )
+
+        # cached blocks already copied into the buffer, by key
+        self.sources = {}
+
+    def get_row(self, i: int) -> "ObservationBuffer":
+        return ObservationBuffer(
+            self.observation_space, self.batch_shape[1:], self.buffer[i]
+        )
+
+    def write_cached(self, key: str, array: np.ndarray) -> None:
+        # blocks like the dice faces are rebuilt rather than modified, so
+        # an unchanged object means the buffer already holds its values
+        if self.sources.get(key) is array:
+            return
+
+        self.views[key][...] = array
+        self.sources[key] = array
@@ -0,0 +1,267 @@
+import argparse
+import cProfile
+import json
+import sys
+import time
+from typing import Dict
+
+import numpy as np
+
+from src.env.game import Game
+
+from tabulate import tabulate
+
+seed = 0
+n_steps = 100000
+max_events = 1000000
+
+# name -> (component of Game holding the method, None for the game itself,
+# method) timed by a Profiler
+PROFILED_METHODS = {
+    "game.player_turn": (None, "player_turn"),
+    "game.reset": (None, "reset"),
+    "game.handle_fight": (None, "handle_fight"),
+    "game.get_observation": (None, "get_observation"),
+    "roll_manager.roll_dices": ("roll_manager", "roll_dices"),
+    "roll_manager.roll_all_dices": ("roll_manager", "roll_all_dices"),
+    "trait_manager.apply_traits": ("trait_manager", "apply_traits"),
+}
+
+RESULT_HEADERS = [
+    "Method",
+    "Calls",
+    "Total (ms)",
+    "Mean (us)",
+    "Max (us)",
+    "% of player_turn",
+    "Net blocks / call",
+]
+
+
+class Profiler:
+    """Per-call timers on the PROFILED_METHODS of attached games.
+
+    ``attach`` shadows each method with a timed wrapper on the instance and
+    ``detach`` removes it, so a game without a profiler runs the plain
+    methods at no cost. Every call adds its time to the method's stats and,
+    with allocations=True, the net blocks it left allocated
+    (``sys.getallocatedblocks``, slow enough to inflate the times of the
+    methods around it). Nested methods are timed inclusively, e.g.
+    apply_traits is part of get_observation.
+
+    With trace=True, the first max_events open / close events are kept for
+    ``dump_speedscope``.
+    """
+
+    def __init__(
+        self,
+        allocations: bool = False,
+        trace: bool = False,
+        max_events: int = max_events,
+    ):
+        self.names = list(PROFILED_METHODS)
+        # calls, total ns, max ns, net allocated blocks
+        self.stats = {name: [0, 0, 0, 0] for name in self.names}
+        self.allocations = allocations
+        self.trace = trace
+        self.max_events = max_events
+        self.events = []
+
+    def __wrap(self, name: str, method):
+        stats = self.stats[name]
+        events = self.events if self.trace else None
+        frame = self.names.index(name)
+        max_events = self.max_events
+        allocations = self.allocations
+        perf_counter_ns = time.perf_counter_ns
+        getallocatedblocks = sys.getallocatedblocks
+
+        def profiled(*args, **kwargs):
+            traced = events is not None and len(events) < max_events
+            if traced:
+                events.append(("O", frame, perf_counter_ns()))
+
+            if allocations:
+                blocks = getallocatedblocks()
+
+            start = perf_counter_ns()
+            result = method(*args, **kwargs)
+            elapsed = perf_counter_ns() - start
+
+            stats[0] += 1
+            stats[1] += elapsed
+            if elapsed > stats[2]:
+                stats[2] = elapsed
+            if allocations:
+                stats[3] += getallocatedblocks() - blocks
+
+            # the close of a traced open is kept past max_events, so the
+            # events stay nested
+            if traced:
+                events.append(("C", frame, perf_counter_ns()))
+
+            return result
+
+        return profiled
+
+    def attach(self, game: Game) -> None:
+        for name, (component, method) in PROFILED_METHODS.items():
+            target = game if component is None else getattr(game, component)
+            setattr(target, method, self.__wrap(name, getattr(target, method)))
+
+    def detach(self, game: Game) -> None:
+        for component, method in PROFILED_METHODS.values():
+            target = game if component is None else getattr(game, component)
+            target.__dict__.pop(method, None)
+
+    def reset(self) -> None:
+        for stats in self.stats.values():
+            stats[:] = [0, 0, 0, 0]
+        self.events.clear()
+
+    # getters ===============================================
+    # cumulative stats of every method called at least once, net blocks
+    # are None without allocations
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {
+                "calls": calls,
+                "total_ms": total / 1e6,
+                "mean_us": total / calls / 1e3,
+                "max_us": max_ns / 1e3,
+                "net_blocks_per_call": (
+                    blocks / calls if self.allocations else None
+                ),
+            }
+            for name, (calls, total, max_ns, blocks) in self.stats.items()
+            if calls
+        }
+
+    # the traced events in the speedscope evented format,
+    # https://www.speedscope.app
+    def dump_speedscope(self, path: str, title: str = "roller") -> None:
+        start = self.events[0][2] if self.events else 0
+        end = self.events[-1][2] if self.events else 0
+
+        profile = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": name} for name in self.names]},
+            "profiles": [
+                {
+                    "type": "evented",
+                    "name": title,
+                    "unit": "nanoseconds",
+                    "startValue": 0,
+                    "endValue": end - start,
+                    "events": [
+                        {"type": kind, "frame": frame, "at": at - start}
+                        for kind, frame, at in self.events
+                    ],
+                }
+            ],
+            "name": title,
+            "exporter": "src.env.profiler",
+        }
+
+        with open(path, "w") as f:
+            json.dump(profile, f)
+
+
+def log_stats(stats: Dict[str, Dict[str, float]]) -> None:
+    turn_total = stats.get("game.player_turn", {}).get("total_ms")
+
+    rows = []
+    for name, method_stats in stats.items():
+        share = ""
+        blocks = method_stats["net_blocks_per_call"]
+        if turn_total:
+            share = round(method_stats["total_ms"] / turn_total * 100, 1)
+
+        rows.append(
+            [
+                name,
+                method_stats["calls"],
+                round(method_stats["total_ms"], 2),
+                round(method_stats["mean_us"], 2),
+                round(method_stats["max_us"], 2),
+                share,
+                "" if blocks is None else round(blocks, 2),
+            ]
+        )
+
+    print(tabulate(rows, headers=RESULT_HEADERS, tablefmt="simple_outline"))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.env.profiler",
+        description=(
+            "Play random actions in a profiled RollerEnv and report the "
+            "time and allocations of each phase of a turn."
+        ),
+        allow_abbrev=False,
+    )
+    parser.add_argument("--steps", default=n_steps, type=int)
+    parser.add_argument("--seed", default=seed, type=int)
+    parser.add_argument(
+        "--speedscope",
+        default=None,
+        type=str,
+        help=(
+            f"Write the first {max_events} timed calls to this speedscope "
+            "JSON file."
+        ),
+    )
+    parser.add_argument(
+        "--allocations",
+        default=False,
+        action="store_true",
+        help=(
+            "Count the net allocated blocks of every call, which slows "
+            "the timed calls down."
+        ),
+    )
+    parser.add_argument(
+        "--pstats",
+        default=None,
+        type=str,
+        help=(
+            "Also run the steps under cProfile and write its stats to this "
+            "file, for pstats / snakeviz."
+        ),
+    )
+    args = parser.parse_args(argv)
+
+    # the env module imports this one
+    from src.env.roller import RollerEnv
+
+    profiler = Profiler(args.allocations, args.speedscope is not None)
+    env = RollerEnv(profile=profiler)
+    env.reset(seed=args.seed)
+    actions = np.random.default_rng(args.seed).integers(
+        0, 2, size=(args.steps, env.config.n_actions)
+    )
+
+    profile = cProfile.Profile() if args.pstats is not None else None
+    if profile is not None:
+        profile.enable()
+
+    for action in actions:
+        _, _, terminated, _, _ = env.step(action)
+        if terminated:
+            env.reset()
+
+    if profile is not None:
+        profile.disable()
+        profile.dump_stats(args.pstats)
+
+    log_stats(env.get_profile())
+
+    if args.speedscope is not None:
+        profiler.dump_speedscope(args.speedscope)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
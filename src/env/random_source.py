@@ -0,0 +1,172 @@
+import math
+from bisect import bisect_right
+
+import numpy as np
+
+BLOCK_SIZE = 1024
+# PCG64 state, increment, has_uint32, uinteger, state of the loaded block
+# and position in it, 128-bit numbers are split in 32-bit chunks
+STATE_SIZE = 15
+
+
+class RandomSource:
+    """Uniform draws from one np.random.Generator, pre-drawn in blocks.
+
+    Every draw (integers, weighted choices) is made from the next uniform
+    in the generator's ``random()`` stream. Scalars are served from a block
+    drawn ahead of time, so a step does not pay for several tiny Generator
+    calls, and arrays take the rest of the block plus one bulk draw. The
+    stream does not depend on the block size or on how draws are batched,
+    so n games drawing one after another consume the same uniforms as one
+    batched draw of shape (n, ...).
+    """
+
+    def __init__(
+        self, np_random: np.random.Generator, block_size: int = BLOCK_SIZE
+    ):
+        self.block_size = block_size
+        self.set_np_random(np_random)
+
+    def set_np_random(self, np_random: np.random.Generator) -> None:
+        self.np_random = np_random
+        self.bit_generator_name = type(np_random.bit_generator).__name__
+        self.block = np.empty(0)
+        self.block_list = []
+        self.index = 0
+        # packed states (see get_state) of the generator before the block
+        # was drawn and of the generator now, None when unknown
+        self.block_state = None
+        self.generator_state = None
+
+    def __refill(self) -> None:
+        self.block_state = self.__pack_generator_state()[:4]
+        self.block = self.np_random.random(self.block_size)
+        self.block_list = None
+        self.index = 0
+        self.generator_state = self.__pack_generator_state()
+
+    # state ===============================================
+    # A fixed-size list of ints below 2**32 (so they are exact in float64
+    # buffers) that set_state() restores, pending uniforms included. The
+    # block itself is not stored: it is drawn again from the state it was
+    # drawn from, unless it is still loaded. Both are cached, the generator
+    # belongs to this source and only moves when it draws
+    def get_state(self) -> [int]:
+        if self.generator_state is None:
+            self.generator_state = self.__pack_generator_state()
+
+        if self.index < len(self.block):
+            return [*self.generator_state, *self.block_state, self.index + 1]
+
+        return [*self.generator_state, 0, 0, 0, 0, 0]
+
+    def set_state(self, values) -> None:
+        if isinstance(values, np.ndarray):
+            values = values.tolist()
+
+        generator_state = values[0:10]
+        block_state = values[10:14]
+        index = int(values[14])
+
+        if index == 0:
+            self.block = np.empty(0)
+            self.block_list = []
+            self.index = 0
+        else:
+            if len(self.block) == 0 or block_state != self.block_state:
+                self.__set_generator_state(
+                    [*block_state, *generator_state[4:8], 0, 0]
+                )
+                self.__refill()
+
+            self.index = index - 1
+
+        if generator_state != self.generator_state:
+            self.__set_generator_state(generator_state)
+
+    def __pack_generator_state(self) -> [int]:
+        state = self.np_random.bit_generator.state
+        if set(state["state"]) != {"state", "inc"}:
+            raise ValueError(
+                f"Cannot pack the state of {state['bit_generator']}, "
+                "only PCG64 style generators are supported"
+            )
+
+        return [
+            *self.__split(state["state"]["state"]),
+            *self.__split(state["state"]["inc"]),
+            state["has_uint32"],
+            state["uinteger"],
+        ]
+
+    def __set_generator_state(self, values) -> None:
+        values = [int(value) for value in values]
+
+        self.np_random.bit_generator.state = {
+            "bit_generator": self.bit_generator_name,
+            "state": {
+                "state": self.__join(values[0:4]),
+                "inc": self.__join(values[4:8]),
+            },
+            "has_uint32": values[8],
+            "uinteger": values[9],
+        }
+        self.generator_state = values
+
+    @staticmethod
+    def __split(value: int) -> [int]:
+        return [(value >> shift) & 0xFFFFFFFF for shift in (0, 32, 64, 96)]
+
+    @staticmethod
+    def __join(values: [int]) -> int:
+        return values[0] | values[1] << 32 | values[2] << 64 | values[3] << 96
+
+    # draws
+    def random(self, size=None):
+        if size is None:
+            if self.index == len(self.block):
+                self.__refill()
+
+            if self.block_list is None:
+                self.block_list = self.block.tolist()
+
+            value = self.block_list[self.index]
+            self.index += 1
+
+            return value
+
+        # math.prod, np.prod costs more than the draw of a few dices
+        n = int(math.prod(size) if isinstance(size, tuple) else size)
+        if self.index == len(self.block) and n < self.block_size:
+            self.__refill()
+
+        values = self.block[self.index : self.index + n]
+        self.index += len(values)
+
+        if len(values) < n:
+            values = np.concatenate(
+                [values, self.np_random.random(n - len(values))]
+            )
+            self.generator_state = None
+
+        return values.reshape(size)
+
+    # high is exclusive, as in np.random.Generator.integers
+    def integers(self, low, high, size=None):
+        if size is None:
+            return low + int(self.random() * (high - low))
+
+        values = (self.random(size) * (high - low)).astype(np.int64)
+        if low != 0:
+            values += low
+
+        return values
+
+    def choice(self, a, p, size=None):
+        cdf = np.cumsum(p)
+        cdf /= cdf[-1]
+
+        if size is None:
+            return a[bisect_right(cdf.tolist(), self.random())]
+
+        return np.asarray(a)[np.searchsorted(cdf, self.random(size), "right")]
@@ -0,0 +1,360 @@
+import json
+import os
+import queue
+import threading
+from typing import Dict, Tuple
+
+import gymnasium as gym
+from gymnasium import spaces
+
+import numpy as np
+
+META_FILE = "meta.json"
+CHUNK_SIZE = 4096
+MAX_PENDING_CHUNKS = 4
+
+# info fields of RollerEnv kept by the recorder, missing ones are recorded
+# as 0
+INFO_COLUMNS = {
+    "player_won": np.bool_,
+    "hands": np.int32,
+    "battles_won": np.int32,
+    "rolls": np.int32,
+}
+
+
+def get_columns(
+    observation_space: spaces.Space, action_space: spaces.Space
+) -> Dict[str, Tuple[np.dtype, tuple]]:
+    """Columns (dtype, row shape) of a trajectory of these spaces.
+
+    A row is one transition: the observation the action was taken on
+    (``obs.<key>`` per key of a Dict space, ``obs`` for a Box), the action,
+    reward, terminated, truncated, the INFO_COLUMNS of the step's info, and
+    the env and episode it belongs to.
+    """
+    columns = {}
+
+    if isinstance(observation_space, spaces.Dict):
+        for key, space in observation_space.spaces.items():
+            columns[f"obs.{key}"] = (space.dtype, space.shape)
+    else:
+        columns["obs"] = (observation_space.dtype, observation_space.shape)
+
+    columns["action"] = (np.dtype(np.int8), action_space.shape)
+    columns["reward"] = (np.dtype(np.float32), ())
+    columns["terminated"] = (np.dtype(np.bool_), ())
+    columns["truncated"] = (np.dtype(np.bool_), ())
+    for name, dtype in INFO_COLUMNS.items():
+        columns[name] = (np.dtype(dtype), ())
+    columns["env"] = (np.dtype(np.int16), ())
+    columns["episode"] = (np.dtype(np.int32), ())
+
+    return columns
+
+
+class TrajectoryWriter:
+    """Appends rows to one raw fixed-dtype file per column.
+
+    Rows are copied into chunks of chunk_size rows, full chunks are written
+    by a background thread. At most max_pending_chunks chunks wait for the
+    disk, adding rows blocks once they are all in use, so memory stays
+    bounded however long the run. ``meta.json`` describes the columns and
+    is written first, so a log can be read while it is being recorded.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        columns: Dict[str, Tuple[np.dtype, tuple]],
+        chunk_size: int = CHUNK_SIZE,
+        max_pending_chunks: int = MAX_PENDING_CHUNKS,
+    ):
+        self.path = path
+        self.columns = {
+            name: (np.dtype(dtype), tuple(shape))
+            for name, (dtype, shape) in columns.items()
+        }
+        self.chunk_size = chunk_size
+
+        os.makedirs(path, exist_ok=True)
+        self.__write_meta()
+        self.files = {
+            name: open(os.path.join(path, f"{name}.bin"), "wb")
+            for name in self.columns
+        }
+
+        # chunks go from free to pending, the thread writes them and hands
+        # them back
+        self.pending = queue.Queue()
+        self.free = queue.Queue()
+        for _ in range(max_pending_chunks + 1):
+            self.free.put(self.__generate_chunk())
+
+        self.chunk = self.free.get()
+        self.n_rows = 0
+        self.error = None
+        self.closed = False
+
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def __generate_chunk(self) -> Dict[str, np.ndarray]:
+        return {
+            name: np.zeros((self.chunk_size, *shape), dtype=dtype)
+            for name, (dtype, shape) in self.columns.items()
+        }
+
+    def __write_meta(self) -> None:
+        meta = {
+            "columns": {
+                name: {"dtype": dtype.str, "shape": list(shape)}
+                for name, (dtype, shape) in self.columns.items()
+            },
+            "chunk_size": self.chunk_size,
+        }
+
+        with open(os.path.join(self.path, META_FILE), "w") as f:
+            json.dump(meta, f, indent=2)
+
+    def __run(self) -> None:
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+
+            chunk, n_rows = item
+            try:
+                for name, array in chunk.items():
+                    self.files[name].write(memoryview(array[:n_rows]))
+            except Exception as e:
+                self.error = e
+
+            self.free.put(chunk)
+            self.pending.task_done()
+
+    def __check(self) -> None:
+        if self.error is not None:
+            raise RuntimeError("Trajectory writer failed") from self.error
+
+        if self.closed:
+            raise ValueError("Trajectory writer is closed")
+
+    def __submit(self) -> None:
+        self.pending.put((self.chunk, self.n_rows))
+        self.chunk = self.free.get()
+        self.n_rows = 0
+
+    # one row, every column as a scalar or an array of the row shape
+    def append(self, row: dict) -> None:
+        self.__check()
+
+        i = self.n_rows
+        for name, column in self.chunk.items():
+            column[i] = row[name]
+
+        self.n_rows += 1
+        if self.n_rows == self.chunk_size:
+            self.__submit()
+
+    # a batch of rows, every column with a leading batch axis
+    def extend(self, rows: dict) -> None:
+        self.__check()
+
+        n = len(rows["reward"])
+        start = 0
+        while start < n:
+            size = min(n - start, self.chunk_size - self.n_rows)
+            end = self.n_rows + size
+
+            for name, column in self.chunk.items():
+                column[self.n_rows : end] = rows[name][start : start + size]
+
+            self.n_rows = end
+            start += size
+            if self.n_rows == self.chunk_size:
+                self.__submit()
+
+    # waits for every row added so far to be on disk
+    def flush(self) -> None:
+        self.__check()
+
+        if self.n_rows:
+            self.__submit()
+
+        self.pending.join()
+        for f in self.files.values():
+            f.flush()
+
+        self.__check()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        self.flush()
+        self.pending.put(None)
+        self.thread.join()
+
+        for f in self.files.values():
+            f.close()
+        self.closed = True
+
+    def __enter__(self) -> "TrajectoryWriter":
+        """Return the writer, closed on exit."""
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Flush the rows still buffered and close the files."""
+        self.close()
+
+
+class TrajectoryReader:
+    """Memory-maps every column of a trajectory log, nothing is loaded.
+
+    ``reader["reward"]`` is a read-only (n_rows, *shape) array backed by the
+    column file. Rows still in the writer's buffers are not visible, and a
+    log cut short by a crash is read up to its last complete row.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+
+        self.columns = {
+            name: (np.dtype(column["dtype"]), tuple(column["shape"]))
+            for name, column in meta["columns"].items()
+        }
+        self.n_rows = min(
+            self.__count_rows(name, dtype, shape)
+            for name, (dtype, shape) in self.columns.items()
+        )
+
+        self.arrays = {}
+        for name, (dtype, shape) in self.columns.items():
+            self.arrays[name] = self.__map_column(name, dtype, shape)
+
+    def __get_file(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.bin")
+
+    def __count_rows(self, name: str, dtype: np.dtype, shape: tuple) -> int:
+        row_size = dtype.itemsize * int(np.prod(shape))
+
+        return os.path.getsize(self.__get_file(name)) // row_size
+
+    def __map_column(
+        self, name: str, dtype: np.dtype, shape: tuple
+    ) -> np.ndarray:
+        if self.n_rows == 0:
+            return np.zeros((0, *shape), dtype=dtype)
+
+        return np.memmap(
+            self.__get_file(name),
+            dtype=dtype,
+            mode="r",
+            shape=(self.n_rows, *shape),
+        )
+
+    def __len__(self) -> int:
+        """Return the number of complete rows."""
+        return self.n_rows
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Return the memory-mapped column name."""
+        return self.arrays[name]
+
+    def keys(self) -> [str]:
+        return list(self.arrays)
+
+    # the observations of rows index, a dict for Dict observation spaces
+    def get_observation(self, index=slice(None)):
+        if "obs" in self.arrays:
+            return self.arrays["obs"][index]
+
+        return {
+            name[len("obs.") :]: array[index]
+            for name, array in self.arrays.items()
+            if name.startswith("obs.")
+        }
+
+    # (start, end) rows of every finished episode of env
+    def get_episodes(self, env: int = 0) -> [(int, int)]:
+        rows = np.flatnonzero(self.arrays["env"] == env)
+        done = self.arrays["terminated"][rows] | self.arrays["truncated"][rows]
+        ends = rows[done]
+        starts = np.concatenate(
+            [rows[:1], rows[np.flatnonzero(done)[:-1] + 1]]
+        )
+
+        return list(zip(starts[: len(ends)].tolist(), (ends + 1).tolist()))
+
+
+class RecorderWrapper(gym.Wrapper):
+    """Records every transition of a RollerEnv into a trajectory log.
+
+    Each step appends the observation the action was taken on with the
+    action, reward, terminated / truncated flags and info fields, see
+    ``get_columns``. Envs running in parallel processes need their own
+    path, ``env_index`` tells their rows apart once merged.
+    """
+
+    def __init__(
+        self,
+        env: gym.Env,
+        path: str,
+        env_index: int = 0,
+        chunk_size: int = CHUNK_SIZE,
+        max_pending_chunks: int = MAX_PENDING_CHUNKS,
+    ):
+        super().__init__(env)
+
+        self.writer = TrajectoryWriter(
+            path,
+            get_columns(env.observation_space, env.action_space),
+            chunk_size,
+            max_pending_chunks,
+        )
+        self.env_index = env_index
+        self.episode = -1
+        self.row = {"env": env_index}
+
+    # observations may be views reused by the next step, so they are copied
+    # into the pending row
+    def __set_observation(self, obs) -> None:
+        if isinstance(obs, dict):
+            for key, value in obs.items():
+                self.row[f"obs.{key}"] = np.array(value)
+        else:
+            self.row["obs"] = np.array(obs)
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+
+        self.episode += 1
+        self.row["episode"] = self.episode
+        self.__set_observation(obs)
+
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+
+        row = self.row
+        row["action"] = action
+        row["reward"] = reward
+        row["terminated"] = terminated
+        row["truncated"] = truncated
+        for name in INFO_COLUMNS:
+            row[name] = info.get(name, 0)
+
+        self.writer.append(row)
+        self.__set_observation(obs)
+
+        return obs, reward, terminated, truncated, info
+
+    def close(self):
+        self.writer.close()
+
+        return super().close()
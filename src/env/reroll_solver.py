@@ -0,0 +1,188 @@
+import numpy as np
+
+from src.env.game_config import GameConfig, get_default_config
+from src.env.roll_manager import get_dice_type_matrix, get_totals_by_dice_type
+
+OBJECTIVES = ["total", "damage"]
+
+
+class RerollSolver:
+    """Optimal reroll policy for one dice set, solved exactly.
+
+    A roll result is the face index rolled on each dice, so a turn has
+    n_dice_faces ** n_dices states, laid out as an array with one axis per
+    dice. The objective of playing a hand is computed for every state at
+    once:
+    - "total": attack + defense after traits, the roll value of the reward
+    - "damage": damage dealt minus damage taken against the enemy
+
+    Rerolling a set of dices replaces the state by the mean over those
+    axes, one mean per reroll mask, each derived from a smaller mask. With
+    r remaining rolls, a state's value is the best of playing the hand now
+    or the best expected value after a reroll with r - 1 rolls left. A
+    reroll that uses the last roll plays the hand, so values[0] is the
+    objective itself.
+
+    ``values[r]`` and ``actions[r]`` hold the value and the reroll mask
+    (bit i rerolls dice i) of every state with r remaining rolls.
+    """
+
+    def __init__(
+        self,
+        dice_face_values: np.ndarray,
+        dice_face_traits: np.ndarray,
+        objective: str = "total",
+        enemy_attack: int = 0,
+        enemy_defense: int = 0,
+        config: GameConfig = None,
+    ):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective {objective}")
+
+        self.config = config or get_default_config()
+        self.n_dices = self.config.n_dices
+        self.n_faces = self.config.n_dice_faces
+        self.n_max_rolls = self.config.n_max_rolls
+        self.shape = (self.n_faces,) * self.n_dices
+        self.n_masks = 2**self.n_dices
+
+        self.dice_face_values = np.asarray(dice_face_values).reshape(
+            self.n_dices, self.n_faces
+        )
+        self.dice_face_traits = np.asarray(dice_face_traits).reshape(
+            self.n_dices, self.n_faces
+        )
+        self.objective = objective
+        self.enemy_attack = enemy_attack
+        self.enemy_defense = enemy_defense
+
+        self.values, self.actions = self.__solve()
+
+    @classmethod
+    def from_game(cls, game, objective: str = "total") -> "RerollSolver":
+        values, traits = game.dice_manager.get_observation()
+
+        return cls(
+            values,
+            traits,
+            objective,
+            game.enemy.get_attack(),
+            game.enemy.defense,
+            game.config,
+        )
+
+    # solver ===============================================
+    def __calculate_objective(self) -> np.ndarray:
+        faces_i = np.indices(self.shape).reshape(self.n_dices, -1).T
+        dices_i = np.arange(self.n_dices)
+
+        values = self.dice_face_values[dices_i, faces_i]
+        traits = self.dice_face_traits[dices_i, faces_i]
+
+        totals = get_totals_by_dice_type(
+            values, get_dice_type_matrix(dices_i < self.n_dices // 2)
+        )
+        attack_total, defense_total = totals[:, 0], totals[:, 1]
+
+        attack, defense = self.config.get_trait_table().apply(
+            attack_total, defense_total, traits
+        )
+
+        if self.objective == "total":
+            objective = attack + defense
+        else:
+            objective = np.maximum(attack - self.enemy_defense, 0) - (
+                np.maximum(self.enemy_attack - defense, 0)
+            )
+
+        return objective.astype(np.float64).reshape(self.shape)
+
+    # expected value of every state after rerolling the dices of each mask,
+    # every mean reuses the mean of the mask without its lowest dice
+    def __calculate_expectations(self, values: np.ndarray) -> list:
+        expectations = [values]
+
+        for mask in range(1, self.n_masks):
+            lowest = mask & -mask
+            axis = lowest.bit_length() - 1
+            expectations.append(
+                expectations[mask ^ lowest].mean(axis=axis, keepdims=True)
+            )
+
+        return expectations
+
+    def __solve(self) -> (np.ndarray, np.ndarray):
+        objective = self.__calculate_objective()
+
+        values = np.empty((self.n_max_rolls + 1, *self.shape))
+        actions = np.zeros((self.n_max_rolls + 1, *self.shape), np.uint8)
+        values[0] = objective
+
+        for n_rolls in range(1, self.n_max_rolls + 1):
+            expectations = self.__calculate_expectations(values[n_rolls - 1])
+
+            # playing the hand wins ties, it does not spend a roll
+            best = objective.copy()
+            best_actions = actions[n_rolls]
+
+            for mask in range(1, self.n_masks):
+                expected = np.broadcast_to(expectations[mask], self.shape)
+                better = expected > best
+
+                np.copyto(best, expected, where=better)
+                best_actions[better] = mask
+
+            values[n_rolls] = best
+
+        return (
+            values.reshape(self.n_max_rolls + 1, -1).astype(np.float32),
+            actions.reshape(self.n_max_rolls + 1, -1),
+        )
+
+    # getters ===============================================
+    def get_state_index(self, faces_i) -> np.ndarray:
+        return np.ravel_multi_index(np.moveaxis(faces_i, -1, 0), self.shape)
+
+    # face index of each rolled (value, trait), dices may have several
+    # equal faces, they are interchangeable for the solver
+    def get_faces_i(self, roll_values, roll_traits) -> np.ndarray:
+        matches = (
+            self.dice_face_values == np.asarray(roll_values)[..., None]
+        ) & (self.dice_face_traits == np.asarray(roll_traits)[..., None])
+
+        return matches.argmax(axis=-1)
+
+    def get_value(self, faces_i, n_remaining_rolls) -> float:
+        index = self.get_state_index(faces_i)
+
+        return self.values[n_remaining_rolls, index]
+
+    def get_action(self, faces_i, n_remaining_rolls) -> np.ndarray:
+        index = self.get_state_index(faces_i)
+
+        return self.mask_to_action(self.actions[n_remaining_rolls, index])
+
+    # expected objective of rerolling action's dices (or playing the hand
+    # when none is rerolled) from the state faces_i
+    def get_action_value(self, faces_i, n_remaining_rolls, action) -> float:
+        mask = self.action_to_mask(action)
+        if mask == 0 or n_remaining_rolls == 0:
+            return self.values[0, self.get_state_index(faces_i)]
+
+        next_values = self.values[n_remaining_rolls - 1].reshape(self.shape)
+        index = tuple(
+            slice(None) if mask >> dice_i & 1 else faces_i[dice_i]
+            for dice_i in range(self.n_dices)
+        )
+
+        return float(next_values[index].mean())
+
+    def mask_to_action(self, mask) -> np.ndarray:
+        mask = np.asarray(mask)[..., None]
+
+        return (mask >> np.arange(self.n_dices) & 1).astype(np.int64)
+
+    def action_to_mask(self, action) -> int:
+        mask = np.asarray(action) != 0
+
+        return int(np.dot(mask, 1 << np.arange(self.n_dices)))
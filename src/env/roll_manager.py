@@ -1,67 +1,153 @@
 import numpy as np
 
-from src.env.data.game import N_DICES
 from src.env.dice_face import DiceFace
 from src.env.dice_manager import DiceManager
+from src.env.game_config import GameConfig
 from src.env.game_enums import DiceType
+from src.env.random_source import RandomSource
+
+
+# roll resolution ===============================================
+# shared by RollManager, one game with faces_i of shape (n_dices,), and
+# VecGame, a batch of games with faces_i of shape (n_games, n_dices).
+# faces_i holds the face index rolled on each dice and face_offsets the flat
+# index of each dice's first face in the (..., dices, faces) value and trait
+# arrays
+def get_face_offsets(n_dices: int, n_faces: int, n_games: int = None):
+    offsets = np.arange(n_dices)
+    if n_games is not None:
+        offsets = np.arange(n_games)[:, np.newaxis] * n_dices + offsets
+
+    return offsets * n_faces
+
+
+# draws holds a face for every dice, only the masked ones are kept
+def reroll(faces_i: np.ndarray, roll_mask: np.ndarray, draws) -> None:
+    np.copyto(faces_i, draws, where=roll_mask)
+
+
+def get_rolled_faces(
+    face_values: np.ndarray,
+    face_traits: np.ndarray,
+    faces_i: np.ndarray,
+    face_offsets: np.ndarray,
+) -> (np.ndarray, np.ndarray):
+    faces = face_offsets + faces_i
+
+    return face_values.take(faces), face_traits.take(faces)
+
+
+# one-hot (dices, 2) matrix of the dice types, attack then defense
+def get_dice_type_matrix(is_attack_dice: np.ndarray) -> np.ndarray:
+    return np.stack((is_attack_dice, ~is_attack_dice), axis=1).astype(np.int64)
+
+
+# (..., 2) attack and defense totals of the rolled values, before traits
+def get_totals_by_dice_type(
+    values: np.ndarray, dice_type_matrix: np.ndarray
+) -> np.ndarray:
+    return values @ dice_type_matrix
 
 
 class RollManager:
+    """The face rolled on each dice, as an index array.
 
-    def __init__(self, dice_manager: DiceManager):
+    The indices point into the (dices, faces) arrays of the dice manager.
+
+    A reroll is one draw of a face for every dice, kept where the mask is
+    set. The rolled values, traits and totals are resolved once per roll
+    (or dice change) and cached as lists for the reads of a turn.
+    """
+
+    def __init__(
+        self,
+        dice_manager: DiceManager,
+        random_source: RandomSource,
+        config: GameConfig,
+    ):
         self.dice_manager = dice_manager
-        self.roll_results = []
+        self.random_source = random_source
+        self.n_dices = config.n_dices
+        self.n_faces = config.n_dice_faces
+        self.face_offsets = get_face_offsets(self.n_dices, self.n_faces)
+        self.dice_type_matrix = get_dice_type_matrix(
+            np.array(
+                [
+                    dice.get_type() == DiceType.ATTACK
+                    for dice in dice_manager.get_dices()
+                ]
+            )
+        )
+        # face index rolled on each dice
+        self.roll_results_faces_i = np.zeros(self.n_dices, dtype=np.int64)
 
-    def __roll_dice(self, dice_i: int) -> DiceFace:
-        face_i = np.random.randint(0, N_DICES)
-        dice = self.dice_manager.get_dice(dice_i)
-        face = dice.get_face(face_i)
+        # rolled values, traits and totals, None once stale
+        self.resolved = None
+        self.resolved_version = None
 
-        return face
+    def __resolve(self) -> tuple:
+        version = self.dice_manager.version
+        if self.resolved is None or self.resolved_version != version:
+            values, traits = get_rolled_faces(
+                self.dice_manager.values,
+                self.dice_manager.traits,
+                self.roll_results_faces_i,
+                self.face_offsets,
+            )
+            totals = get_totals_by_dice_type(values, self.dice_type_matrix)
 
-    def roll_all_dices(self) -> None:
-        self.roll_results = []
+            self.resolved = (values, traits, traits.tolist(), totals.tolist())
+            self.resolved_version = version
 
-        for dice_i in range(N_DICES):
-            face = self.__roll_dice(dice_i)
-            self.roll_results.append(face)
+        return self.resolved
 
-    def roll_dice(self, dice_i: int) -> None:
-        face = self.__roll_dice(dice_i)
+    def roll_all_dices(self) -> None:
+        self.roll_results_faces_i[:] = self.random_source.integers(
+            0, self.n_faces, size=self.n_dices
+        )
+        self.resolved = None
+
+    # every dice draws a face so a reroll always takes the same number of
+    # draws from the random stream, whichever dices are kept
+    def roll_dices(self, roll_dices_i: [int]) -> None:
+        reroll(
+            self.roll_results_faces_i,
+            np.asarray(roll_dices_i, dtype=bool),
+            self.random_source.integers(0, self.n_faces, size=self.n_dices),
+        )
+        self.resolved = None
 
-        self.roll_results[dice_i] = face
+    def set_roll_results(self, faces_i: [int]) -> None:
+        self.roll_results_faces_i[:] = faces_i
+        self.resolved = None
 
     # getters
-    def get_roll_results_totals_by_dice_type(self) -> list[int]:
-        attack_total = 0
-        defense_total = 0
+    def get_roll_results_totals_by_dice_type(self) -> (int, int):
+        return self.__resolve()[3]
 
-        for i, face in enumerate(self.roll_results):
-            dice_type = self.dice_manager.get_dice(i).get_type()
-            face_value = face.get_value()
+    def get_roll_results(self) -> list[DiceFace]:
+        return [
+            self.dice_manager.get_dice(dice_i).get_face(face_i)
+            for dice_i, face_i in enumerate(self.get_roll_results_faces_i())
+        ]
 
-            if dice_type == DiceType.ATTACK:
-                attack_total += face_value
-            elif dice_type == DiceType.DEFENSE:
-                defense_total += face_value
+    def get_roll_results_faces_i(self) -> list[int]:
+        return self.roll_results_faces_i.tolist()
 
-        return attack_total, defense_total
-
-    def get_roll_results(self) -> list[DiceFace]:
-        return self.roll_results
+    def get_roll_results_traits(self) -> list[int]:
+        return self.__resolve()[2]
 
     def get_observation(self) -> (np.ndarray[int], np.ndarray[int]):
-        roll_result_values = []
-        roll_result_traits = []
+        values, traits, _, _ = self.__resolve()
 
-        for i, face in enumerate(self.roll_results):
-            face_value = face.get_value()
-            face_trait = face.get_trait()
+        return values.astype(np.int16), traits.astype(np.int16)
 
-            roll_result_values.append(face_value)
-            roll_result_traits.append(face_trait)
+    def write_observation(
+        self,
+        roll_result_values: np.ndarray[int],
+        roll_result_traits: np.ndarray[int],
+    ) -> None:
+        values, traits, _, _ = self.__resolve()
 
-        return (
-            np.array(roll_result_values, dtype=np.int16),
-            np.array(roll_result_traits, dtype=np.int16),
-        )
+        roll_result_values[:] = values
+        roll_result_traits[:] = traits
@@ -1,52 +1,18 @@
 import gymnasium as gym
-from gymnasium import spaces
 
 import numpy as np
 
-from src.env.data.game import (
-    BETTER_DAMAGE_REWARD,
-    BETTER_ROLL_REWARD,
-    LOSE_REWARD,
-    MAX_ENEMY_ATTACK,
-    MAX_ENEMY_DEFENSE,
-    MAX_ENEMY_HP,
-    MAX_PLAYER_ATTACK,
-    MAX_PLAYER_DEFENSE,
-    MAX_PLAYER_HP,
-    MIN_ENEMY_ATTACK,
-    MIN_ENEMY_DEFENSE,
-    MIN_ENEMY_HP,
-    MIN_PLAYER_HP,
-    N_ACTIONS,
-    N_DICES,
-    N_DICE_FACES,
-    N_MAX_FACE_VALUE,
-    N_MAX_ROLLS,
-    N_MIN_FACE_VALUE,
-    N_TRAITS,
-    WIN_REWARD,
-    WORST_DAMAGE_REWARD,
-    WORST_ROLL_REWARD,
-)
 from src.env.game import Game
-from src.env.utils.env import (
-    get_damage_diff_percent,
-    get_number_of_trait_effects,
-    has_damage_been_done,
-)
-from src.env.utils.render import (
-    DICES_HEADERS,
-    INFO_HEADERS,
-    ROLL_HEADERS,
-    TRAITS_HEADERS,
-    UNIT_HEADERS,
-    calculate_action,
-    calculate_dice_faces,
-    calculate_info,
-    calculate_roll_results,
-    calculate_traits,
-    calculate_units,
-    render_table,
+from src.env.game_config import GameConfig, get_default_config
+from src.env.observation_buffer import ObservationBuffer
+from src.env.profiler import Profiler
+from src.env.random_source import RandomSource
+from src.env.utils.env import get_damage_diff_percent, has_damage_been_done
+from src.env.utils.render import render_game
+from src.env.utils.spaces import (
+    get_action_space,
+    get_flat_observation_space,
+    get_observation_space,
 )
 
 
@@ -55,8 +21,31 @@ class RollerEnv(gym.Env):
 
     metadata = {"render_modes": ["human"], "render_fps": 30}
 
-    def __init__(self, render_mode=None):
+    def __init__(
+        self,
+        render_mode=None,
+        observation_buffer=False,
+        flatten_observation=False,
+        config: GameConfig = None,
+        profile=False,
+    ):
+        """Build the env of one game.
+
+        :param observation_buffer: if True (or an ObservationBuffer, e.g. a
+          row handed out by a vectorized wrapper), observations are written
+          in place into preallocated arrays and the same dict of views is
+          returned every step, copy it to keep it past the next step.
+        :param flatten_observation: emit one int16 Box vector instead of
+          the Dict, see src.env.utils.spaces for the offset of each key.
+        :param config: the GameConfig of the game, defaults to the
+          constants of src/env/data. Envs sharing a config share its trait
+          table and spaces.
+        :param profile: if True (or a Profiler), time the phases of every
+          turn, see get_profile. Off, the game runs uninstrumented.
+        """
         super().__init__()
+        self.render_mode = render_mode
+        self.config = config or get_default_config()
         # for render
         self.action = None
         self.obs = None
@@ -66,84 +55,33 @@ class RollerEnv(gym.Env):
         self.rolls = 0
         self.battles_won = 0
 
-        self.action_space = spaces.MultiBinary(N_ACTIONS)
-
-        trait_effects = get_number_of_trait_effects()
-
-        self.observation_space = spaces.Dict(
-            {
-                "roll_result_traits": spaces.Box(
-                    low=0, high=N_TRAITS, shape=(N_DICES,), dtype=np.int16
-                ),
-                "roll_result_values": spaces.Box(
-                    low=N_MIN_FACE_VALUE,
-                    high=N_MAX_FACE_VALUE,
-                    shape=(N_DICES,),
-                    dtype=np.int16,
-                ),
-                "damage_done": spaces.Box(
-                    low=np.array([0, 0]),
-                    high=np.array([MAX_PLAYER_ATTACK, MAX_ENEMY_ATTACK]),
-                    shape=(2,),
-                    dtype=np.int16,
-                ),
-                "player": spaces.Box(
-                    low=np.array(
-                        [
-                            MIN_PLAYER_HP,
-                            0,
-                            N_MIN_FACE_VALUE * 6,
-                            N_MIN_FACE_VALUE * 6,
-                        ]
-                    ),
-                    high=np.array(
-                        [
-                            MAX_PLAYER_HP + 2,
-                            MAX_PLAYER_HP + 2,
-                            MAX_PLAYER_ATTACK,
-                            MAX_PLAYER_DEFENSE,
-                        ]
-                    ),
-                    shape=(4,),
-                    dtype=np.int16,
-                ),
-                "enemy": spaces.Box(
-                    low=np.array(
-                        [MIN_ENEMY_HP, 0, MIN_ENEMY_ATTACK, MIN_ENEMY_DEFENSE]
-                    ),
-                    high=np.array(
-                        [
-                            MAX_ENEMY_HP * 10,
-                            MAX_ENEMY_HP * 10,
-                            MAX_ENEMY_ATTACK,
-                            MAX_ENEMY_DEFENSE,
-                        ]
-                    ),
-                    shape=(4,),
-                    dtype=np.int16,
-                ),
-                "n_remaining_rolls": spaces.Box(
-                    low=0, high=N_MAX_ROLLS, shape=(1,), dtype=np.int16
-                ),
-                "traits": spaces.Box(
-                    low=0, high=100, shape=(trait_effects * 4,), dtype=np.int16
-                ),
-                "all_dice_face_traits": spaces.Box(
-                    low=0,
-                    high=N_TRAITS,
-                    shape=(N_DICES * N_DICE_FACES,),
-                    dtype=np.int16,
-                ),
-                "all_dice_face_values": spaces.Box(
-                    low=0,
-                    high=N_MAX_FACE_VALUE,
-                    shape=(N_DICES * N_DICE_FACES,),
-                    dtype=np.int16,
-                ),
-            }
-        )
+        self.action_space = get_action_space(self.config)
+        self.observation_space = get_observation_space(self.config)
+
+        # flat observations are the buffer itself, copied unless the caller
+        # asked for in-place observations
+        self.flatten_observation = flatten_observation
+        self.copy_observation = observation_buffer is False
+
+        if observation_buffer is True or (
+            observation_buffer is False and flatten_observation
+        ):
+            observation_buffer = ObservationBuffer(self.observation_space)
+        elif observation_buffer is False:
+            observation_buffer = None
 
-        self.game = Game()
+        if flatten_observation:
+            self.observation_space = get_flat_observation_space(self.config)
+
+        # every component of the game draws from the env's own generator,
+        # seeded by reset(seed=...)
+        self.random_source = RandomSource(self.np_random)
+        self.game = Game(observation_buffer, self.random_source, self.config)
+
+        self.profiler = None
+        if profile is not False:
+            self.profiler = Profiler() if profile is True else profile
+            self.profiler.attach(self.game)
 
     def step(self, action):
         self.action = action
@@ -182,22 +120,32 @@ class RollerEnv(gym.Env):
             info["battles_won"] = self.battles_won
             self.battles_won = 0
 
-            return obs, reward, True, truncated, info
+            return self.format_observation(obs), reward, True, truncated, info
 
         self.last_roll_results_totals = obs["player"][2] + obs["player"][3]
 
-        return obs, reward, False, truncated, info
+        return self.format_observation(obs), reward, False, truncated, info
+
+    def format_observation(self, obs):
+        if not self.flatten_observation:
+            return obs
+
+        flat_obs = self.game.observation_buffer.buffer
+        if self.copy_observation:
+            flat_obs = flat_obs.copy()
+
+        return flat_obs
 
     def calculate_reward(self, obs, game_over, won):
         reward = 0
 
         if won:
-            reward = WIN_REWARD
+            reward = self.config.win_reward
             return reward
 
         if game_over:
             if not won:
-                reward = -LOSE_REWARD
+                reward = -self.config.lose_reward
                 return reward
 
         # calc the value of the roll
@@ -206,9 +154,9 @@ class RollerEnv(gym.Env):
             diff = player_total - self.last_roll_results_totals
 
             if diff >= 0:
-                reward += BETTER_ROLL_REWARD
+                reward += self.config.better_roll_reward
             else:
-                reward += WORST_ROLL_REWARD
+                reward += self.config.worst_roll_reward
 
         # calc the difference of damage dealt - damage taken as a number
         # [0 - 100]
@@ -218,9 +166,9 @@ class RollerEnv(gym.Env):
             )
 
             if diff >= 0:
-                reward += diff * BETTER_DAMAGE_REWARD
+                reward += diff * self.config.better_damage_reward
             else:
-                reward += diff * WORST_DAMAGE_REWARD
+                reward += diff * self.config.worst_damage_reward
 
         reward = float(round(reward, 2))
 
@@ -228,6 +176,9 @@ class RollerEnv(gym.Env):
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
+        if self.random_source.np_random is not self.np_random:
+            self.random_source.set_np_random(self.np_random)
+
         self.action = None
         self.hand = 0
         self.rolls = 0
@@ -240,51 +191,40 @@ class RollerEnv(gym.Env):
         self.obs = obs
         self.last_roll_results_totals = obs["player"][2] + obs["player"][3]
 
-        return obs, info
-
-    def render(self):
-        print(
-            "================== hand {} ======================".format(
-                self.hand
-            )
+        return self.format_observation(obs), info
+
+    # state ===============================================
+    # the episode counters and the game snapshot, the env's generator
+    # included, as one float64 array. set_state on a reset env continues
+    # the episode exactly, e.g. to resume training from a checkpoint
+    def get_state(self) -> np.ndarray:
+        counters = [
+            self.hand,
+            self.rolls,
+            self.battles_won,
+            self.last_roll_results_totals,
+        ]
+
+        return np.concatenate([counters, self.game.snapshot()])
+
+    def set_state(self, state: np.ndarray) -> None:
+        state = np.asarray(state, dtype=np.float64)
+        self.hand, self.rolls, self.battles_won, totals = (
+            state[:4].astype(np.int64).tolist()
         )
+        self.last_roll_results_totals = totals
+        self.game.restore(state[4:])
 
-        if self.obs is not None:
-            info = calculate_info(
-                self.obs["damage_done"],
-                self.reward,
-                self.obs["n_remaining_rolls"],
-            )
-            units = calculate_units(
-                self.obs["player"],
-                self.obs["enemy"],
-            )
-            print("\n> Info")
-            render_table(INFO_HEADERS, info)
-            render_table(UNIT_HEADERS, units)
-
-        if self.action is not None:
-            action = calculate_action(self.action)
-            print("\n> Rerolling dices")
-            render_table(ROLL_HEADERS, action)
-
-        if self.obs is not None:
-            roll_results = calculate_roll_results(
-                self.obs["roll_result_traits"], self.obs["roll_result_values"]
-            )
-
-            dice_faces = calculate_dice_faces(
-                self.obs["all_dice_face_traits"],
-                self.obs["all_dice_face_values"],
-            )
-            traits = calculate_traits(self.obs["traits"])
+    # cumulative calls, time and allocations of each profiled method, None
+    # without profile
+    def get_profile(self) -> dict:
+        if self.profiler is None:
+            return None
 
-            print("\n> Roll results")
-            render_table(ROLL_HEADERS, roll_results)
+        return self.profiler.get_stats()
 
-            print("\n> Lookup tables")
-            render_table(DICES_HEADERS, dice_faces)
-            render_table(TRAITS_HEADERS, traits)
+    def render(self):
+        render_game(self.hand, self.obs, self.reward, self.action, self.config)
 
     def close(self):
         pass
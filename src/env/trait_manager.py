@@ -2,32 +2,30 @@ from typing import Dict
 
 import numpy as np
 
-from src.env.data.game import (
-    N_DICES,
-    N_DICE_FACES,
-    N_TRAITS,
-    TRAIT_DISTRIBUTION,
-)
-from src.env.data.traits import TRAITS
-from src.env.dice_face import DiceFace
-from src.env.game_enums import EffectType, OperationType
+from src.env.game_config import GameConfig
+from src.env.game_enums import OperationType
+from src.env.random_source import RandomSource
+from src.env.trait import Trait
 from src.env.trait_effect import TraitEffect
 
 
 class TraitManager:
 
-    def __init__(self):
-        self.n_dices = N_DICES
-        self.n_dice_faces = N_DICE_FACES
-        self.n_traits = N_TRAITS
-        self.trait_keys = list(TRAITS.keys())
+    def __init__(self, random_source: RandomSource, config: GameConfig):
+        self.random_source = random_source
+        self.config = config
+        self.n_dices = config.n_dices
+        self.n_dice_faces = config.n_dice_faces
+        self.n_traits = config.n_traits
+        self.trait_keys = config.trait_keys
         self.traits = self.__generate_dice_face_traits()
+        self.trait_table = config.get_trait_table()
 
     # generators
     def __generate_dice_face_traits(self) -> [int]:
-        return np.random.choice(
+        return self.random_source.choice(
             self.trait_keys,
-            p=TRAIT_DISTRIBUTION,
+            p=self.config.trait_distribution,
             size=(self.n_dices, self.n_dice_faces),
         )
 
@@ -35,6 +33,10 @@ class TraitManager:
     def reset(self) -> None:
         self.traits = self.__generate_dice_face_traits()
 
+    # setters
+    def set_traits(self, traits: np.ndarray) -> None:
+        self.traits = traits
+
     # getters
     def get_trait(self, dice_i: int, face_i: int) -> int:
         return self.traits[dice_i][face_i]
@@ -43,55 +45,25 @@ class TraitManager:
         self,
         attack_total: int,
         defense_total: int,
-        face_traits: Dict[int, int],
+        face_traits: [int],
     ) -> (int, int):
-        effects: [TraitEffect] = self.get_trait_effects(face_traits)
-
-        sorted_effects = self.sort_traits_effects(effects)
-        attack_total, defense_total = self.apply_trait_effects(
-            sorted_effects, attack_total, defense_total
+        return self.trait_table.apply_roll(
+            attack_total, defense_total, face_traits
         )
 
-        return attack_total, defense_total
-
-    @staticmethod
-    def get_observation() -> np.ndarray[int]:
-        traits = []
-        for i in range(N_TRAITS):
-            trait = TRAITS[i]
-            serialized_trait = trait.get_observation()
-
-            if len(serialized_trait) == 0:
-                continue
-
-            # append each element of the serialized trait
-            for j in range(len(serialized_trait)):
-                traits.append(serialized_trait[j])
-
-        return np.array(traits, dtype=np.int16).flatten()
-
-    # returns: trait id (key), level
-    @staticmethod
-    def get_face_traits(roll_results: [DiceFace]) -> Dict[int, int]:
-        traits = {}
-
-        for i in range(N_DICES):
-            face = roll_results[i]
-            trait = face.get_trait()
-
-            if trait not in traits:
-                traits[trait] = 1
-            else:
-                traits[trait] += 1
-
-        return traits
+    # the traits never change, so the observation is shared by every game
+    # of the config
+    def get_observation(self) -> np.ndarray[int]:
+        return self.config.get_traits_observation()
 
     @staticmethod
-    def get_trait_effects(face_traits: Dict[int, int]) -> [TraitEffect]:
+    def get_trait_effects(
+        traits: Dict[int, Trait], face_traits: Dict[int, int]
+    ) -> [TraitEffect]:
         trait_effects = []
 
         for face_trait in face_traits:
-            trait = TRAITS[face_trait]
+            trait = traits[face_trait]
             level = face_traits[face_trait]
 
             effects = trait.get_current_effect(level)
@@ -130,42 +102,3 @@ class TraitManager:
         sorted_traits.extend(divide_effects)
 
         return sorted_traits
-
-    def apply_trait_effects(
-        self, effects: [TraitEffect], attack_total: int, defense_total: int
-    ) -> (int, int):
-        for effect in effects:
-            attack_total, defense_total = self.apply_trait_effect(
-                effect, attack_total, defense_total
-            )
-
-        return attack_total, defense_total
-
-    @staticmethod
-    def apply_trait_effect(
-        effect: TraitEffect, attack_total: int, defense_total: int
-    ) -> (int, int):
-        effect_type = effect.get_type()
-        operation = effect.get_operation()
-        value = effect.get_value()
-
-        if effect_type == EffectType.ATTACK:
-            if operation == OperationType.ADD:
-                attack_total += value
-            elif operation == OperationType.SUBTRACT:
-                attack_total -= value
-            elif operation == OperationType.MULTIPLY:
-                attack_total *= value
-            elif operation == OperationType.DIVIDE:
-                attack_total /= value
-        elif effect_type == EffectType.DEFENSE:
-            if operation == OperationType.ADD:
-                defense_total += value
-            elif operation == OperationType.SUBTRACT:
-                defense_total -= value
-            elif operation == OperationType.MULTIPLY:
-                defense_total *= value
-            elif operation == OperationType.DIVIDE:
-                defense_total /= value
-
-        return attack_total, defense_total
@@ -0,0 +1,177 @@
+import itertools
+import math
+
+import numpy as np
+
+from src.env.game_config import GameConfig, get_default_config
+from src.env.game_enums import EffectType, OperationType
+from src.env.trait_manager import TraitManager
+
+
+class TraitTable:
+    """Trait effects compiled into one transform per trait histogram.
+
+    A roll only matters to the traits through how many of its faces carry
+    each trait, so every histogram (counts of traits 0..N_TRAITS-1 over
+    N_DICES faces) folds into ``(total + offset) * multiplier / divisor``
+    per effect type. Only the C(N_TRAITS + N_DICES - 1, N_DICES) histograms
+    a roll can have get a row: one is indexed by the colex rank of the
+    sorted face traits, the sum of ``ranks[i, trait]`` over the i-th
+    smallest trait, which works for any number of leading batch axes.
+    ``apply_roll`` looks a single roll up by its sorted traits in plain
+    python.
+
+    Effect values must be integers, so offsets and multipliers are exact and
+    the results are equal to applying the sorted TraitEffect objects one by
+    one. Non-integer values and histograms with more than one DIVIDE per
+    effect type cannot be folded exactly and are rejected.
+
+    A table is built once per GameConfig, see ``GameConfig.get_trait_table``.
+    """
+
+    def __init__(self, config: GameConfig):
+        self.config = config
+        self.n_traits = config.n_traits
+        self.n_dices = config.n_dices
+        # the sorted traits t_0 <= t_1 <= ... map to the combination
+        # t_i + i, whose colex rank sums C(t_i + i, i + 1)
+        self.ranks = np.array(
+            [
+                [math.comb(trait + i, i + 1) for trait in range(self.n_traits)]
+                for i in range(self.n_dices)
+            ],
+            dtype=np.int64,
+        )
+        # flat index of ranks[i, 0]
+        self.rank_offsets = np.arange(self.n_dices) * self.n_traits
+
+        n_rows = math.comb(self.n_traits + self.n_dices - 1, self.n_dices)
+        shape = (n_rows, len(EffectType))
+        self.offsets = np.zeros(shape, dtype=np.int64)
+        self.multipliers = np.ones(shape, dtype=np.int64)
+        self.divisors = np.ones(shape, dtype=np.int64)
+        self.has_divide = False
+
+        self.__compile()
+
+        # plain python copies, a single roll is faster without numpy
+        transforms = np.concatenate(
+            [self.offsets, self.multipliers, self.divisors], axis=1
+        ).tolist()
+        sorted_traits = list(
+            itertools.combinations_with_replacement(
+                range(self.n_traits), self.n_dices
+            )
+        )
+        self.transforms = {
+            traits: transforms[index]
+            for traits, index in zip(
+                sorted_traits, self.get_index(sorted_traits).tolist()
+            )
+        }
+
+    def __compile(self) -> None:
+        for counts in self.__generate_histograms(self.n_traits, self.n_dices):
+            index = int(
+                self.get_index(np.repeat(np.arange(self.n_traits), counts))
+            )
+            face_traits = {
+                trait: level for trait, level in enumerate(counts) if level
+            }
+
+            effects = TraitManager.get_trait_effects(
+                self.config.traits, face_traits
+            )
+            for effect in TraitManager.sort_traits_effects(effects):
+                self.__fold_effect(index, effect)
+
+    def __fold_effect(self, index, effect) -> None:
+        effect_type = effect.get_type().value
+        operation = effect.get_operation()
+        value = effect.get_value()
+        if value != int(value):
+            raise ValueError(
+                f"Cannot fold the non-integer effect value {value}"
+            )
+
+        if operation == OperationType.ADD:
+            self.offsets[index, effect_type] += value
+        elif operation == OperationType.SUBTRACT:
+            self.offsets[index, effect_type] -= value
+        elif operation == OperationType.MULTIPLY:
+            self.multipliers[index, effect_type] *= value
+        elif operation == OperationType.DIVIDE:
+            if self.divisors[index, effect_type] != 1:
+                raise ValueError(
+                    "Cannot fold more than one DIVIDE effect per effect type"
+                )
+
+            self.divisors[index, effect_type] = value
+            self.has_divide = True
+
+    @staticmethod
+    def __generate_histograms(n_traits: int, n_dices: int):
+        if n_traits == 1:
+            yield [n_dices]
+            return
+
+        for count in range(n_dices + 1):
+            for rest in TraitTable.__generate_histograms(
+                n_traits - 1, n_dices - count
+            ):
+                yield [count, *rest]
+
+    # getters
+    def get_index(self, face_traits) -> np.ndarray:
+        ranks = self.ranks.take(
+            np.sort(face_traits, axis=-1) + self.rank_offsets
+        )
+
+        # faster than sum(axis=-1) over a few dices
+        index = ranks[..., 0].copy()
+        for i in range(1, self.n_dices):
+            index += ranks[..., i]
+
+        return index
+
+    def apply(self, attack_total, defense_total, face_traits):
+        index = self.get_index(face_traits)
+
+        attack = EffectType.ATTACK.value
+        defense = EffectType.DEFENSE.value
+
+        attack_total = (attack_total + self.offsets[index, attack]) * (
+            self.multipliers[index, attack]
+        )
+        defense_total = (defense_total + self.offsets[index, defense]) * (
+            self.multipliers[index, defense]
+        )
+
+        if self.has_divide:
+            attack_total = attack_total / self.divisors[index, attack]
+            defense_total = defense_total / self.divisors[index, defense]
+
+        return attack_total, defense_total
+
+    def apply_roll(self, attack_total, defense_total, face_traits):
+        (
+            attack_offset,
+            defense_offset,
+            attack_multiplier,
+            defense_multiplier,
+            attack_divisor,
+            defense_divisor,
+        ) = self.transforms[tuple(sorted(face_traits))]
+
+        attack_total = (attack_total + attack_offset) * attack_multiplier
+        defense_total = (defense_total + defense_offset) * defense_multiplier
+
+        if self.has_divide:
+            attack_total = attack_total / attack_divisor
+            defense_total = defense_total / defense_divisor
+
+        return attack_total, defense_total
+
+
+def get_trait_table(config: GameConfig = None) -> TraitTable:
+    return (config or get_default_config()).get_trait_table()
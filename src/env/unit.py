@@ -1,7 +1,21 @@
 import numpy as np
 
+from src.env.random_source import RandomSource
+
 
 class Unit:
+    __slots__ = (
+        "random_source",
+        "level",
+        "hp_range",
+        "attack_range",
+        "defense_range",
+        "hp",
+        "max_hp",
+        "attack",
+        "defense",
+    )
+
     def __init__(
         self,
         min_hp: int,
@@ -10,12 +24,20 @@ class Unit:
         max_attack: int,
         min_defense: int,
         max_defense: int,
+        random_source: RandomSource,
         level: int = 1,
     ):
+        self.random_source = random_source
+        # inclusive (min, max)
+        self.hp_range = (min_hp, max_hp)
+        self.attack_range = (min_attack, max_attack)
+        self.defense_range = (min_defense, max_defense)
+
+        self.generate(level)
+
+    # draws a new unit in place, the same draws as building one
+    def generate(self, level: int = 1) -> None:
         self.level = level
-        self.hp_range = {"min": min_hp, "max": max_hp}
-        self.attack_range = {"min": min_attack, "max": max_attack}
-        self.defense_range = {"min": min_defense, "max": max_defense}
 
         hp = self.__generate_hp()
         self.hp = hp
@@ -26,20 +48,19 @@ class Unit:
 
     # generators
     def __generate_hp(self) -> int:
-        return (
-            np.random.randint(self.hp_range["min"], self.hp_range["max"] + 1)
-            * self.level
-        )
+        min_hp, max_hp = self.hp_range
+
+        return self.random_source.integers(min_hp, max_hp + 1) * self.level
 
     def __generate_attack(self) -> int:
-        return np.random.randint(
-            self.attack_range["min"], self.attack_range["max"] + 1
-        )
+        min_attack, max_attack = self.attack_range
+
+        return self.random_source.integers(min_attack, max_attack + 1)
 
     def __generate_defense(self) -> int:
-        return np.random.randint(
-            self.defense_range["min"], self.defense_range["max"] + 1
-        )
+        min_defense, max_defense = self.defense_range
+
+        return self.random_source.integers(min_defense, max_defense + 1)
 
     # turn
     def turn_start(self) -> None:
@@ -62,7 +83,13 @@ class Unit:
     def set_defense(self, defense: int) -> None:
         self.defense = defense
 
+    def set_state(self, state: [int]) -> None:
+        self.level, self.max_hp, self.hp, self.attack, self.defense = state
+
     # getters
+    def get_state(self) -> [int]:
+        return [self.level, self.max_hp, self.hp, self.attack, self.defense]
+
     def get_hp(self) -> int:
         return self.hp
 
@@ -74,3 +101,9 @@ class Unit:
         arr = [self.max_hp, self.hp, self.attack, self.defense]
 
         return np.array(arr, dtype=np.int16)
+
+    def write_observation(self, out: np.ndarray[np.int16]) -> None:
+        out[0] = self.max_hp
+        out[1] = self.hp
+        out[2] = self.attack
+        out[3] = self.defense
@@ -1,5 +1,4 @@
-from src.env.data.game import N_DICE_FACES, N_TRAITS
-from src.env.data.traits import TRAITS
+from src.env.game_config import GameConfig, get_default_config
 
 
 def has_damage_been_done(damage_done: list[int, int]) -> bool:
@@ -27,13 +26,5 @@ def get_damage_diff_percent(
     return diff
 
 
-def get_number_of_trait_effects() -> int:
-    trait_effects = 0
-
-    for i in range(N_TRAITS):
-        trait = TRAITS[i]
-        for level in range(1, N_DICE_FACES + 1):
-            if trait.effects.get_effect(level) is not None:
-                trait_effects += 1
-
-    return trait_effects
+def get_number_of_trait_effects(config: GameConfig = None) -> int:
+    return (config or get_default_config()).get_number_of_trait_effects()
@@ -1,4 +1,4 @@
-from src.env.data.game import N_DICES, N_DICE_FACES, N_TRAITS
+from src.env.game_config import GameConfig, get_default_config
 from src.env.game_enums import EffectType, OperationType
 
 from tabulate import tabulate
@@ -83,17 +83,21 @@ def calculate_units(player, enemy):
     return [player, enemy]
 
 
-def calculate_dice_faces(all_dice_face_traits, all_dice_face_values):
+def calculate_dice_faces(
+    all_dice_face_traits, all_dice_face_values, config: GameConfig
+):
     res = []
+    n_dices = config.n_dices
+    n_faces = config.n_dice_faces
 
-    for i in range(N_DICES):
-        dice_type = i < N_DICES // 2
+    for i in range(n_dices):
+        dice_type = i < n_dices // 2
         dice_type_label = "Attack" if dice_type == 1 else "Defense"
 
         dice = [i + 1, dice_type_label]
 
-        for j in range(N_DICE_FACES):
-            flat_i = i * N_DICE_FACES + j
+        for j in range(n_faces):
+            flat_i = i * n_faces + j
             value = all_dice_face_values[flat_i]
             trait = all_dice_face_traits[flat_i]
 
@@ -109,14 +113,15 @@ def calculate_dice_faces(all_dice_face_traits, all_dice_face_values):
     return res
 
 
-def calculate_traits(traits):
+def calculate_traits(traits, config: GameConfig):
     res = []
+    n_dices = config.n_dices
 
-    for i in range(N_TRAITS):
+    for i in range(config.n_traits):
         trait_label = f"Trait {i}"
 
-        for j in range(N_DICES):
-            flat_index = i * N_DICES * 4 + j * 4
+        for j in range(n_dices):
+            flat_index = i * n_dices * 4 + j * 4
             effect = traits[flat_index : flat_index + 4]
             if effect.sum() == 0:
                 continue
@@ -149,3 +154,46 @@ def calculate_traits(traits):
             res.append(row)
 
     return res
+
+
+def render_game(hand, obs, reward, action, config=None) -> None:
+    config = config or get_default_config()
+    print("================== hand {} ======================".format(hand))
+
+    if obs is not None:
+        info = calculate_info(
+            obs["damage_done"],
+            reward,
+            obs["n_remaining_rolls"],
+        )
+        units = calculate_units(
+            obs["player"],
+            obs["enemy"],
+        )
+        print("\n> Info")
+        render_table(INFO_HEADERS, info)
+        render_table(UNIT_HEADERS, units)
+
+    if action is not None:
+        action = calculate_action(action)
+        print("\n> Rerolling dices")
+        render_table(ROLL_HEADERS, action)
+
+    if obs is not None:
+        roll_results = calculate_roll_results(
+            obs["roll_result_traits"], obs["roll_result_values"]
+        )
+
+        dice_faces = calculate_dice_faces(
+            obs["all_dice_face_traits"],
+            obs["all_dice_face_values"],
+            config,
+        )
+        traits = calculate_traits(obs["traits"], config)
+
+        print("\n> Roll results")
+        render_table(ROLL_HEADERS, roll_results)
+
+        print("\n> Lookup tables")
+        render_table(DICES_HEADERS, dice_faces)
+        render_table(TRAITS_HEADERS, traits)
@@ -0,0 +1,162 @@
+from typing import Dict, Tuple
+
+from gymnasium import spaces
+
+import numpy as np
+
+from src.env.game_config import GameConfig, get_default_config
+
+
+# spaces are built once per config and shared, see GameConfig
+def get_action_space(config: GameConfig = None) -> spaces.MultiBinary:
+    return (config or get_default_config()).get_action_space()
+
+
+def get_observation_space(config: GameConfig = None) -> spaces.Dict:
+    return (config or get_default_config()).get_observation_space()
+
+
+def get_flat_observation_space(config: GameConfig = None) -> spaces.Box:
+    return (config or get_default_config()).get_flat_observation_space()
+
+
+def build_action_space(config: GameConfig) -> spaces.MultiBinary:
+    return spaces.MultiBinary(config.n_actions)
+
+
+def build_observation_space(config: GameConfig) -> spaces.Dict:
+    trait_effects = config.get_number_of_trait_effects()
+    n_dices = config.n_dices
+
+    return spaces.Dict(
+        {
+            "roll_result_traits": spaces.Box(
+                low=0, high=config.n_traits, shape=(n_dices,), dtype=np.int16
+            ),
+            "roll_result_values": spaces.Box(
+                low=config.n_min_face_value,
+                high=config.n_max_face_value,
+                shape=(n_dices,),
+                dtype=np.int16,
+            ),
+            "damage_done": spaces.Box(
+                low=np.array([0, 0]),
+                high=np.array(
+                    [config.max_player_attack, config.max_enemy_attack]
+                ),
+                shape=(2,),
+                dtype=np.int16,
+            ),
+            "player": spaces.Box(
+                low=np.array(
+                    [
+                        config.min_player_hp,
+                        0,
+                        config.n_min_face_value * n_dices,
+                        config.n_min_face_value * n_dices,
+                    ]
+                ),
+                high=np.array(
+                    [
+                        config.max_player_hp + 2,
+                        config.max_player_hp + 2,
+                        config.max_player_attack,
+                        config.max_player_defense,
+                    ]
+                ),
+                shape=(4,),
+                dtype=np.int16,
+            ),
+            "enemy": spaces.Box(
+                low=np.array(
+                    [
+                        config.min_enemy_hp,
+                        0,
+                        config.min_enemy_attack,
+                        config.min_enemy_defense,
+                    ]
+                ),
+                high=np.array(
+                    [
+                        config.max_enemy_hp * 10,
+                        config.max_enemy_hp * 10,
+                        config.max_enemy_attack,
+                        config.max_enemy_defense,
+                    ]
+                ),
+                shape=(4,),
+                dtype=np.int16,
+            ),
+            "n_remaining_rolls": spaces.Box(
+                low=0, high=config.n_max_rolls, shape=(1,), dtype=np.int16
+            ),
+            "traits": spaces.Box(
+                low=0, high=100, shape=(trait_effects * 4,), dtype=np.int16
+            ),
+            "all_dice_face_traits": spaces.Box(
+                low=0,
+                high=config.n_traits,
+                shape=(n_dices * config.n_dice_faces,),
+                dtype=np.int16,
+            ),
+            "all_dice_face_values": spaces.Box(
+                low=0,
+                high=config.n_max_face_value,
+                shape=(n_dices * config.n_dice_faces,),
+                dtype=np.int16,
+            ),
+        }
+    )
+
+
+# Flat observations concatenate the Dict keys in observation space (sorted)
+# order into one int16 vector:
+#
+#   all_dice_face_traits    0 -  36
+#   all_dice_face_values   36 -  72
+#   damage_done            72 -  74
+#   enemy                  74 -  78
+#   n_remaining_rolls      78 -  79
+#   player                 79 -  83
+#   roll_result_traits     83 -  89
+#   roll_result_values     89 -  95
+#   traits                 95 - 159
+def get_observation_offsets(
+    observation_space: spaces.Dict,
+) -> Dict[str, Tuple[int, int]]:
+    offsets = {}
+    size = 0
+
+    for key, space in observation_space.spaces.items():
+        length = int(np.prod(space.shape))
+        offsets[key] = (size, size + length)
+        size += length
+
+    return offsets
+
+
+def build_flat_observation_space(config: GameConfig) -> spaces.Box:
+    boxes = config.get_observation_space().spaces.values()
+
+    return spaces.Box(
+        low=np.concatenate([box.low.flatten() for box in boxes]),
+        high=np.concatenate([box.high.flatten() for box in boxes]),
+        dtype=np.int16,
+    )
+
+
+def flatten_observation(
+    obs: Dict[str, np.ndarray], config: GameConfig = None
+) -> np.ndarray:
+    offsets = (config or get_default_config()).get_observation_offsets()
+
+    return np.concatenate([obs[key] for key in offsets], axis=-1)
+
+
+# returns views into the flat observation, works with leading batch axes
+def unflatten_observation(
+    obs: np.ndarray, config: GameConfig = None
+) -> Dict[str, np.ndarray]:
+    offsets = (config or get_default_config()).get_observation_offsets()
+
+    return {key: obs[..., start:end] for key, (start, end) in offsets.items()}
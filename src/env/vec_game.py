@@ -0,0 +1,324 @@
+import numpy as np
+
+from src.env.game_config import GameConfig, get_default_config
+from src.env.random_source import RandomSource
+from src.env.roll_manager import (
+    get_dice_type_matrix,
+    get_face_offsets,
+    get_rolled_faces,
+    get_totals_by_dice_type,
+    reroll,
+)
+
+# every array of mutable game state, see VecGame.get_state
+STATE_ARRAYS = (
+    "dice_face_values",
+    "dice_face_traits",
+    "roll_results",
+    "n_remaining_rolls",
+    "player_max_hp",
+    "player_hp",
+    "enemy_max_hp",
+    "enemy_hp",
+    "enemy_attack",
+    "enemy_defense",
+    "damage_done",
+    "enemies_defeated",
+)
+
+
+class VecGame:
+    """Struct-of-arrays version of Game that advances n games per call.
+
+    Every piece of mutable state is a numpy array with a leading game
+    dimension, so rolling, fighting and resetting are array operations
+    instead of walks over Unit / Dice / DiceFace objects.
+
+    Draws are laid out like Game's, game after game in row-major order, so
+    a VecGame of one game consumes the random stream exactly like a Game
+    and both produce the same episodes from the same seed.
+
+    """
+
+    def __init__(
+        self,
+        n_games: int,
+        random_source: RandomSource,
+        config: GameConfig = None,
+    ):
+        self.n_games = n_games
+        self.random_source = random_source
+        self.config = config = config or get_default_config()
+
+        self.player_hp_range = (config.min_player_hp, config.max_player_hp)
+        self.enemy_hp_range = (config.min_enemy_hp, config.max_enemy_hp)
+        self.enemy_attack_range = (
+            config.min_enemy_attack,
+            config.max_enemy_attack,
+        )
+        self.enemy_defense_range = (
+            config.min_enemy_defense,
+            config.max_enemy_defense,
+        )
+        self.face_value_range = (
+            config.n_min_face_value,
+            config.n_max_face_value,
+        )
+        self.trait_distribution = config.trait_distribution
+
+        self.n_max_rolls = config.n_max_rolls
+        self.n_dices = n_dices = config.n_dices
+        self.n_faces = n_faces = config.n_dice_faces
+        self.trait_keys = np.array(config.trait_keys)
+        self.dice_type_matrix = get_dice_type_matrix(
+            np.arange(n_dices) < n_dices // 2
+        )
+
+        self.trait_table = config.get_trait_table()
+        self.traits_observation = np.tile(
+            config.get_traits_observation(), (n_games, 1)
+        )
+
+        dices_shape = (n_games, n_dices, n_faces)
+        self.dice_face_values = np.zeros(dices_shape, dtype=np.int64)
+        self.dice_face_traits = np.zeros(dices_shape, dtype=np.int64)
+        self.dice_face_values_observation = None
+        self.dice_face_traits_observation = None
+        # face index rolled on each dice
+        self.roll_results = np.zeros((n_games, n_dices), dtype=np.int64)
+        # flat index of each dice's first face in the dice arrays
+        self.face_offsets = get_face_offsets(n_dices, n_faces, n_games)
+        self.n_remaining_rolls = np.full(
+            n_games, self.n_max_rolls, dtype=np.int64
+        )
+
+        self.player_max_hp = np.zeros(n_games, dtype=np.int64)
+        self.player_hp = np.zeros(n_games, dtype=np.int64)
+        self.enemy_max_hp = np.zeros(n_games, dtype=np.int64)
+        self.enemy_hp = np.zeros(n_games, dtype=np.int64)
+        self.enemy_attack = np.zeros(n_games, dtype=np.int64)
+        self.enemy_defense = np.zeros(n_games, dtype=np.int64)
+
+        self.damage_done = np.zeros((n_games, 2), dtype=np.int64)
+        self.enemies_defeated = np.zeros(n_games, dtype=np.int64)
+
+        self.reset()
+
+    # generators
+    def __generate_dices(self, mask: np.ndarray) -> None:
+        n = int(mask.sum())
+        shape = (n, self.n_dices, self.n_faces)
+
+        self.dice_face_traits[mask] = self.random_source.choice(
+            self.trait_keys, p=self.trait_distribution, size=shape
+        )
+        min_value, max_value = self.face_value_range
+        self.dice_face_values[mask] = self.random_source.integers(
+            min_value, max_value + 1, size=shape
+        )
+
+        self.dice_face_values_observation = self.__generate_dices_observation(
+            self.dice_face_values
+        )
+        self.dice_face_traits_observation = self.__generate_dices_observation(
+            self.dice_face_traits
+        )
+
+    # observations handed out earlier are never written to, new ones are
+    # built when the dices change
+    def __generate_dices_observation(self, dices: np.ndarray) -> np.ndarray:
+        return dices.reshape(self.n_games, -1).astype(np.int16)
+
+    # a Unit draws its hp, attack and defense, the player keeps only the hp
+    def __generate_players(self, mask: np.ndarray) -> None:
+        draws = self.random_source.random((int(mask.sum()), 3))
+        hp = self.__scale(draws[:, 0], *self.player_hp_range)
+
+        self.player_max_hp[mask] = hp
+        self.player_hp[mask] = hp
+
+    def __generate_enemies(self, mask: np.ndarray) -> None:
+        draws = self.random_source.random((int(mask.sum()), 3))
+        hp = self.__scale(draws[:, 0], *self.enemy_hp_range)
+
+        self.enemy_max_hp[mask] = hp
+        self.enemy_hp[mask] = hp
+        self.enemy_attack[mask] = self.__scale(
+            draws[:, 1], *self.enemy_attack_range
+        )
+        self.enemy_defense[mask] = self.__scale(
+            draws[:, 2], *self.enemy_defense_range
+        )
+
+    # uniform draws to integers in [low, high], as RandomSource.integers
+    @staticmethod
+    def __scale(draws: np.ndarray, low: int, high: int) -> np.ndarray:
+        return low + (draws * (high + 1 - low)).astype(np.int64)
+
+    # game flow ===============================================
+    def reset(self, mask: np.ndarray = None) -> None:
+        if mask is None:
+            mask = np.ones(self.n_games, dtype=bool)
+
+        self.damage_done[mask] = 0
+        self.enemies_defeated[mask] = 0
+
+        self.__generate_dices(mask)
+        self.__generate_players(mask)
+        self.__generate_enemies(mask)
+
+        self.new_turn(mask)
+
+    # the enemy's Unit.turn_start draws (and drops) an attack and a defense
+    # after the dices are rolled
+    def new_turn(self, mask: np.ndarray) -> None:
+        draws = self.random_source.random((int(mask.sum()), self.n_dices + 2))
+
+        self.n_remaining_rolls[mask] = self.n_max_rolls
+        self.roll_results[mask] = self.__scale(
+            draws[:, : self.n_dices], 0, self.n_faces - 1
+        )
+
+    # observe=False skips building the observation (returned as None), for
+    # callers that read the state arrays directly
+    def player_turn(self, roll_dices_i: np.ndarray, observe: bool = True):
+        roll_dices_i = np.asarray(roll_dices_i).reshape(
+            self.n_games, self.n_dices
+        )
+        roll_mask = roll_dices_i != 0
+        rolled = roll_mask.any(axis=1)
+
+        # like RollManager.roll_dices, a reroll draws a face for every dice
+        if rolled.any():
+            faces = np.empty_like(self.roll_results)
+            faces[rolled] = self.random_source.integers(
+                0, self.n_faces, size=(int(rolled.sum()), self.n_dices)
+            )
+            reroll(self.roll_results, roll_mask, faces)
+        self.n_remaining_rolls -= rolled
+
+        hand_played = (self.n_remaining_rolls == 0) | ~rolled
+        self.handle_fight(hand_played)
+
+        game_over = hand_played & (self.player_hp <= 0)
+        new_battle = hand_played & ~game_over & (self.enemy_hp <= 0)
+        new_turn = hand_played & ~game_over
+
+        if new_battle.any():
+            self.enemies_defeated += new_battle
+            self.__generate_enemies(new_battle)
+
+        if new_turn.any():
+            self.new_turn(new_turn)
+
+        return (
+            self.get_observation() if observe else None,
+            game_over,
+            rolled,
+            hand_played,
+            new_battle,
+        )
+
+    def handle_fight(self, mask: np.ndarray) -> None:
+        attack, defense = self.calculate_roll_results()
+
+        damage_to_player = np.maximum(self.enemy_attack - defense, 0) * mask
+        damage_to_enemy = np.maximum(attack - self.enemy_defense, 0) * mask
+
+        self.player_hp = np.maximum(self.player_hp - damage_to_player, 0)
+        self.enemy_hp = np.maximum(self.enemy_hp - damage_to_enemy, 0)
+
+        self.damage_done[:, 0] = damage_to_player
+        self.damage_done[:, 1] = damage_to_enemy
+
+    # state ===============================================
+    # copies of the STATE_ARRAYS. With the state of the random source,
+    # set_state continues every game exactly
+    def get_state(self) -> dict:
+        return {name: getattr(self, name).copy() for name in STATE_ARRAYS}
+
+    def set_state(self, state: dict) -> None:
+        for name in STATE_ARRAYS:
+            setattr(self, name, np.array(state[name], dtype=np.int64))
+
+        self.dice_face_values_observation = self.__generate_dices_observation(
+            self.dice_face_values
+        )
+        self.dice_face_traits_observation = self.__generate_dices_observation(
+            self.dice_face_traits
+        )
+
+    # getters ===============================================
+    def get_roll_result_faces(self, index=slice(None)):
+        return get_rolled_faces(
+            self.dice_face_values,
+            self.dice_face_traits,
+            self.roll_results[index],
+            self.face_offsets[index],
+        )
+
+    def calculate_roll_results(self, index=slice(None)):
+        values, traits = self.get_roll_result_faces(index)
+
+        return self.calculate_totals(values, traits)
+
+    def calculate_totals(self, values, traits):
+        totals = get_totals_by_dice_type(values, self.dice_type_matrix)
+        attack_total, defense_total = totals[:, 0], totals[:, 1]
+
+        attack_total, defense_total = self.trait_table.apply(
+            attack_total, defense_total, traits
+        )
+
+        return attack_total, defense_total
+
+    def get_observation(self, index=slice(None)) -> dict:
+        return {
+            **self.get_dynamic_observation(index),
+            **self.get_static_observation(index),
+        }
+
+    # the traits never change and the dices only change on reset, so these
+    # blocks are cached and shared by every step. They are not flagged
+    # read-only since torch warns on non-writable arrays, callers must not
+    # write to them
+    def get_static_observation(self, index=slice(None)) -> dict:
+        return {
+            "all_dice_face_traits": self.dice_face_traits_observation[index],
+            "all_dice_face_values": self.dice_face_values_observation[index],
+            "traits": self.traits_observation[index],
+        }
+
+    def get_dynamic_observation(self, index=slice(None)) -> dict:
+        values, traits = self.get_roll_result_faces(index)
+        attack, defense = self.calculate_totals(values, traits)
+
+        player = np.stack(
+            [
+                self.player_max_hp[index],
+                self.player_hp[index],
+                attack,
+                defense,
+            ],
+            axis=1,
+        ).astype(np.int16)
+        enemy = np.stack(
+            [
+                self.enemy_max_hp[index],
+                self.enemy_hp[index],
+                self.enemy_attack[index],
+                self.enemy_defense[index],
+            ],
+            axis=1,
+        ).astype(np.int16)
+
+        return {
+            "damage_done": self.damage_done[index].astype(np.int16),
+            "enemy": enemy,
+            "n_remaining_rolls": self.n_remaining_rolls[
+                index, np.newaxis
+            ].astype(np.int16),
+            "player": player,
+            "roll_result_traits": traits.astype(np.int16),
+            "roll_result_values": values.astype(np.int16),
+        }
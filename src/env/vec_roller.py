@@ -0,0 +1,284 @@
+from typing import Any, List
+
+from gymnasium.utils import seeding
+
+import numpy as np
+
+from src.env.game_config import GameConfig, get_default_config
+from src.env.random_source import RandomSource
+from src.env.utils.render import render_game
+from src.env.utils.spaces import (
+    flatten_observation,
+    get_action_space,
+    get_flat_observation_space,
+    get_observation_space,
+)
+from src.env.vec_game import VecGame
+
+
+class VecRollerMixin:
+    """Batched Roller-v1 that steps every game with numpy array operations.
+
+    The env logic of VecRollerEnv, which mixes it into the stable-baselines3
+    VecEnv so it can be handed to PPO directly in place of a DummyVecEnv /
+    SubprocVecEnv of RollerEnv. Finished games are reset in place and their
+    last observation is stored in ``infos[i]["terminal_observation"]``.
+    """
+
+    metadata = {"render_modes": ["human"], "render_fps": 30}
+
+    def __init__(
+        self,
+        num_envs=1,
+        max_episode_steps=None,
+        render_mode=None,
+        flatten_observation=False,
+        config: GameConfig = None,
+    ):
+        self.render_mode = render_mode
+        self.flatten_observation = flatten_observation
+        self.config = config or get_default_config()
+
+        observation_space = get_observation_space(self.config)
+        if flatten_observation:
+            observation_space = get_flat_observation_space(self.config)
+
+        super().__init__(
+            num_envs, observation_space, get_action_space(self.config)
+        )
+        self.max_episode_steps = max_episode_steps
+
+        self.np_random, _ = seeding.np_random()
+        self.random_source = RandomSource(self.np_random)
+        self.game = VecGame(num_envs, self.random_source, self.config)
+
+        self.actions = None
+        self.obs = None
+        self.rewards = np.zeros(num_envs, dtype=np.float32)
+        self.last_roll_results_totals = np.zeros(num_envs, dtype=np.int64)
+        self.hand = np.zeros(num_envs, dtype=np.int64)
+        self.rolls = np.zeros(num_envs, dtype=np.int64)
+        self.battles_won = np.zeros(num_envs, dtype=np.int64)
+        self.elapsed_steps = np.zeros(num_envs, dtype=np.int64)
+
+    def reset(self):
+        if self._seeds[0] is not None:
+            self.np_random, _ = seeding.np_random(self._seeds[0])
+            self.random_source.set_np_random(self.np_random)
+
+        self.actions = None
+        self.rewards[:] = 0
+        self.hand[:] = 0
+        self.rolls[:] = 0
+        self.battles_won[:] = 0
+        self.elapsed_steps[:] = 0
+
+        self.game.reset()
+        obs = self.game.get_observation()
+        self.obs = obs
+        self.last_roll_results_totals = self.get_roll_results_totals(obs)
+
+        self._reset_seeds()
+        self._reset_options()
+
+        return self.format_observation(obs)
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self.actions = actions
+
+    def step_wait(self):
+        obs, game_over, did_roll, hand_played, next_battle = (
+            self.game.player_turn(self.actions)
+        )
+
+        self.rolls += did_roll
+        self.hand += hand_played
+        self.battles_won += next_battle
+        self.elapsed_steps += 1
+
+        rewards = self.calculate_rewards(obs, game_over, next_battle)
+
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        if self.max_episode_steps is not None:
+            truncated = self.elapsed_steps >= self.max_episode_steps
+        dones = game_over | truncated
+
+        infos = [
+            {
+                "player_won": bool(next_battle[i]),
+                "hands": 0,
+                "battles_won": 0,
+                "rolls": int(self.rolls[i]),
+                "TimeLimit.truncated": bool(truncated[i] and not game_over[i]),
+            }
+            for i in range(self.num_envs)
+        ]
+        for i in np.flatnonzero(next_battle | game_over):
+            infos[i]["hands"] = int(self.hand[i])
+        for i in np.flatnonzero(game_over):
+            infos[i]["battles_won"] = int(self.battles_won[i])
+
+        self.last_roll_results_totals = np.where(
+            game_over, 0, self.get_roll_results_totals(obs)
+        )
+        self.battles_won[game_over] = 0
+
+        if dones.any():
+            self.reset_done(obs, infos, dones)
+
+        self.obs = obs
+        self.rewards = rewards
+
+        return self.format_observation(obs), rewards, dones, infos
+
+    def format_observation(self, obs):
+        if not self.flatten_observation:
+            return obs
+
+        return flatten_observation(obs, self.config)
+
+    def reset_done(self, obs, infos, dones) -> None:
+        for i in np.flatnonzero(dones):
+            infos[i]["terminal_observation"] = self.format_observation(
+                {key: value[i].copy() for key, value in obs.items()}
+            )
+
+        self.hand[dones] = 0
+        self.rolls[dones] = 0
+        self.battles_won[dones] = 0
+        self.elapsed_steps[dones] = 0
+
+        self.game.reset(dones)
+        reset_obs = self.game.get_dynamic_observation(dones)
+        for key, value in reset_obs.items():
+            obs[key][dones] = value
+        obs.update(self.game.get_static_observation())
+
+        self.last_roll_results_totals[dones] = self.get_roll_results_totals(
+            reset_obs
+        )
+
+    @staticmethod
+    def get_roll_results_totals(obs) -> np.ndarray:
+        return obs["player"][:, 2] + obs["player"][:, 3]
+
+    def calculate_rewards(self, obs, game_over, won) -> np.ndarray:
+        rewards = np.zeros(self.num_envs, dtype=np.float64)
+
+        # calc the value of the roll
+        player_total = self.get_roll_results_totals(obs)
+        diff = player_total - self.last_roll_results_totals
+        rewards += np.where(
+            self.last_roll_results_totals > 0,
+            np.where(
+                diff >= 0,
+                self.config.better_roll_reward,
+                self.config.worst_roll_reward,
+            ),
+            0,
+        )
+
+        # calc the difference of damage dealt - damage taken as a number
+        # [0 - 100]
+        damage_done = obs["damage_done"]
+        damage_to_player = (damage_done[:, 0] / obs["player"][:, 0]) * 100
+        damage_to_enemy = (damage_done[:, 1] / obs["enemy"][:, 0]) * 100
+        diff = damage_to_enemy - damage_to_player
+        has_damage = (damage_done[:, 0] > 0) | (damage_done[:, 1] > 0)
+        rewards += np.where(
+            has_damage,
+            np.where(
+                diff >= 0,
+                diff * self.config.better_damage_reward,
+                diff * self.config.worst_damage_reward,
+            ),
+            0,
+        )
+        rewards = np.round(rewards, 2)
+
+        rewards[game_over] = -self.config.lose_reward
+        rewards[won] = self.config.win_reward
+
+        return rewards.astype(np.float32)
+
+    # state ===============================================
+    # the games, the random source and the episode counters. set_state on a
+    # reset env continues every game exactly, e.g. to resume training
+    def get_state(self) -> dict:
+        return {
+            "game": self.game.get_state(),
+            "random_source": self.random_source.get_state(),
+            "last_roll_results_totals": self.last_roll_results_totals.copy(),
+            "hand": self.hand.copy(),
+            "rolls": self.rolls.copy(),
+            "battles_won": self.battles_won.copy(),
+            "elapsed_steps": self.elapsed_steps.copy(),
+        }
+
+    def set_state(self, state: dict) -> None:
+        self.game.set_state(state["game"])
+        self.random_source.set_state(state["random_source"])
+
+        for name in (
+            "last_roll_results_totals",
+            "hand",
+            "rolls",
+            "battles_won",
+            "elapsed_steps",
+        ):
+            setattr(self, name, np.array(state[name], dtype=np.int64))
+
+    def render(self, mode=None):
+        if (mode or self.render_mode) != "human":
+            return super().render(mode=mode)
+
+        obs = None
+        if self.obs is not None:
+            obs = {key: value[0] for key, value in self.obs.items()}
+        action = None if self.actions is None else self.actions[0]
+
+        render_game(self.hand[0], obs, self.rewards[0], action, self.config)
+
+    def close(self) -> None:
+        pass
+
+    def get_attr(self, attr_name: str, indices=None) -> List[Any]:
+        value = getattr(self, attr_name)
+
+        return [value for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name: str, value: Any, indices=None) -> None:
+        setattr(self, attr_name, value)
+
+    def env_method(
+        self,
+        method_name: str,
+        *method_args,
+        indices=None,
+        **method_kwargs,
+    ) -> List[Any]:
+        # every game lives in this one object, so the method runs once
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+
+        return [result for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        return [False for _ in self._get_indices(indices)]
+
+
+# stable_baselines3 imports torch, which takes seconds: VecRollerEnv is
+# built on first use, so src.env imports without it
+def __getattr__(name: str):
+    if name != "VecRollerEnv":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from stable_baselines3.common.vec_env import VecEnv
+
+    class VecRollerEnv(VecRollerMixin, VecEnv):
+        """VecRollerMixin as a stable-baselines3 VecEnv."""
+
+    VecRollerEnv.__module__ = __name__
+    VecRollerEnv.__qualname__ = "VecRollerEnv"
+    globals()["VecRollerEnv"] = VecRollerEnv
+
+    return VecRollerEnv
@@ -0,0 +1,481 @@
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict
+
+import numpy as np
+
+from src.env.game_config import GameConfig, get_default_config
+from src.env.recorder import INFO_COLUMNS
+from src.env.roller import RollerEnv
+
+from tabulate import tabulate
+
+seed = 0
+n_episodes = 1000
+max_steps = 200
+n_logged_divergences = 10
+n_logged_positions = 4
+n_task_episodes = 100
+
+RESULT_HEADERS = ["Episode", "Seed", "Step", "Diverged", "Expected", "Got"]
+
+
+# engines ===============================================
+# each one takes a config and returns play(seed, actions): the episode of
+# the env reset with seed and stepped with actions until it terminates, as
+#   obs: (steps + 1, flat observation size) int16, row 0 the reset one
+#   rewards: (steps,) float32, terminated: (steps,) bool
+#   infos: (steps, len(INFO_COLUMNS)) int64
+# A new implementation of the game is checked by adding its engine here
+def build_env_engine(config: GameConfig) -> Callable:
+    env = RollerEnv(
+        observation_buffer=True, flatten_observation=True, config=config
+    )
+
+    def play(seed: int, actions: np.ndarray) -> Dict[str, np.ndarray]:
+        episode = allocate_episode(len(actions), env.observation_space)
+
+        obs, _ = env.reset(seed=int(seed))
+        episode["obs"][0] = obs
+
+        for step, action in enumerate(actions):
+            obs, reward, terminated, _, info = env.step(action)
+            add_step(episode, step, obs, reward, terminated, info)
+            if terminated:
+                break
+
+        return trim_episode(episode, step + 1)
+
+    return play
+
+
+def build_vec_engine(config: GameConfig) -> Callable:
+    # stable_baselines3 is only needed by this engine
+    from src.env.vec_roller import VecRollerEnv
+
+    env = VecRollerEnv(num_envs=1, flatten_observation=True, config=config)
+
+    def play(seed: int, actions: np.ndarray) -> Dict[str, np.ndarray]:
+        episode = allocate_episode(len(actions), env.observation_space)
+
+        env.seed(int(seed))
+        episode["obs"][0] = env.reset()[0]
+
+        for step, action in enumerate(actions):
+            obs, rewards, dones, infos = env.step(action[None])
+            terminated = bool(dones[0])
+            if terminated:
+                obs = infos[0]["terminal_observation"][None]
+
+            add_step(episode, step, obs[0], rewards[0], terminated, infos[0])
+            if terminated:
+                break
+
+        return trim_episode(episode, step + 1)
+
+    return play
+
+
+ENGINES = {
+    "env": build_env_engine,
+    "vec": build_vec_engine,
+}
+
+
+def allocate_episode(n_steps: int, observation_space) -> dict:
+    return {
+        "obs": np.zeros((n_steps + 1, *observation_space.shape), np.int16),
+        "rewards": np.zeros(n_steps, dtype=np.float32),
+        "terminated": np.zeros(n_steps, dtype=bool),
+        "infos": np.zeros((n_steps, len(INFO_COLUMNS)), dtype=np.int64),
+    }
+
+
+def add_step(episode, step, obs, reward, terminated, info) -> None:
+    episode["obs"][step + 1] = obs
+    episode["rewards"][step] = reward
+    episode["terminated"][step] = terminated
+    episode["infos"][step] = [info[name] for name in INFO_COLUMNS]
+
+
+def trim_episode(episode: dict, n_steps: int) -> dict:
+    return {
+        "obs": episode["obs"][: n_steps + 1],
+        "rewards": episode["rewards"][:n_steps],
+        "terminated": episode["terminated"][:n_steps],
+        "infos": episode["infos"][:n_steps],
+    }
+
+
+# recordings ===============================================
+# episodes are stored concatenated: the steps of episode i are rows
+# step_offsets[i]:step_offsets[i + 1] and its observations the same rows
+# shifted by i (every episode has one more observation than steps)
+def record(
+    play: Callable, seeds: np.ndarray, max_steps: int, n_dices: int
+) -> Dict[str, np.ndarray]:
+    episodes = []
+    actions = []
+
+    for episode_seed in seeds:
+        rng = np.random.default_rng(episode_seed)
+        episode_actions = rng.integers(0, 2, size=(max_steps, n_dices))
+
+        episode = play(episode_seed, episode_actions)
+        episodes.append(episode)
+        actions.append(episode_actions[: len(episode["rewards"])])
+
+    lengths = [len(episode["rewards"]) for episode in episodes]
+
+    return {
+        "seeds": np.asarray(seeds),
+        "step_offsets": np.concatenate([[0], np.cumsum(lengths)]),
+        "actions": np.concatenate(actions).astype(np.int8),
+        **{
+            key: np.concatenate([episode[key] for episode in episodes])
+            for key in ["obs", "rewards", "terminated", "infos"]
+        },
+    }
+
+
+def get_episode(recording: dict, i: int) -> (np.ndarray, dict):
+    start, end = recording["step_offsets"][i : i + 2]
+    episode = {
+        "obs": recording["obs"][start + i : end + i + 1],
+        "rewards": recording["rewards"][start:end],
+        "terminated": recording["terminated"][start:end],
+        "infos": recording["infos"][start:end],
+    }
+
+    return recording["actions"][start:end], episode
+
+
+# episodes start:end of recording, as a recording
+def slice_recording(recording: dict, start: int, end: int) -> dict:
+    step_start, step_end = recording["step_offsets"][[start, end]]
+    step_offsets = recording["step_offsets"][start : end + 1] - step_start
+
+    return {
+        "seeds": recording["seeds"][start:end],
+        "step_offsets": step_offsets,
+        "actions": recording["actions"][step_start:step_end],
+        "obs": recording["obs"][step_start + start : step_end + end],
+        "rewards": recording["rewards"][step_start:step_end],
+        "terminated": recording["terminated"][step_start:step_end],
+        "infos": recording["infos"][step_start:step_end],
+    }
+
+
+def merge_recordings(recordings: [dict]) -> dict:
+    lengths = [r["step_offsets"][-1] for r in recordings]
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+    return {
+        "step_offsets": np.concatenate(
+            [[0]]
+            + [r["step_offsets"][1:] + s for r, s in zip(recordings, starts)]
+        ),
+        **{
+            key: np.concatenate([r[key] for r in recordings])
+            for key in [
+                "seeds",
+                "actions",
+                "obs",
+                "rewards",
+                "terminated",
+                "infos",
+            ]
+        },
+    }
+
+
+def save_recording(path: str, recording: dict) -> None:
+    np.savez_compressed(path, **recording)
+
+
+def load_recording(path: str) -> Dict[str, np.ndarray]:
+    with np.load(path) as data:
+        return dict(data)
+
+
+# divergence ===============================================
+def find_divergence(
+    expected: dict, got: dict, offsets: dict
+) -> (int, [(str, str, str)]):
+    """Find the first step where got differs from expected.
+
+    Returns that step (0 is the reset) and the (field, expected, got) that
+    differ there, None if the episodes are identical.
+    """
+    n_steps = min(len(expected["rewards"]), len(got["rewards"]))
+
+    differs = (
+        expected["obs"][: n_steps + 1] != got["obs"][: n_steps + 1]
+    ).any(axis=1)
+    differs[1:] |= (
+        (expected["rewards"][:n_steps] != got["rewards"][:n_steps])
+        | (expected["terminated"][:n_steps] != got["terminated"][:n_steps])
+        | (expected["infos"][:n_steps] != got["infos"][:n_steps]).any(axis=1)
+    )
+
+    if not differs.any():
+        if len(expected["rewards"]) == len(got["rewards"]):
+            return None
+
+        lengths = (len(expected["rewards"]), len(got["rewards"]))
+        return n_steps + 1, [("length", *map(str, lengths))]
+
+    step = int(differs.argmax())
+    fields = []
+
+    for key, (start, end) in offsets.items():
+        expected_obs = expected["obs"][step, start:end]
+        got_obs = got["obs"][step, start:end]
+        if not np.array_equal(expected_obs, got_obs):
+            fields.append(
+                (f"obs.{key}", *format_difference(expected_obs, got_obs))
+            )
+
+    if step > 0:
+        scalars = {
+            "reward": "rewards",
+            "terminated": "terminated",
+        }
+        for name, key in scalars.items():
+            if expected[key][step - 1] != got[key][step - 1]:
+                fields.append(
+                    (
+                        name,
+                        str(expected[key][step - 1]),
+                        str(got[key][step - 1]),
+                    )
+                )
+
+        for j, name in enumerate(INFO_COLUMNS):
+            if expected["infos"][step - 1, j] != got["infos"][step - 1, j]:
+                fields.append(
+                    (
+                        f"info.{name}",
+                        str(expected["infos"][step - 1, j]),
+                        str(got["infos"][step - 1, j]),
+                    )
+                )
+
+    return step, fields
+
+
+# the positions of a and b that differ, as "[i] value" (first ones only)
+def format_difference(a: np.ndarray, b: np.ndarray) -> (str, str):
+    positions = np.flatnonzero(a != b)[:n_logged_positions]
+
+    return tuple(
+        " ".join(f"[{i}] {x[i]}" for i in positions.tolist()) for x in (a, b)
+    )
+
+
+def check(
+    play: Callable, recording: dict, offsets: dict, first_episode: int = 0
+) -> [dict]:
+    divergences = []
+
+    for i, episode_seed in enumerate(recording["seeds"]):
+        actions, expected = get_episode(recording, i)
+        divergence = find_divergence(
+            expected, play(episode_seed, actions), offsets
+        )
+
+        if divergence is not None:
+            step, fields = divergence
+            divergences.append(
+                {
+                    "episode": first_episode + i,
+                    "seed": int(episode_seed),
+                    "step": step,
+                    "fields": fields,
+                }
+            )
+
+    return divergences
+
+
+# runs in a worker: records the episodes of task["seeds"] with the reference
+# engine, unless task["recording"] holds them, and checks them against the
+# engine. Returns the recording and the divergences
+def replay(task: dict) -> (dict, [dict]):
+    config = GameConfig.from_dict(task["config"])
+
+    recording = task["recording"]
+    if recording is None:
+        recording = record(
+            ENGINES[task["reference"]](config),
+            task["seeds"],
+            task["max_steps"],
+            config.n_dices,
+        )
+
+    divergences = check(
+        ENGINES[task["engine"]](config),
+        recording,
+        config.get_observation_offsets(),
+        task["first_episode"],
+    )
+
+    return recording, divergences
+
+
+def get_tasks(args, config: GameConfig, recording: dict) -> [dict]:
+    n_episodes = args.episodes
+    if recording is not None:
+        n_episodes = len(recording["seeds"])
+    n_tasks = max(min(n_episodes // n_task_episodes, 256), 1)
+    bounds = np.linspace(0, n_episodes, n_tasks + 1).astype(int)
+
+    return [
+        {
+            "config": config.to_dict(),
+            "engine": args.engine,
+            "reference": args.reference,
+            "max_steps": args.max_steps,
+            "first_episode": int(start),
+            "seeds": args.seed + np.arange(start, end),
+            "recording": (
+                slice_recording(recording, start, end)
+                if recording is not None
+                else None
+            ),
+        }
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def log_divergences(divergences: [dict]) -> None:
+    rows = []
+    for divergence in divergences[:n_logged_divergences]:
+        for j, (field, expected, got) in enumerate(divergence["fields"]):
+            head = ["", "", ""]
+            if j == 0:
+                head = [
+                    divergence["episode"],
+                    divergence["seed"],
+                    divergence["step"],
+                ]
+
+            rows.append([*head, field, expected, got])
+
+    print(
+        tabulate(
+            rows,
+            headers=RESULT_HEADERS,
+            tablefmt="simple_outline",
+            maxcolwidths=[None, None, None, None, 40, 40],
+        )
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.replay",
+        description=(
+            "Replay seeded episodes against an engine and report the first "
+            "step where its observations, rewards or infos diverge from a "
+            "reference engine or a saved recording."
+        ),
+        allow_abbrev=False,
+    )
+    parser.add_argument(
+        "--engine",
+        default="env",
+        choices=list(ENGINES),
+        help="Engine checked: 'env' is RollerEnv, 'vec' VecRollerEnv.",
+    )
+    parser.add_argument(
+        "--reference",
+        default="env",
+        choices=list(ENGINES),
+        help="Engine recording the expected episodes, without --load.",
+    )
+    parser.add_argument(
+        "--load",
+        default=None,
+        type=str,
+        help=(
+            "Check the episodes of a recording written by --save (e.g. "
+            "before a change) instead of running the reference engine."
+        ),
+    )
+    parser.add_argument(
+        "--save",
+        default=None,
+        type=str,
+        help="Write the reference episodes to this .npz file.",
+    )
+    parser.add_argument("--episodes", default=n_episodes, type=int)
+    parser.add_argument("--seed", default=seed, type=int)
+    parser.add_argument(
+        "--max_steps",
+        default=max_steps,
+        type=int,
+        help="Episodes still running after this many steps are cut.",
+    )
+    parser.add_argument(
+        "--workers",
+        default=None,
+        type=int,
+        help="Processes replaying the episodes, defaults to the CPU count.",
+    )
+    parser.add_argument(
+        "--config",
+        default=None,
+        type=str,
+        help="GameConfig JSON / TOML file, defaults to src/env/data.",
+    )
+    args = parser.parse_args(argv)
+
+    config = (
+        GameConfig.from_file(args.config)
+        if args.config
+        else get_default_config()
+    )
+
+    recording = None
+    if args.load is not None:
+        recording = load_recording(args.load)
+        print("Loaded", len(recording["seeds"]), "episodes from", args.load)
+
+    tasks = get_tasks(args, config, recording)
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        results = list(executor.map(replay, tasks))
+    elapsed_time = time.perf_counter() - start_time
+
+    recording = merge_recordings([result[0] for result in results])
+    divergences = [d for result in results for d in result[1]]
+
+    if args.save is not None:
+        save_recording(args.save, recording)
+
+    n_recorded = len(recording["seeds"])
+    print(
+        "Episodes",
+        n_recorded,
+        "| Steps",
+        len(recording["rewards"]),
+        "| Diverged",
+        len(divergences),
+    )
+    print("Episodes / sec: ", round(n_recorded / elapsed_time))
+
+    if divergences:
+        print("\n======== Divergences ========")
+        log_divergences(divergences)
+
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict
+
+import numpy as np
+
+from src.agent.utils.summary import StreamingStats
+from src.env.game_config import GameConfig
+from src.env.random_source import RandomSource
+from src.env.vec_game import VecGame
+
+from tabulate import tabulate
+
+seed = 0
+n_games = 100000
+batch_size = 8192
+max_hands = 1000
+
+RESULT_HEADERS = [
+    "Battle win rate",
+    "Battles / game",
+    "Hands / game",
+    "Hands p90",
+    "Dealt / hand",
+    "Dealt p10 / p50 / p90",
+    "Taken / hand",
+    "Taken p10 / p50 / p90",
+    "Truncated",
+]
+
+
+# policies ===============================================
+# each one takes (game, rng) and returns the dices to reroll in every game,
+# a game that rerolls no dice plays its hand
+def policy_stand(game: VecGame, rng: np.random.Generator) -> np.ndarray:
+    return np.zeros((game.n_games, game.n_dices), dtype=np.int64)
+
+
+def policy_random(game: VecGame, rng: np.random.Generator) -> np.ndarray:
+    return rng.integers(0, 2, size=(game.n_games, game.n_dices))
+
+
+# rerolls the faces below the mean face value
+def policy_reroll_low(game: VecGame, rng: np.random.Generator) -> np.ndarray:
+    values, _ = game.get_roll_result_faces()
+
+    return (values < np.mean(game.face_value_range)).astype(np.int64)
+
+
+# keeps every face with a trait, rerolls the low faces without one
+def policy_keep_traits(game: VecGame, rng: np.random.Generator) -> np.ndarray:
+    values, traits = game.get_roll_result_faces()
+    is_low = values < np.mean(game.face_value_range)
+
+    return (is_low & (traits == 0)).astype(np.int64)
+
+
+POLICIES = {
+    "stand": policy_stand,
+    "random": policy_random,
+    "reroll_low": policy_reroll_low,
+    "keep_traits": policy_keep_traits,
+}
+
+
+# simulation ===============================================
+def simulate_games(
+    game: VecGame,
+    policy: Callable,
+    rng: np.random.Generator,
+    n_games: int,
+    stats: dict,
+) -> None:
+    """Plays n_games games to their game over (or max_hands).
+
+    Finished games are reset in place while games are left to start, so
+    the batch stays full until the last ones.
+    """
+    game.reset()
+    n_started = game.n_games
+
+    active = np.ones(game.n_games, dtype=bool)
+    hands = np.zeros(game.n_games, dtype=np.int64)
+    battles_won = np.zeros(game.n_games, dtype=np.int64)
+
+    while active.any():
+        _, game_over, _, hand_played, new_battle = game.player_turn(
+            policy(game, rng), observe=False
+        )
+
+        played = hand_played & active
+        stats["damage_taken"].update(game.damage_done[played, 0])
+        stats["damage_dealt"].update(game.damage_done[played, 1])
+
+        hands += played
+        battles_won += new_battle & active
+
+        lost = game_over & active
+        truncated = active & ~lost & (hands >= max_hands)
+        done = lost | truncated
+        if not done.any():
+            continue
+
+        stats["losses"] += int(lost.sum())
+        stats["truncated"] += int(truncated.sum())
+        stats["hands"].update(hands[done])
+        stats["battles_won"].update(battles_won[done])
+
+        # games over keep being stepped with the batch, their steps are
+        # not counted
+        active &= ~done
+        hands[done] = 0
+        battles_won[done] = 0
+
+        restart = np.flatnonzero(done)[: n_games - n_started]
+        if len(restart):
+            mask = np.zeros(game.n_games, dtype=bool)
+            mask[restart] = True
+
+            game.reset(mask)
+            active |= mask
+            n_started += len(restart)
+
+
+# point maps names of GameConfig keys to their value, see
+# GameConfig.from_dict
+def simulate(
+    point: dict, policy: str, n_games: int, seed: int
+) -> Dict[str, float]:
+    config = GameConfig.from_dict(point)
+    # independent streams for the policy and the dice
+    policy_seed, game_seed = np.random.SeedSequence(seed).spawn(2)
+    rng = np.random.default_rng(policy_seed)
+    random_source = RandomSource(np.random.default_rng(game_seed))
+    stats = {
+        "damage_dealt": StreamingStats(),
+        "damage_taken": StreamingStats(),
+        "hands": StreamingStats(),
+        "battles_won": StreamingStats(),
+        "losses": 0,
+        "truncated": 0,
+    }
+
+    game = VecGame(min(batch_size, n_games), random_source, config)
+    simulate_games(game, POLICIES[policy], rng, n_games, stats)
+
+    battles_won = stats["battles_won"].get_mean() * n_games
+
+    return {
+        "battle_win_rate": battles_won / (battles_won + stats["losses"]),
+        "battles_won_per_game": stats["battles_won"].get_mean(),
+        "hands_per_game": stats["hands"].get_mean(),
+        "hands_p90": stats["hands"].get_quantile(0.9),
+        **get_distribution("damage_dealt", stats["damage_dealt"]),
+        **get_distribution("damage_taken", stats["damage_taken"]),
+        "truncated": stats["truncated"] / n_games,
+    }
+
+
+def get_distribution(name: str, stats: StreamingStats) -> Dict[str, float]:
+    return {
+        f"{name}_mean": stats.get_mean(),
+        f"{name}_std": stats.get_std(),
+        f"{name}_p10": stats.get_quantile(0.1),
+        f"{name}_p50": stats.get_quantile(0.5),
+        f"{name}_p90": stats.get_quantile(0.9),
+    }
+
+
+# grid ===============================================
+# the grid maps GameConfig keys (constant names or TRAITS) to the values to
+# try, a JSON string or file
+def load_grid(grid: str) -> Dict[str, list]:
+    if os.path.isfile(grid):
+        with open(grid) as f:
+            grid = f.read()
+
+    return json.loads(grid)
+
+
+def get_grid_points(grid: Dict[str, list]) -> [dict]:
+    names = list(grid)
+    points = [
+        dict(zip(names, values))
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+
+    # fail on a bad point before starting the workers
+    for point in points:
+        GameConfig.from_dict(point)
+
+    return points
+
+
+def log_results(points: [dict], results: [dict]) -> None:
+    names = list(points[0]) if points else []
+
+    rows = []
+    for point, result in zip(points, results):
+        rows.append(
+            [
+                *(json.dumps(point[name]) for name in names),
+                f"{result['battle_win_rate'] * 100:.1f}%",
+                round(result["battles_won_per_game"], 2),
+                round(result["hands_per_game"], 2),
+                round(result["hands_p90"], 2),
+                round(result["damage_dealt_mean"], 2),
+                format_quantiles(result, "damage_dealt"),
+                round(result["damage_taken_mean"], 2),
+                format_quantiles(result, "damage_taken"),
+                f"{result['truncated'] * 100:.1f}%",
+            ]
+        )
+
+    print(
+        tabulate(
+            rows,
+            headers=[*names, *RESULT_HEADERS],
+            tablefmt="simple_outline",
+        )
+    )
+
+
+def format_quantiles(result: dict, name: str) -> str:
+    return " / ".join(
+        f"{result[f'{name}_{q}']:.0f}" for q in ["p10", "p50", "p90"]
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.simulator",
+        description=(
+            "Play battles with a heuristic policy over a grid of game "
+            "constants and report balance statistics per grid point."
+        ),
+        allow_abbrev=False,
+    )
+    parser.add_argument(
+        "--grid",
+        default="{}",
+        type=str,
+        help=(
+            "JSON (or a JSON file) mapping constants of src/env/data/game.py "
+            "(or TRAITS, as in a GameConfig file) to the values to try, e.g. "
+            "'{\"MAX_ENEMY_ATTACK\": [30, 40]}'."
+        ),
+    )
+    parser.add_argument(
+        "--policy", default="reroll_low", choices=list(POLICIES)
+    )
+    parser.add_argument(
+        "--games",
+        default=n_games,
+        type=int,
+        help="Games played per grid point.",
+    )
+    parser.add_argument("--seed", default=seed, type=int)
+    parser.add_argument(
+        "--workers",
+        default=None,
+        type=int,
+        help="Processes running the grid points, defaults to the CPU count.",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        type=str,
+        help="Write the grid points and their results to this JSON file.",
+    )
+    args = parser.parse_args(argv)
+
+    points = get_grid_points(load_grid(args.grid))
+    n_points = len(points)
+
+    print(
+        "Grid points",
+        n_points,
+        "| Games / point",
+        args.games,
+        "| Policy",
+        args.policy,
+    )
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        results = list(
+            executor.map(
+                simulate,
+                points,
+                [args.policy] * n_points,
+                [args.games] * n_points,
+                [args.seed + i for i in range(n_points)],
+            )
+        )
+    elapsed_time = time.perf_counter() - start_time
+
+    log_results(points, results)
+    print("Games / sec: ", round(n_points * args.games / elapsed_time))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(
+                [
+                    {"constants": point, **result}
+                    for point, result in zip(points, results)
+                ],
+                f,
+                indent=2,
+            )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())